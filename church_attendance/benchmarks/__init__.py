@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Church Attendance backend.
+
+Run from the church_attendance/ folder, e.g.:
+    python -m benchmarks.load_test
+"""
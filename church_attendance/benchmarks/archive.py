@@ -0,0 +1,93 @@
+"""
+archive.py — hot-database size and log latency as the years pile up.
+
+For each --years value, generates a database with benchmarks.datagen, times
+the log reads a Sunday makes (today's page and count, the newest page of the
+whole log, a month's export, student histories) plus one save, then moves
+every closed service year into archive files (server.archive_logs) and times
+the same calls again. With the archive tier the hot file and the hot-path
+latencies should stay flat however many years there are; only reads that
+genuinely reach back (student history, the full log) touch the archives.
+
+    python -m benchmarks.archive --students 1500 --years 1 3 6 --repeat 7
+"""
+
+import argparse, datetime, os, random, statistics, tempfile, time
+
+import server
+from benchmarks import datagen
+
+
+def _size(path: str) -> int:
+    return sum(os.path.getsize(path + s) for s in ('', '-wal') if os.path.exists(path + s))
+
+
+def _archive_size() -> int:
+    folder = server._archive_dir()
+    return sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder)) if os.path.isdir(folder) else 0
+
+
+def _calls(today: str, month_ago: str, students: int, rnd: random.Random) -> dict:
+    ids = rnd.sample(range(1, students + 1), 5)
+    return {
+        "today's log page":   lambda: server.api_get_attendance_log(today, limit=200),
+        "today's log count":  lambda: server.api_count_attendance_log(today),
+        'newest log page':    lambda: server.api_get_attendance_log(limit=200),
+        'month export':       lambda: sum(1 for _ in server.export_attendance_log(month_ago)[1]),
+        'student history ×5': lambda: [server.api_get_student_history(i) for i in ids],
+        'save a Sunday':      lambda: server.api_save_attendance(
+            {'date': today, 'records': {str(i): rnd.choice(datagen.STATUSES) for i in range(1, 201)}}),
+    }
+
+
+def _time(calls: dict, repeat: int) -> dict:
+    out = {}
+    for label, call in calls.items():
+        call()                                   # warm the cache and attach what it needs
+        runs = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            call()
+            runs.append(time.perf_counter() - t0)
+        out[label] = statistics.median(runs) * 1000
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--students', type=int, default=1000)
+    ap.add_argument('--teachers', type=int, default=100)
+    ap.add_argument('--years',    type=float, nargs='+', default=[1, 3, 6])
+    ap.add_argument('--repeat',   type=int, default=5)
+    args = ap.parse_args()
+
+    end       = datetime.date.today()
+    month_ago = (end - datetime.timedelta(days=30)).isoformat()
+    results   = []
+    for years in args.years:
+        with tempfile.TemporaryDirectory() as tmp:
+            db    = os.path.join(tmp, 'church.db')
+            dates = datagen.populate(db, args.students, args.teachers, years, end)
+            server._pool_local.conn = None       # populate closed this thread's pooled connection
+            calls = _calls(dates[-1], month_ago, args.students, random.Random(3))
+            before, size_before = _time(calls, args.repeat), _size(db)
+            t0       = time.perf_counter()
+            archived = server.archive_logs()
+            took     = time.perf_counter() - t0
+            after, size_after = _time(calls, args.repeat), _size(db)
+            results.append((years, len(archived), took, size_before, size_after, _archive_size(), before, after))
+            server.close_all_conns()
+            server._pool_local.conn = None
+
+    mib = lambda n: n / 2**20
+    print(f'{args.students} students, {args.teachers} teachers; median of {args.repeat} runs\n')
+    print(f'{"years":>5} {"archived":>8} {"took s":>7} {"hot MiB before":>15} {"hot MiB after":>14} {"archive MiB":>12}')
+    for years, n, took, before, after, arc, *_ in results:
+        print(f'{years:>5g} {n:>8} {took:>7.1f} {mib(before):>15.1f} {mib(after):>14.1f} {mib(arc):>12.1f}')
+    print(f'\n{"call (ms, before → after)":<22}' + ''.join(f'{f"{y:g} years":>20}' for y, *_ in results))
+    for label in results[0][6]:
+        print(f'{label:<22}' + ''.join(f'{f"{r[6][label]:.1f} → {r[7][label]:.1f}":>20}' for r in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+bulk_save.py — set-based save engine vs the original per-student loop.
+
+Saves a day of attendance for 400, 5k and 50k students and teachers with
+both implementations on identical databases, checks that the resulting
+tables match row for row, and reports the speedup.
+
+    python -m benchmarks.bulk_save --sizes 400,5000,50000
+"""
+
+import argparse, os, random, shutil, tempfile, time
+
+import server
+
+DATE = '2025-01-05'
+
+
+def legacy_save_attendance(data):
+    """The pre-bulk api_save_attendance loop, kept as the reference."""
+    date, records = data.get('date'), data.get('records', {})
+    conn = server.get_conn()
+    present_c = absent_c = late_c = 0
+    for sid_str, status in records.items():
+        sid = int(sid_str)
+        if status == 'none':
+            continue
+        if status in ('present', 'late'):
+            conn.execute('UPDATE app_students SET present_count=present_count+1, total_classes=total_classes+1, status=? WHERE id=?', (status, sid))
+            if status == 'present': present_c += 1
+            else: late_c += 1
+        elif status == 'absent':
+            conn.execute('UPDATE app_students SET absent_count=absent_count+1, total_classes=total_classes+1, status=? WHERE id=?', (status, sid))
+            absent_c += 1
+        conn.execute('UPDATE app_students SET attendance=ROUND(CAST(present_count AS REAL)/NULLIF(total_classes,0)*100) WHERE id=?', (sid,))
+        conn.execute('INSERT INTO attendance_log (student_id, record_date, status) VALUES (?,?,?)'
+                     ' ON CONFLICT(student_id, record_date) DO UPDATE SET status=excluded.status', (sid, date, status))
+        conn.execute("UPDATE attendance_records SET status='none' WHERE student_id=? AND record_date=?", (sid, date))
+    conn.execute('INSERT INTO attendance_history (record_date, present_count, absent_count, late_count) VALUES (?,?,?,?)'
+                 ' ON CONFLICT(record_date) DO UPDATE SET present_count=excluded.present_count,'
+                 ' absent_count=excluded.absent_count, late_count=excluded.late_count', (date, present_c, absent_c, late_c))
+    conn.commit()
+
+
+def legacy_save_teacher_attendance(data):
+    date, records = data.get('date'), data.get('records', {})
+    conn = server.get_conn()
+    for tid_str, status in records.items():
+        tid = int(tid_str)
+        if status == 'none':
+            continue
+        col = 'present_count' if status in ('present', 'late') else 'absent_count'
+        conn.execute(f'UPDATE app_teachers SET {col}={col}+1, total_classes=total_classes+1, status=? WHERE id=?', (status, tid))
+        conn.execute('UPDATE app_teachers SET attendance=ROUND(CAST(present_count AS REAL)/NULLIF(total_classes,0)*100) WHERE id=?', (tid,))
+        conn.execute('INSERT INTO teacher_attendance_log (teacher_id, record_date, status) VALUES (?,?,?)'
+                     ' ON CONFLICT(teacher_id, record_date) DO UPDATE SET status=excluded.status', (tid, date, status))
+        conn.execute("UPDATE teacher_attendance_records SET status='none' WHERE teacher_id=? AND record_date=?", (tid, date))
+    conn.commit()
+
+
+def _build(path, n):
+    server.DB_PATH = path
+    server.init_db()
+    conn = server.get_conn()
+    rnd = random.Random(n)
+    for table in ('app_students', 'app_teachers'):
+        conn.executemany(
+            f'INSERT INTO {table} (id, name, total_classes, present_count, absent_count'
+            f'{", grade" if table == "app_students" else ""}) VALUES (?,?,?,?,?{",?" if table == "app_students" else ""})',
+            [(i, f'اسم {i}', 10, p, 10 - p) + (('5',) if table == 'app_students' else ())
+             for i in range(1, n + 1) for p in (rnd.randint(0, 10),)]
+        )
+    conn.executemany("INSERT INTO attendance_records (student_id, record_date, status) VALUES (?, ?, 'present')",
+                     [(i, DATE) for i in range(1, n + 1)])
+    conn.commit()
+    statuses = ['present', 'present', 'present', 'absent', 'late', 'none']
+    return {str(i): rnd.choice(statuses) for i in range(1, n + 1)}
+
+
+def _dump(path):
+    server.DB_PATH = path
+    conn = server.get_conn()
+    dump = {}
+    for t in ('app_students', 'app_teachers', 'attendance_log', 'teacher_attendance_log',
+              'attendance_records', 'attendance_history'):
+        # the legacy loop predates delta sync and never stamps sync versions
+        cols = ', '.join(r['name'] for r in conn.execute(f'PRAGMA table_info({t})') if r['name'] != 'sync_version')
+        dump[t] = [tuple(r) for r in conn.execute(f'SELECT {cols} FROM {t} ORDER BY 1')]
+    return dump
+
+
+def _run(path, fn, payload):
+    server.DB_PATH = path
+    t0 = time.perf_counter()
+    fn(payload)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--sizes', default='400,5000,50000')
+    args = ap.parse_args()
+
+    print(f'{"kind":<8} {"records":>8} {"loop ms":>10} {"bulk ms":>10} {"speedup":>8}  identical')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in map(int, args.sizes.split(',')):
+            base = os.path.join(tmp, f'base_{n}.db')
+            records = _build(base, n)
+            server.close_all_conns()
+            payload = {'date': DATE, 'records': records}
+            for kind, legacy, bulk in (
+                ('student', legacy_save_attendance,         server.api_save_attendance),
+                ('teacher', legacy_save_teacher_attendance, server.api_save_teacher_attendance),
+            ):
+                a, b = os.path.join(tmp, f'a_{kind}_{n}.db'), os.path.join(tmp, f'b_{kind}_{n}.db')
+                shutil.copy(base, a); shutil.copy(base, b)
+                t_loop = _run(a, legacy, payload)
+                t_bulk = _run(b, bulk, payload)
+                same   = _dump(a) == _dump(b)
+                print(f'{kind:<8} {n:>8} {t_loop * 1000:>10.1f} {t_bulk * 1000:>10.1f}'
+                      f' {t_loop / t_bulk:>7.1f}×  {"yes" if same else "NO"}')
+            server.close_all_conns()
+
+
+if __name__ == '__main__':
+    main()
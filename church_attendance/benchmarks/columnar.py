@@ -0,0 +1,78 @@
+"""
+columnar.py — object-per-row vs ?format=columnar list payloads.
+
+Builds a synthetic roster (10,000 students by default, a few weeks of log),
+then for each list endpoint calls its api_* function both ways and
+serialises the result exactly like Handler.send_json. Reports the best of
+--repeat runs for query + serialisation time, and the body size raw and
+gzipped.
+
+    python -m benchmarks.columnar --students 10000 --teachers 200
+"""
+
+import argparse, gzip, json, os, random, tempfile, time
+
+import server
+
+
+def _populate(students: int, teachers: int, weeks: int):
+    server.init_db()
+    conn = server.get_conn()
+    rnd  = random.Random(11)
+    conn.executemany(
+        'INSERT INTO app_students (name, grade, whatsapp, avatar, attendance, status, total_classes,'
+        ' present_count, absent_count) VALUES (?,?,?,?,?,?,?,?,?)',
+        [(f'طالب {i}', rnd.choice(server.GRADES), f'010{rnd.randrange(10**8):08d}', 'طا',
+          rnd.randrange(50, 101), rnd.choice(['present', 'absent', 'late']), 40, 30, 10) for i in range(students)])
+    conn.executemany('INSERT INTO app_teachers (name, subject, assigned_class) VALUES (?,?,?)',
+                     [(f'خادم {i}', 'ابتدائي', rnd.choice(server.GRADES)) for i in range(teachers)])
+    dates = [f'2025-{w // 4 + 1:02d}-{w % 4 * 7 + 1:02d}' for w in range(weeks)]
+    conn.executemany('INSERT INTO attendance_log (student_id, record_date, status) VALUES (?,?,?)',
+                     ((sid, d, rnd.choice(['present', 'absent', 'late'])) for d in dates
+                      for sid in range(1, students + 1)))
+    conn.executemany('INSERT INTO attendance_history (record_date) VALUES (?)', ((d,) for d in dates))
+    conn.commit()
+    conn.close()
+    return dates[-1]
+
+
+def _measure(call, repeat: int):
+    best = None
+    for _ in range(repeat):
+        t0   = time.perf_counter()
+        body = json.dumps(call(), ensure_ascii=False).encode()
+        took = time.perf_counter() - t0
+        best = took if best is None else min(best, took)
+    return best, len(body), len(gzip.compress(body, 6))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--students', type=int, default=10_000)
+    ap.add_argument('--teachers', type=int, default=200)
+    ap.add_argument('--weeks',    type=int, default=4)
+    ap.add_argument('--repeat',   type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server.DB_PATH = os.path.join(tmp, 'columnar.db')
+        date = _populate(args.students, args.teachers, args.weeks)
+        cases = {
+            'GET /students':               lambda c: server.api_get_students(None, c),
+            'GET /teachers':               lambda c: server.api_get_teachers(c),
+            'GET /sync (full, admin)':     lambda c: server.api_sync(0, date, None, True, c),
+            'GET /attendance/log (1000)':  lambda c: server.api_get_attendance_log(None, None, None, 1000, c),
+        }
+        print(f'{args.students} students, {args.teachers} teachers\n')
+        print(f'{"endpoint":<28} {"objects ms":>10} {"columnar ms":>11} {"objects KiB":>12} {"columnar KiB":>13}'
+              f' {"gzip obj":>9} {"gzip col":>9}')
+        for name, call in cases.items():
+            t_obj, n_obj, z_obj = _measure(lambda: call(False), args.repeat)
+            t_col, n_col, z_col = _measure(lambda: call(True), args.repeat)
+            print(f'{name:<28} {t_obj * 1000:>10.1f} {t_col * 1000:>11.1f} {n_obj / 1024:>12.0f} {n_col / 1024:>13.0f}'
+                  f' {z_obj / 1024:>9.0f} {z_col / 1024:>9.0f}')
+        server.close_all_conns()
+
+
+if __name__ == '__main__':
+    main()
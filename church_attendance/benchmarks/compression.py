@@ -0,0 +1,124 @@
+"""
+compression.py — bytes on the wire and latency with and without gzip.
+
+Seeds a throwaway database (students, teachers, weeks of log), starts
+`server.py` on it, then fetches each major endpoint with and without
+`Accept-Encoding: gzip`. Reports the bytes actually received, the best
+local round trip over --repeat runs (decompression included), and an
+estimate of the same request on a slow link (--mbps) — local time plus
+bytes × 8 / bandwidth.
+
+    python -m benchmarks.compression --students 2000 --mbps 2 --level 5
+"""
+
+import argparse, gzip, http.client, json, os, random, subprocess, sys, tempfile, time
+
+import server
+from benchmarks.load_test import SERVER, _wait_ready
+
+
+ENDPOINTS = [
+    '/api/students',
+    '/api/students?format=columnar',
+    '/api/teachers',
+    '/api/sync?since=0&date={date}',
+    '/api/attendance/history',
+    '/api/attendance/log?limit=1000',
+    '/api/attendance/log?date={date}',
+    '/api/reports/grades',
+    '/api/reports/monthly',
+    '/api/export/attendance-log?format=csv&from={date}',
+]
+
+
+def _seed(db: str, students: int, teachers: int, weeks: int) -> str:
+    server.DB_PATH = db
+    server.init_db()
+    conn = server.get_conn()
+    rnd  = random.Random(5)
+    given  = ['مينا', 'بيشوي', 'مارك', 'كيرلس', 'مريم', 'ماريا', 'يوستينا', 'أبانوب']
+    family = ['جرجس', 'حنا', 'عزيز', 'فهمي', 'شنودة', 'لبيب', 'ميخائيل']
+    conn.executemany(
+        'INSERT INTO app_students (name, grade, whatsapp, avatar) VALUES (?,?,?,?)',
+        [(f'{rnd.choice(given)} {rnd.choice(family)} {rnd.choice(family)}', rnd.choice(server.GRADES),
+          f'010{rnd.randrange(10**8):08d}', 'مي') for _ in range(students)])
+    conn.executemany('INSERT INTO app_teachers (name, subject, assigned_class) VALUES (?,?,?)',
+                     [(f'{rnd.choice(given)} {rnd.choice(family)}', 'ابتدائي', rnd.choice(server.GRADES))
+                      for _ in range(teachers)])
+    dates = [f'2025-{w // 4 + 1:02d}-{w % 4 * 7 + 1:02d}' for w in range(weeks)]
+    conn.executemany('INSERT INTO attendance_log (student_id, record_date, status) VALUES (?,?,?)',
+                     ((sid, d, rnd.choice(['present', 'absent', 'late'])) for d in dates
+                      for sid in range(1, students + 1)))
+    conn.executemany('INSERT INTO attendance_history (record_date, present_count) VALUES (?,?)',
+                     ((d, students) for d in dates))
+    server.rebuild_rollups(conn)
+    conn.commit()
+    server.close_all_conns()
+    return dates[-1]
+
+
+def _fetch(port: int, path: str, token: str, gzip_ok: bool):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Authorization': f'Bearer {token}'}
+    if gzip_ok:
+        headers['Accept-Encoding'] = 'gzip'
+    t0 = time.perf_counter()
+    conn.request('GET', path, headers=headers)
+    res  = conn.getresponse()
+    raw  = res.read()
+    body = gzip.decompress(raw) if res.getheader('Content-Encoding') == 'gzip' else raw
+    took = time.perf_counter() - t0
+    conn.close()
+    return took, len(raw), body
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--students', type=int, default=2000)
+    ap.add_argument('--teachers', type=int, default=100)
+    ap.add_argument('--weeks',    type=int, default=12)
+    ap.add_argument('--level',    type=int, default=server.GZIP_LEVEL)
+    ap.add_argument('--mbps',     type=float, default=2.0, help='slow-link bandwidth for the estimate')
+    ap.add_argument('--repeat',   type=int, default=5)
+    ap.add_argument('--port',     type=int, default=5097)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db   = os.path.join(tmp, 'bench.db')
+        date = _seed(db, args.students, args.teachers, args.weeks)
+        proc = subprocess.Popen(
+            [sys.executable, SERVER, '--port', str(args.port), '--gzip-level', str(args.level)],
+            env=dict(os.environ, CHURCH_DB=db), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(args.port)
+            conn = http.client.HTTPConnection('127.0.0.1', args.port)
+            conn.request('POST', '/api/login', json.dumps({'username': 'admin', 'password': ''}))
+            token = json.loads(conn.getresponse().read())['token']
+            conn.close()
+
+            print(f'{args.students} students, {args.weeks} weeks of log, gzip level {args.level}, '
+                  f'slow link {args.mbps:g} Mbit/s\n')
+            print(f'{"endpoint":<44} {"plain KiB":>9} {"gzip KiB":>9} {"ratio":>6} '
+                  f'{"plain ms":>9} {"gzip ms":>8} {"slow plain":>11} {"slow gzip":>10}')
+            for template in ENDPOINTS:
+                path = template.format(date=date)
+                runs = {}
+                for gzip_ok in (False, True):
+                    best, size, body = None, 0, b''
+                    for _ in range(args.repeat):
+                        took, size, body = _fetch(args.port, path, token, gzip_ok)
+                        best = took if best is None else min(best, took)
+                    runs[gzip_ok] = (best, size, body)
+                (t_p, n_p, b_p), (t_g, n_g, b_g) = runs[False], runs[True]
+                assert b_p == b_g or path.startswith('/api/sync'), path   # sync carries a live version
+                slow = lambda t, n: (t + n * 8 / (args.mbps * 1e6)) * 1000
+                print(f'{path[:44]:<44} {n_p / 1024:>9.1f} {n_g / 1024:>9.1f} {n_p / max(n_g, 1):>5.1f}× '
+                      f'{t_p * 1000:>9.1f} {t_g * 1000:>8.1f} {slow(t_p, n_p):>11.0f} {slow(t_g, n_g):>10.0f}')
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
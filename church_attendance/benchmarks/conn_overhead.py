@@ -0,0 +1,77 @@
+"""
+conn_overhead.py — per-endpoint cost of opening a connection vs the pool.
+
+Calls each read endpoint's api_* function directly (no HTTP) against a
+throwaway database, first with a fresh sqlite3 connection per call (the
+original get_conn) and then with the pooled, pre-tuned connection.
+
+    python -m benchmarks.conn_overhead --students 400 --calls 2000
+"""
+
+import argparse, os, sqlite3, tempfile, time
+
+import server
+
+
+def _legacy_get_conn():
+    conn = sqlite3.connect(server.DB_PATH, timeout=server.DB_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _seed(students: int):
+    server.init_db()
+    conn = server.get_conn()
+    conn.executemany(
+        "INSERT INTO app_students (name, grade) VALUES (?, ?)",
+        [(f'طالب {i}', str(i % 12 + 1)) for i in range(students)]
+    )
+    conn.executemany(
+        "INSERT INTO attendance_records (student_id, record_date, status) VALUES (?, '2025-01-05', 'present')",
+        [(i + 1,) for i in range(students)]
+    )
+    conn.commit()
+
+
+ENDPOINTS = {
+    'GET /students (grade)':     lambda: server.api_get_students('5'),
+    'GET /students/:id/history': lambda: server.api_get_student_history(7),
+    'GET /attendance/records':   lambda: server.api_get_attendance_records('2025-01-05'),
+    'GET /attendance/history':   lambda: server.api_get_attendance_history(),
+    'GET /users':                lambda: server.api_get_users(),
+    'POST /attendance/mark':     lambda: server.api_mark_attendance(
+                                     {'studentId': 3, 'date': '2025-01-05', 'status': 'late'}),
+}
+
+
+def _time(fn, calls):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--students', type=int, default=400)
+    ap.add_argument('--calls',    type=int, default=2000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server.DB_PATH = os.path.join(tmp, 'bench.db')
+        _seed(args.students)
+        pooled_get_conn = server.get_conn
+
+        print(f'{"endpoint":<28} {"fresh µs":>10} {"pooled µs":>10} {"speedup":>8}')
+        for name, fn in ENDPOINTS.items():
+            server.get_conn = _legacy_get_conn
+            fresh = _time(fn, args.calls)
+            server.get_conn = pooled_get_conn
+            pooled = _time(fn, args.calls)
+            print(f'{name:<28} {fresh:>10.1f} {pooled:>10.1f} {fresh / pooled:>7.1f}×')
+        server.close_all_conns()
+
+
+if __name__ == '__main__':
+    main()
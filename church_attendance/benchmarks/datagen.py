@@ -0,0 +1,172 @@
+"""
+datagen.py — a realistic church database at any scale.
+
+Creates the schema with server.init_db, then fills it with students and
+servants with Arabic names, WhatsApp numbers, birthdates that fit their
+grade, and --years of weekly Sunday attendance for both. Every student has
+their own habits: some hardly miss a week, some drift in late or drop
+off. The counters on app_students / app_teachers, attendance_history and
+the rollups are derived from the generated log, so the database looks like
+one the server itself has been saving into for years. One servant account
+per grade (`servant_<grade>`, password `servant`) is added for load tests.
+
+    python -m benchmarks.datagen church-big.db --students 4000 --teachers 300 --years 5
+"""
+
+import argparse, datetime, os, random, sqlite3, sys, time
+
+import server
+
+
+MALE = ['مينا', 'بيشوي', 'مارك', 'كيرلس', 'أبانوب', 'بيتر', 'جورج', 'مايكل', 'ديفيد', 'أندرو',
+        'يوسف', 'بولس', 'بطرس', 'توماس', 'فيلوباتير', 'مكاريوس', 'أنطونيوس', 'رافائيل', 'إبرام', 'شنودة']
+FEMALE = ['مريم', 'ماريا', 'يوستينا', 'كاترين', 'مارينا', 'ديميانة', 'إيريني', 'فيرينا', 'مونيكا', 'ساره',
+          'رفقة', 'أنجيل', 'ميرنا', 'جوليا', 'كارولين', 'مادونا', 'هايدي', 'دميانة', 'نانسي', 'مارتينا']
+FAMILY = ['جرجس', 'حنا', 'عزيز', 'فهمي', 'لبيب', 'ميخائيل', 'وهيب', 'نصيف', 'صموئيل', 'رزق',
+          'عياد', 'سمعان', 'إسحق', 'يعقوب', 'زكي', 'تادرس', 'منير', 'رمسيس', 'فوزي', 'بشارة',
+          'عبد المسيح', 'عبد الملاك', 'نجيب', 'شكري', 'مجدي', 'عادل', 'سامي', 'ناجي', 'رأفت', 'كمال']
+
+DEPARTMENTS = ('ابتدائي', 'إعدادي وثانوي', 'أنشطة')
+STATUSES    = ('present', 'late', 'absent')
+
+
+def arabic_name(rnd: random.Random, female: bool = None) -> str:
+    """Given name, father's and grandfather's names, as they are written on the roster."""
+    if female is None:
+        female = rnd.random() < 0.5
+    first = rnd.choice(FEMALE if female else MALE)
+    return f'{first} {rnd.choice(FAMILY)} {rnd.choice(FAMILY)}'
+
+
+def _whatsapp(rnd: random.Random) -> str:
+    return '01' + rnd.choice('0125') + f'{rnd.randrange(10**8):08d}'
+
+
+def _birthdate(rnd: random.Random, grade: str, today: datetime.date) -> str:
+    # KG1 children are four; grade n is n + 5
+    age  = {'KG1': 4, 'KG2': 5}.get(grade) or int(grade) + 5
+    born = today.replace(year=today.year - age) - datetime.timedelta(days=rnd.randrange(365))
+    return born.isoformat()
+
+
+def sundays(years: float, end: datetime.date) -> list:
+    """Every Sunday of the last `years` years up to `end`, oldest first."""
+    last = end - datetime.timedelta(days=(end.weekday() + 1) % 7)
+    return [(last - datetime.timedelta(weeks=w)).isoformat() for w in range(int(years * 52) - 1, -1, -1)]
+
+
+def _habits(rnd: random.Random):
+    """(p present, p late) for one person — most come, a few rarely do."""
+    kind = rnd.random()
+    if kind < 0.60:
+        return rnd.uniform(0.80, 0.97), rnd.uniform(0.01, 0.08)
+    if kind < 0.90:
+        return rnd.uniform(0.55, 0.80), rnd.uniform(0.05, 0.15)
+    return rnd.uniform(0.10, 0.45), rnd.uniform(0.00, 0.10)
+
+
+def _log_rows(rnd: random.Random, people: int, dates: list):
+    habits = [_habits(rnd) for _ in range(people)]
+    for date in dates:
+        for pid, (p_present, p_late) in enumerate(habits, 1):
+            r = rnd.random()
+            yield pid, date, 'present' if r < p_present else 'late' if r < p_present + p_late else 'absent'
+
+
+def _derive_counters(conn, people: str, log: str, id_col: str):
+    """Counters and current status from the whole log in one statement."""
+    conn.execute(f'''
+        UPDATE {people} SET
+            present_count = s.p,
+            absent_count  = s.a,
+            total_classes = s.p + s.a,
+            attendance    = ROUND(CAST(s.p AS REAL) / NULLIF(s.p + s.a, 0) * 100),
+            status        = s.last
+        FROM (
+            SELECT {id_col} AS id,
+                   SUM(status IN ('present', 'late')) AS p,
+                   SUM(status = 'absent')             AS a,
+                   (SELECT status FROM {log} x WHERE x.{id_col} = l.{id_col}
+                    ORDER BY record_date DESC LIMIT 1) AS last
+            FROM {log} l GROUP BY {id_col}
+        ) s
+        WHERE {people}.id = s.id
+    ''')
+
+
+def populate(db_path: str, students: int = 400, teachers: int = 130, years: float = 2,
+             end: datetime.date = None, seed: int = 1) -> list:
+    """
+    Create and fill a database at db_path. Returns the logged dates, oldest
+    first. Uses server.DB_PATH, which is left pointing at db_path.
+    """
+    end = end or datetime.date.today()
+    rnd = random.Random(seed)
+    server.DB_PATH = db_path
+    server.init_db()
+    server.close_all_conns()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+
+    roster = []
+    for _ in range(students):
+        name  = arabic_name(rnd)
+        grade = rnd.choice(server.GRADES)
+        roster.append((name, grade, _whatsapp(rnd), name.split()[0][:2], _birthdate(rnd, grade, end)))
+    conn.executemany('INSERT INTO app_students (name, grade, whatsapp, avatar, birthdate) VALUES (?,?,?,?,?)', roster)
+    conn.executemany(
+        'INSERT INTO app_teachers (name, subject, assigned_class, whatsapp, avatar) VALUES (?,?,?,?,?)',
+        [(name, rnd.choice(DEPARTMENTS), rnd.choice(server.GRADES), _whatsapp(rnd), name.split()[0][:2])
+         for name in (arabic_name(rnd) for _ in range(teachers))])
+
+    dates = sundays(years, end)
+    conn.executemany('INSERT INTO attendance_log (student_id, record_date, status) VALUES (?,?,?)',
+                     _log_rows(rnd, students, dates))
+    conn.executemany('INSERT INTO teacher_attendance_log (teacher_id, record_date, status) VALUES (?,?,?)',
+                     _log_rows(rnd, teachers, dates))
+    conn.execute('''
+        INSERT INTO attendance_history (record_date, present_count, absent_count, late_count)
+        SELECT record_date, SUM(status = 'present'), SUM(status = 'absent'), SUM(status = 'late')
+        FROM attendance_log GROUP BY record_date
+    ''')
+    _derive_counters(conn, 'app_students', 'attendance_log', 'student_id')
+    _derive_counters(conn, 'app_teachers', 'teacher_attendance_log', 'teacher_id')
+    server.rebuild_rollups(conn)
+
+    pw_hash = server.PasswordHasher()._hash('servant')
+    conn.executemany(
+        'INSERT OR IGNORE INTO app_users (name, username, password_hash, role, assigned_class) VALUES (?,?,?,?,?)',
+        [(arabic_name(rnd), f'servant_{grade}', pw_hash, 'teacher', grade) for grade in server.GRADES])
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    return dates
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('db', help='database file to create')
+    ap.add_argument('--students', type=int, default=400)
+    ap.add_argument('--teachers', type=int, default=130)
+    ap.add_argument('--years',    type=float, default=2, help='years of weekly attendance')
+    ap.add_argument('--seed',     type=int, default=1)
+    ap.add_argument('--force',    action='store_true', help='replace db if it exists')
+    args = ap.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            sys.exit(f'{args.db} exists (use --force to replace it)')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    t0    = time.perf_counter()
+    dates = populate(args.db, args.students, args.teachers, args.years, seed=args.seed)
+    print(f'{args.students} students, {args.teachers} teachers, {len(dates)} Sundays '
+          f'({dates[0]} … {dates[-1]}) in {time.perf_counter() - t0:.1f}s → {args.db}')
+
+
+if __name__ == '__main__':
+    main()
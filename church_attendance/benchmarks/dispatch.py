@@ -0,0 +1,82 @@
+"""
+dispatch.py — route lookup cost for every registered route.
+
+For each route in server.router, builds a concrete path (path parameters
+filled with 7), then times router.match() on all of them, plus an unknown
+path. For comparison it times a first-match scan over one compiled regex per
+route, the shape of the old if/elif chain, with routes in the same order.
+Last, it times router.call() with no hooks and with two no-op hooks, so a
+timing or caching hook's own overhead can be read off.
+
+    python -m benchmarks.dispatch --rounds 20000
+"""
+
+import argparse, re, time
+
+import server
+
+
+def _concrete(pattern: str) -> str:
+    return re.sub(r'\{[^}]+\}', '7', pattern)
+
+
+def _regex(pattern: str):
+    return re.compile('^' + re.sub(r'\{[^}:]+(:int)?\}', lambda m: r'\d+' if m.group(1) else r'[^/]+',
+                                    re.escape(pattern).replace(r'\{', '{').replace(r'\}', '}')) + '$')
+
+
+def _per_call_ns(fn, calls: int, rounds: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - t0) / (rounds * calls) * 1e9
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rounds', type=int, default=20000)
+    args = ap.parse_args()
+
+    router  = server.router
+    targets = [(r.method, _concrete(r.pattern)) for r in router.routes]
+    static  = [t for t, r in zip(targets, router.routes) if '{' not in r.pattern]
+    params  = [t for t, r in zip(targets, router.routes) if '{' in r.pattern]
+    misses  = [('GET', '/api/nope'), ('PUT', '/api/students/abc')]
+    scan    = [(r.method, _regex(r.pattern)) for r in router.routes]
+
+    def linear(method, path):
+        for m, rx in scan:
+            if m == method and rx.match(path):
+                return rx
+        return None
+
+    rows = [
+        ('router.match  static',  static),
+        ('router.match  params',  params),
+        ('router.match  miss',    misses),
+    ]
+    print(f'{len(router.routes)} routes ({len(static)} static, {len(params)} with parameters)\n')
+    print(f'{"lookup":<24} {"ns/call":>9} {"regex scan":>11}')
+    for name, paths in rows:
+        fast = _per_call_ns(lambda: [router.match(m, p) for m, p in paths], len(paths), args.rounds)
+        slow = _per_call_ns(lambda: [linear(m, p) for m, p in paths], len(paths), args.rounds)
+        print(f'{name:<24} {fast:>9.0f} {slow:>11.0f}')
+
+    route, found = router.match('GET', '/api/students/7/history')
+    req  = server.Request('GET', '/api/students/7/history', '', found, route)
+    noop = lambda h, req, call_next: call_next()
+    saved_func = route.func
+    route.func = lambda h, req: None
+    try:
+        print()
+        for hooks in ([], [noop, noop]):
+            router.hooks[:] = hooks
+            ns = _per_call_ns(lambda: router.call(None, req), 1, args.rounds * 10)
+            print(f'{f"router.call  {len(hooks)} hooks":<24} {ns:>9.0f}')
+    finally:
+        router.hooks.clear()
+        route.func = saved_func
+
+
+if __name__ == '__main__':
+    main()
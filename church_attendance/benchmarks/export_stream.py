@@ -0,0 +1,78 @@
+"""
+export_stream.py — memory and time-to-first-byte of the streamed exports.
+
+Fills a database with `--weeks` of log for `--students` students, then
+writes the full attendance-log export as CSV and as XLSX into a sink that
+only counts bytes, the way send_export writes into the socket. Reports the
+time until the first bytes left, the total time, the output size and the
+peak Python allocation (tracemalloc) — the last should stay flat as the
+log grows.
+
+    python -m benchmarks.export_stream --students 1000 --weeks 26,104,260
+"""
+
+import argparse, os, random, tempfile, time, tracemalloc
+
+import server
+from spreadsheet import write_csv, write_xlsx
+
+
+class _Sink:
+    """Counts what would have gone down the socket."""
+
+    def __init__(self):
+        self.size  = 0
+        self.first = None
+
+    def write(self, data):
+        if self.first is None:
+            self.first = time.perf_counter()
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def _populate(students: int, weeks: int):
+    server.init_db()
+    conn = server.get_conn()
+    rnd  = random.Random(3)
+    conn.executemany('INSERT INTO app_students (name, grade) VALUES (?, ?)',
+                     [(f'طالب {i}', rnd.choice(server.GRADES)) for i in range(students)])
+    dates = [f'{2020 + w // 52}-{w % 52 // 4 + 1:02d}-{w % 4 * 7 + 1:02d}' for w in range(weeks)]
+    conn.executemany('INSERT OR IGNORE INTO attendance_log (student_id, record_date, status) VALUES (?,?,?)',
+                     ((sid, d, rnd.choice(['present', 'absent', 'late'])) for d in dates
+                      for sid in range(1, students + 1)))
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--students', type=int, default=1000)
+    ap.add_argument('--weeks',    default='26,104,260')
+    args = ap.parse_args()
+
+    print(f'{"rows":>8} {"fmt":>5} {"first byte ms":>14} {"total ms":>9} {"MiB out":>8} {"peak KiB":>9}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for weeks in map(int, args.weeks.split(',')):
+            server.DB_PATH = os.path.join(tmp, f'export_{weeks}.db')
+            _populate(args.students, weeks)
+            for fmt, write in (('csv', write_csv), ('xlsx', write_xlsx)):
+                sink = _Sink()
+                tracemalloc.start()
+                t0 = time.perf_counter()
+                header, rows = server.export_attendance_log()
+                write(sink, header, rows)
+                total = time.perf_counter() - t0
+                peak  = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f'{args.students * weeks:>8} {fmt:>5} {(sink.first - t0) * 1000:>14.1f} '
+                      f'{total * 1000:>9.0f} {sink.size / 2**20:>8.1f} {peak / 1024:>9.0f}')
+            server.close_all_conns()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+load_test.py — N concurrent servants marking attendance against each server mode.
+
+Starts `server.py` in a subprocess for every --mode on a throwaway database,
+optionally parks one stalled client on the socket (a phone that dropped off
+Wi-Fi mid-request), then fires marks from N threads and reports throughput
+and p50/p99 latency.
+
+    python -m benchmarks.load_test --clients 12 --marks 40
+"""
+
+import argparse, json, os, socket, sqlite3, statistics, subprocess, sys, tempfile, threading, time
+import urllib.request
+
+HERE   = os.path.dirname(os.path.abspath(__file__))
+SERVER = os.path.join(os.path.dirname(HERE), 'server.py')
+
+
+def _seed(db_path: str, students: int):
+    env = dict(os.environ, CHURCH_DB=db_path)
+    subprocess.run([sys.executable, '-c', 'import server; server.init_db()'],
+                   cwd=os.path.dirname(SERVER), env=env, check=True, stdout=subprocess.DEVNULL)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO app_students (name, grade) VALUES (?, ?)",
+        [(f'طالب {i}', str(i % 12 + 1)) for i in range(students)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def _request(port, method, path, body=None, token=None):
+    req = urllib.request.Request(f'http://127.0.0.1:{port}/api{path}', method=method,
+                                 data=json.dumps(body).encode() if body is not None else None)
+    req.add_header('Content-Type', 'application/json')
+    if token:
+        req.add_header('Authorization', f'Bearer {token}')
+    with urllib.request.urlopen(req, timeout=60) as res:
+        return json.loads(res.read() or b'{}')
+
+
+def _wait_ready(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('server did not start')
+
+
+def run_mode(mode, port, clients, marks, students, workers, stall):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'bench.db')
+        _seed(db, students)
+        proc = subprocess.Popen(
+            [sys.executable, SERVER, '--mode', mode, '--port', str(port), '--workers', str(workers)],
+            env=dict(os.environ, CHURCH_DB=db), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        stalled = None
+        try:
+            _wait_ready(port)
+            token = _request(port, 'POST', '/login', {'username': 'admin', 'password': ''})['token']
+            if stall:
+                # half a request line, never finished — holds the single-threaded server hostage
+                stalled = socket.create_connection(('127.0.0.1', port))
+                stalled.sendall(b'GET /api/students HTTP/1.1\r\n')
+
+            latencies, lock = [], threading.Lock()
+
+            def servant(n):
+                mine = []
+                for i in range(marks):
+                    sid = (n * marks + i) % students + 1
+                    t0  = time.perf_counter()
+                    _request(port, 'POST', '/attendance/mark',
+                             {'studentId': sid, 'status': 'present', 'date': '2025-01-05'}, token)
+                    mine.append(time.perf_counter() - t0)
+                with lock:
+                    latencies.extend(mine)
+
+            threads = [threading.Thread(target=servant, args=(n,)) for n in range(clients)]
+            t0 = time.perf_counter()
+            for t in threads: t.start()
+            for t in threads: t.join()
+            wall = time.perf_counter() - t0
+        finally:
+            if stalled:
+                stalled.close()
+            proc.terminate()
+            proc.wait()
+
+    latencies.sort()
+    return {
+        'mode':       mode,
+        'requests':   len(latencies),
+        'throughput': len(latencies) / wall,
+        'p50_ms':     statistics.median(latencies) * 1000,
+        'p99_ms':     latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--modes',    default='single,threads,async')
+    ap.add_argument('--clients',  type=int, default=12)
+    ap.add_argument('--marks',    type=int, default=40, help='marks per client')
+    ap.add_argument('--students', type=int, default=400)
+    ap.add_argument('--workers',  type=int, default=16)
+    ap.add_argument('--port',     type=int, default=5099)
+    ap.add_argument('--stall',    action='store_true',
+                    help='park a half-sent request on the server first (the single mode waits out its timeout)')
+    args = ap.parse_args()
+
+    print(f'{args.clients} clients × {args.marks} marks, {args.students} students'
+          f'{", one stalled client" if args.stall else ""}\n')
+    print(f'{"mode":<8} {"reqs":>6} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9}')
+    for mode in args.modes.split(','):
+        r = run_mode(mode, args.port, args.clients, args.marks, args.students, args.workers, args.stall)
+        print(f'{r["mode"]:<8} {r["requests"]:>6} {r["throughput"]:>9.1f} {r["p50_ms"]:>9.2f} {r["p99_ms"]:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
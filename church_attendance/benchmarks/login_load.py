@@ -0,0 +1,109 @@
+"""
+login_load.py — login latency and marking latency during a burst of logins.
+
+Starts `server.py` (threads mode) on a throwaway database whose servant
+accounts all have scrypt hashes, then runs two phases: servants marking
+attendance on their own, and the same marking while --logins clients log
+in back to back. Reports login p50/p95 and how many were turned away with
+503 (the hashing queue was full), next to the marking p50/p95 of each
+phase — marking should barely move.
+
+    python -m benchmarks.login_load --logins 32 --seconds 5
+"""
+
+import argparse, os, sqlite3, subprocess, sys, tempfile, threading, time
+import urllib.error
+
+import server
+from benchmarks.load_test import SERVER, _request, _seed, _wait_ready
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else float('nan')
+
+
+def _add_servants(db_path: str, count: int, password: str):
+    pw_hash = server.PasswordHasher()._hash(password)
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO app_users (name, username, password_hash, role, assigned_class) VALUES (?,?,?,?,?)',
+                     [(f'خادم {i}', f'servant{i}', pw_hash, 'teacher', str(i % 12 + 1)) for i in range(count)])
+    conn.commit()
+    conn.close()
+
+
+def _phase(port, token, seconds, markers, logins, students):
+    stop      = time.perf_counter() + seconds
+    lock      = threading.Lock()
+    marks, ok, busy = [], [], [0]
+
+    def marker(n):
+        mine, i = [], 0
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            _request(port, 'POST', '/attendance/mark',
+                     {'studentId': (n * 997 + i) % students + 1, 'status': 'present', 'date': '2025-01-05'}, token)
+            mine.append(time.perf_counter() - t0)
+            i += 1
+        with lock:
+            marks.extend(mine)
+
+    def login(n):
+        mine, refused = [], 0
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            try:
+                _request(port, 'POST', '/login', {'username': f'servant{n}', 'password': 'servant'})
+                mine.append(time.perf_counter() - t0)
+            except urllib.error.HTTPError as e:
+                if e.code != 503:
+                    raise
+                refused += 1
+                time.sleep(0.05)
+        with lock:
+            ok.extend(mine)
+            busy[0] += refused
+
+    threads = ([threading.Thread(target=marker, args=(n,)) for n in range(markers)]
+               + [threading.Thread(target=login, args=(n,)) for n in range(logins)])
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return marks, ok, busy[0]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--logins',   type=int, default=32, help='clients logging in back to back')
+    ap.add_argument('--markers',  type=int, default=4,  help='clients marking attendance')
+    ap.add_argument('--seconds',  type=float, default=5)
+    ap.add_argument('--students', type=int, default=400)
+    ap.add_argument('--workers',  type=int, default=16)
+    ap.add_argument('--port',     type=int, default=5098)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'bench.db')
+        _seed(db, args.students)
+        _add_servants(db, args.logins, 'servant')
+        proc = subprocess.Popen(
+            [sys.executable, SERVER, '--mode', 'threads', '--port', str(args.port), '--workers', str(args.workers)],
+            env=dict(os.environ, CHURCH_DB=db), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(args.port)
+            token = _request(args.port, 'POST', '/login', {'username': 'admin', 'password': ''})['token']
+            print(f'{args.markers} markers, {args.workers} HTTP workers, '
+                  f'{server.PW_HASH_WORKERS} hash workers + {server.PW_HASH_QUEUE} queued\n')
+            print(f'{"phase":<16} {"mark p50":>9} {"mark p95":>9} {"logins":>7} {"503s":>6} '
+                  f'{"login p50":>10} {"login p95":>10}')
+            for name, logins in (('marking only', 0), (f'+{args.logins} logins', args.logins)):
+                marks, ok, busy = _phase(args.port, token, args.seconds, args.markers, logins, args.students)
+                print(f'{name:<16} {_pct(marks, .5):>9.2f} {_pct(marks, .95):>9.2f} {len(ok):>7} {busy:>6} '
+                      f'{_pct(ok, .5):>10.1f} {_pct(ok, .95):>10.1f}')
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+reconcile.py — how long server.reconcile_counters takes on a long history.
+
+Generates --years of weekly attendance with benchmarks.datagen (whose
+counters and attendance_history are derived from the log, so they are the
+reference), knocks --drift students' counters and a few history days off,
+then times the reconcile. Runs it a second time on the repaired database,
+the cost of `--reconcile` on a normal startup, and checks both leave
+exactly the reference values behind.
+
+    python -m benchmarks.reconcile --students 2000 --teachers 150 --years 10
+"""
+
+import argparse, os, random, tempfile, time
+
+import server
+from benchmarks import datagen
+
+
+def _state(conn) -> tuple:
+    return tuple(
+        [tuple(r) for r in conn.execute(f'SELECT id, present_count, absent_count, total_classes, attendance, status'
+                                         f' FROM {table} ORDER BY id')]
+        for table in ('app_students', 'app_teachers')
+    ) + ([tuple(r) for r in conn.execute(
+        'SELECT record_date, present_count, absent_count, late_count FROM attendance_history ORDER BY 1')],)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--students', type=int, default=2000)
+    ap.add_argument('--teachers', type=int, default=150)
+    ap.add_argument('--years',    type=float, default=10)
+    ap.add_argument('--drift',    type=int, default=200, help='students whose counters are knocked off')
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'church.db')
+        t0 = time.perf_counter()
+        dates = datagen.populate(db, args.students, args.teachers, args.years)
+        print(f'{args.students} students, {args.teachers} teachers, {len(dates)} Sundays '
+              f'generated in {time.perf_counter() - t0:.1f}s')
+        server._pool_local.conn = None           # populate closed this thread's pooled connection
+        conn = server.get_conn()
+        reference = _state(conn)
+
+        rnd = random.Random(2)
+        conn.executemany('UPDATE app_students SET present_count = present_count + 1, total_classes = total_classes + 1'
+                         ' WHERE id=?', [(i,) for i in rnd.sample(range(1, args.students + 1), args.drift)])
+        conn.executemany('UPDATE attendance_history SET present_count = present_count * 2 WHERE record_date=?',
+                         [(d,) for d in rnd.sample(dates, 5)])
+        conn.commit()
+
+        for label in ('drifted', 'clean'):
+            t0    = time.perf_counter()
+            fixed = server.reconcile_counters()
+            took  = time.perf_counter() - t0
+            ok    = _state(server.get_conn()) == reference
+            print(f'{label:<8} reconcile {took * 1000:>7.0f} ms  {fixed}  {"matches the log" if ok else "MISMATCH"}')
+        server.close_all_conns()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+roster_import.py — one api_add_student per row vs api_import for a roster file.
+
+Builds a CSV roster, adds it row by row through api_add_student (what the
+page did: one insert, commit and re-select per student) and through one
+api_import call on a fresh database, checks both end with the same roster,
+and reports the speedup. HTTP round-trips aren't included, so the real
+gap is larger.
+
+    python -m benchmarks.roster_import --sizes 400,5000
+"""
+
+import argparse, csv, io, os, random, tempfile, time
+
+import server
+
+_GIVEN  = ['مينا', 'بيشوي', 'مارك', 'كيرلس', 'مريم', 'ماريا', 'يوستينا', 'أبانوب', 'فادي', 'دميانة']
+_FAMILY = ['جرجس', 'حنا', 'عزيز', 'فهمي', 'شنودة', 'لبيب', 'ميخائيل', 'رزق', 'بطرس', 'سمعان']
+
+
+def _roster(n: int) -> list:
+    rnd = random.Random(n)
+    return [{'name': f'{rnd.choice(_GIVEN)} {rnd.choice(_FAMILY)} {i}', 'grade': rnd.choice(server.GRADES),
+             'whatsapp': f'010{rnd.randrange(10**8):08d}'} for i in range(n)]
+
+
+def _csv(rows: list) -> bytes:
+    out = io.StringIO()
+    w = csv.DictWriter(out, fieldnames=['name', 'grade', 'whatsapp'])
+    w.writeheader()
+    w.writerows(rows)
+    return out.getvalue().encode('utf-8-sig')
+
+
+def _fresh(path):
+    server.DB_PATH = path
+    server.init_db()
+
+
+def _roster_of(path):
+    server.DB_PATH = path
+    conn = server.get_conn()
+    return sorted(tuple(r) for r in conn.execute('SELECT name, grade, whatsapp, avatar FROM app_students'))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--sizes', default='400,5000')
+    args = ap.parse_args()
+
+    print(f'{"rows":>6} {"per-row ms":>11} {"import ms":>10} {"speedup":>8}  identical')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in map(int, args.sizes.split(',')):
+            rows = _roster(n)
+            a, b = os.path.join(tmp, f'a_{n}.db'), os.path.join(tmp, f'b_{n}.db')
+
+            _fresh(a)
+            t0 = time.perf_counter()
+            for row in rows:
+                server.api_add_student(row)
+            t_rows = time.perf_counter() - t0
+
+            _fresh(b)
+            body = _csv(rows)
+            t0 = time.perf_counter()
+            server.api_import('student', body)
+            t_import = time.perf_counter() - t0
+
+            same = _roster_of(a) == _roster_of(b)
+            print(f'{n:>6} {t_rows * 1000:>11.1f} {t_import * 1000:>10.1f} {t_rows / t_import:>7.1f}×'
+                  f'  {"yes" if same else "NO"}')
+            server.close_all_conns()
+
+
+if __name__ == '__main__':
+    main()
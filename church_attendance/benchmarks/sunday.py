@@ -0,0 +1,243 @@
+"""
+sunday.py — the Sunday-morning workload, end to end over HTTP.
+
+Generates a database with benchmarks.datagen (or uses --db), starts
+`server.py` on it, and lets one servant per grade plus --admins
+administrators run the app the way they do on a Sunday, --sessions times
+each:
+
+    servant  login → Store.reload (/sync, /attendance/history) → marks in
+             bursts of --burst (/attendance/mark-batch) → delta /sync →
+             save → today's log page → reports → a few student histories →
+             logout
+    admin    login → Store.reload (with teachers) → servant attendance
+             marks and save → the full log → every report → logout
+
+Requests ask for gzip like a browser does. A login turned away with 503
+(hashing queue full) is retried a second later and counted as an error.
+Reports throughput and p50/p95/p99 per endpoint; --json writes the numbers
+out and --compare prints each endpoint's p95 against a previous run's file.
+
+    python -m benchmarks.sunday --students 2000 --years 3 --sessions 3 --json run.json
+    python -m benchmarks.sunday --students 2000 --years 3 --sessions 3 --compare run.json
+"""
+
+import argparse, datetime, gzip, http.client, json, os, random, subprocess, sys, tempfile, threading, time
+
+from benchmarks import datagen
+from benchmarks.load_test import SERVER, _wait_ready
+from benchmarks.login_load import _pct
+
+
+class Client:
+    """One browser: a session token and the timings of every call it made."""
+
+    def __init__(self, port: int, timings: dict, lock: threading.Lock):
+        self.port    = port
+        self.token   = None
+        self.status  = None
+        self.timings = timings
+        self.lock    = lock
+
+    def call(self, label: str, method: str, path: str, body=None):
+        headers = {'Accept-Encoding': 'gzip', 'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        t0   = time.perf_counter()
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            conn.request(method, '/api' + path, json.dumps(body) if body is not None else None, headers)
+            res = conn.getresponse()
+            raw = res.read()
+            self.status = res.status
+            ok  = res.status < 400
+        except OSError:
+            raw, ok, self.status = b'', False, None
+        finally:
+            conn.close()
+        if ok and res.getheader('Content-Encoding') == 'gzip':
+            raw = gzip.decompress(raw)
+        took = time.perf_counter() - t0
+        with self.lock:
+            entry = self.timings.setdefault(label, [[], 0])
+            entry[0].append(took)
+            entry[1] += not ok
+        return json.loads(raw) if ok and raw and raw[:1] in b'{[' else None
+
+    def login(self, username: str, password: str, attempts: int = 10):
+        """Log in, waiting out 503s from a full hashing queue (they count as errors)."""
+        for _ in range(attempts):
+            res = self.call('POST /login', 'POST', '/login', {'username': username, 'password': password})
+            if self.status != 503:
+                break
+            time.sleep(1)
+        self.token = res and res.get('token')
+        return self.token is not None
+
+
+def _ids(table) -> list:
+    """Ids out of a columnar {columns, rows} list."""
+    i = table['columns'].index('id')
+    return [row[i] for row in table['rows']]
+
+
+def _reload(c: Client, today: str):
+    """What Store.reload and the dashboard fetch right after login."""
+    snap = c.call('GET /sync (full)', 'GET', f'/sync?since=0&date={today}&format=columnar')
+    c.call('GET /attendance/history', 'GET', '/attendance/history')
+    return snap
+
+
+def _mark_and_save(c: Client, rnd, ids, today, burst, think, kind='attendance'):
+    marks = {}
+    order = ids[:]
+    rnd.shuffle(order)
+    for i in range(0, len(order), burst):
+        chunk = [{'id': pid, 'status': rnd.choices(datagen.STATUSES, (80, 7, 13))[0]} for pid in order[i:i + burst]]
+        c.call(f'POST /{kind}/mark-batch', 'POST', f'/{kind}/mark-batch', {'date': today, 'marks': chunk})
+        marks.update((str(m['id']), m['status']) for m in chunk)
+        time.sleep(think)
+    c.call(f'POST /{kind}/save', 'POST', f'/{kind}/save', {'date': today, 'records': marks})
+
+
+def servant_session(c: Client, grade: str, rnd, today: str, month_ago: str, burst: int, think: float):
+    if not c.login(f'servant_{grade}', 'servant'):
+        return
+    snap = _reload(c, today)
+    ids  = _ids(snap['students']) if snap else []
+    time.sleep(think)
+    _mark_and_save(c, rnd, ids, today, burst, think)
+    if snap:
+        c.call('GET /sync (delta)', 'GET', f'/sync?since={snap["version"]}&date={today}&format=columnar')
+    c.call('GET /attendance/log (page)', 'GET', f'/attendance/log?date={today}&limit=200')
+    c.call('GET /attendance/log (count)', 'GET', f'/attendance/log?date={today}&count=1')
+    c.call('GET /reports/grades', 'GET', '/reports/grades')
+    c.call('GET /reports/summary', 'GET', f'/reports/summary?from={month_ago}')
+    c.call('GET /reports/attention', 'GET', '/reports/attention?threshold=75')
+    for sid in rnd.sample(ids, min(3, len(ids))):
+        c.call('GET /students/{id}/history', 'GET', f'/students/{sid}/history')
+    c.call('POST /logout', 'POST', '/logout', {})
+
+
+def admin_session(c: Client, rnd, today: str, month_ago: str, burst: int, think: float):
+    if not c.login('admin', ''):
+        return
+    snap = _reload(c, today)
+    time.sleep(think)
+    if snap and snap.get('teachers'):
+        _mark_and_save(c, rnd, _ids(snap['teachers']), today, burst, think, kind='teacher-attendance')
+    c.call('GET /attendance/log (page)', 'GET', '/attendance/log?limit=200')
+    c.call('GET /attendance/log (count)', 'GET', '/attendance/log?count=1')
+    c.call('GET /teacher-attendance/log', 'GET', '/teacher-attendance/log?limit=200')
+    c.call('GET /reports/grades', 'GET', '/reports/grades')
+    c.call('GET /reports/summary', 'GET', f'/reports/summary?from={month_ago}')
+    c.call('GET /reports/attention', 'GET', '/reports/attention?threshold=75')
+    c.call('GET /reports/monthly', 'GET', '/reports/monthly')
+    c.call('GET /reports/departments', 'GET', f'/reports/departments?from={month_ago}')
+    c.call('GET /users', 'GET', '/users')
+    c.call('POST /logout', 'POST', '/logout', {})
+
+
+def run(port: int, admins: int, sessions: int, burst: int, think: float, stagger: float, grades):
+    timings, lock = {}, threading.Lock()
+    today     = datetime.date.today().isoformat()
+    month_ago = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
+
+    def worker(n, session, *args):
+        rnd = random.Random(n)
+        time.sleep(rnd.uniform(0, stagger))
+        for _ in range(sessions):
+            session(Client(port, timings, lock), *args, rnd, today, month_ago, burst, think)
+
+    threads = ([threading.Thread(target=worker, args=(n, servant_session, g)) for n, g in enumerate(grades)]
+               + [threading.Thread(target=worker, args=(len(grades) + n, admin_session)) for n in range(admins)])
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return timings, time.perf_counter() - t0
+
+
+def summarise(timings: dict, elapsed: float) -> dict:
+    total = sum(len(v[0]) for v in timings.values())
+    return {
+        'requests': total,
+        'seconds':  round(elapsed, 3),
+        'rps':      round(total / elapsed, 1),
+        'endpoints': {
+            label: {'n': len(times), 'errors': errors,
+                    'p50': round(_pct(times, .50), 2), 'p95': round(_pct(times, .95), 2),
+                    'p99': round(_pct(times, .99), 2)}
+            for label, (times, errors) in sorted(timings.items())
+        },
+    }
+
+
+def report(result: dict, baseline: dict = None):
+    print(f'{result["requests"]} requests in {result["seconds"]:.1f}s — {result["rps"]:.1f} req/s\n')
+    print(f'{"endpoint":<34} {"n":>6} {"err":>4} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}'
+          + (f' {"was p95":>8} {"Δ p95":>7}' if baseline else ''))
+    for label, e in result['endpoints'].items():
+        line = f'{label:<34} {e["n"]:>6} {e["errors"]:>4} {e["p50"]:>8.1f} {e["p95"]:>8.1f} {e["p99"]:>8.1f}'
+        was  = (baseline or {}).get('endpoints', {}).get(label)
+        if was:
+            line += f' {was["p95"]:>8.1f} {(e["p95"] / was["p95"] - 1) * 100 if was["p95"] else 0:>+6.0f}%'
+        print(line)
+    if baseline:
+        print(f'\nthroughput {result["rps"]:.1f} req/s, was {baseline["rps"]:.1f}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--db',       help='use this database (made by benchmarks.datagen) instead of generating one; '
+                                       'it is written to')
+    ap.add_argument('--students', type=int, default=400)
+    ap.add_argument('--teachers', type=int, default=130)
+    ap.add_argument('--years',    type=float, default=2)
+    ap.add_argument('--admins',   type=int, default=2)
+    ap.add_argument('--sessions', type=int, default=3, help='sessions per servant / admin')
+    ap.add_argument('--burst',    type=int, default=8, help='marks per mark-batch request')
+    ap.add_argument('--think',    type=float, default=0.0, help='seconds between steps')
+    ap.add_argument('--stagger',  type=float, default=1.0, help='spread session starts over this many seconds')
+    ap.add_argument('--mode',     default='threads')
+    ap.add_argument('--workers',  type=int, default=16)
+    ap.add_argument('--port',     type=int, default=5096)
+    ap.add_argument('--json',     help='write the results here')
+    ap.add_argument('--compare',  help='results of an earlier run to compare against')
+    args = ap.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = args.db or os.path.join(tmp, 'sunday.db')
+        if not args.db:
+            t0 = time.perf_counter()
+            datagen.populate(db, args.students, args.teachers, args.years)
+            print(f'generated {args.students} students, {args.teachers} teachers, '
+                  f'{args.years:g} years in {time.perf_counter() - t0:.1f}s')
+        proc = subprocess.Popen(
+            [sys.executable, SERVER, '--mode', args.mode, '--port', str(args.port), '--workers', str(args.workers)],
+            env=dict(os.environ, CHURCH_DB=db), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(args.port)
+            timings, elapsed = run(args.port, args.admins, args.sessions, args.burst, args.think,
+                                   args.stagger, datagen.server.GRADES)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    result = summarise(timings, elapsed)
+    result['config'] = {k: v for k, v in vars(args).items() if k not in ('json', 'compare')}
+    print(f'{len(datagen.server.GRADES)} servants + {args.admins} admins × {args.sessions} sessions, '
+          f'{args.mode} mode, {args.workers} workers')
+    report(result, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
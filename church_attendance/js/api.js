@@ -5,11 +5,20 @@
 
 const Api = (() => {
 
+    // GET endpoint → { token, etag, data } for responses the server tagged with an
+    // ETag; re-reads send If-None-Match and a 304 hands back the kept copy.
+    const validated = new Map();
+
     async function request(endpoint, options = {}) {
-        const headers = { 'Content-Type': 'application/json' };
+        const headers = { 'Content-Type': options.contentType || 'application/json' };
         if (Store.token) headers['Authorization'] = `Bearer ${Store.token}`;
 
-        const res = await fetch(API_BASE + endpoint, { headers, ...options });
+        const isGet  = !options.method || options.method === 'GET';
+        const cached = isGet ? validated.get(endpoint) : undefined;
+        if (cached && cached.token === Store.token) headers['If-None-Match'] = cached.etag;
+
+        // no-store: the browser cache would otherwise answer (or hide) the 304 itself
+        const res = await fetch(API_BASE + endpoint, { headers, cache: 'no-store', ...options });
 
         // Session expired / invalid token
         if (res.status === 401) {
@@ -17,8 +26,13 @@ const Api = (() => {
             throw new Error('Unauthorized');
         }
 
+        if (res.status === 304 && cached) return structuredClone(cached.data);
+
         const json = await res.json().catch(() => ({}));
         if (!res.ok) throw new Error(json.error || `HTTP ${res.status}`);
+
+        const etag = res.headers.get('ETag');
+        if (isGet && etag) validated.set(endpoint, { token: Store.token, etag, data: structuredClone(json) });
         return json;
     }
 
@@ -27,6 +41,55 @@ const Api = (() => {
     const post   = (ep, body)     => request(ep, { method: 'POST',   body: JSON.stringify(body) });
     const put    = (ep, body)     => request(ep, { method: 'PUT',    body: JSON.stringify(body) });
     const del    = (ep)           => request(ep, { method: 'DELETE' });
+    const upload = (ep, file)     => request(ep, { method: 'POST',   body: file,
+                                                   contentType: file.type || 'application/octet-stream' });
+
+    /**
+     * Start a server export as a native browser download. The file streams
+     * straight to disk as it's generated; links can't carry headers, so the
+     * session token goes in the query string (export routes only).
+     */
+    function download(endpoint) {
+        const a = document.createElement('a');
+        a.href = `${API_BASE}${endpoint}${endpoint.includes('?') ? '&' : '?'}token=${encodeURIComponent(Store.token)}`;
+        a.download = '';
+        a.click();
+    }
+
+    /**
+     * Coalesce {id, status} marks into batched POSTs to `endpoint`.
+     * Marks queue up until `delayMs` passes without a new tap; a later tap on
+     * the same id replaces the earlier one. flush() sends whatever is queued
+     * now and resolves once every batch sent so far has completed.
+     */
+    function batcher(endpoint, delayMs = 400) {
+        let pending  = new Map();          // id → { status, date }
+        let timer    = null;
+        let inflight = Promise.resolve();
+
+        function queue(id, status, date) {
+            pending.set(id, { status, date });
+            clearTimeout(timer);
+            timer = setTimeout(flush, delayMs);
+        }
+
+        function flush() {
+            clearTimeout(timer);
+            timer = null;
+            if (pending.size) {
+                const byDate = {};
+                for (const [id, m] of pending) (byDate[m.date] ||= []).push({ id, status: m.status });
+                pending  = new Map();
+                inflight = inflight.then(() => Promise.all(
+                    Object.entries(byDate).map(([date, marks]) =>
+                        post(endpoint, { date, marks }).catch(() => {}))
+                ));
+            }
+            return inflight;
+        }
+
+        return { queue, flush };
+    }
 
-    return { get, post, put, del };
+    return { get, post, put, del, upload, download, batcher };
 })();
@@ -23,7 +23,7 @@ window.addEventListener('DOMContentLoaded', () => {
 
         Sidebar.setup();
         Store.reload()
-            .then(() => Dashboard.init())
+            .then(() => { Dashboard.init(); Live.start(); })
             .catch(err => {
                 // If the server rejected the token (401), logout() was already called
                 if (err.message !== 'Unauthorized') {
@@ -10,6 +10,10 @@ const AttendanceLog = (() => {
 
     let currentTab = 'students';   // 'students' | 'teachers'
 
+    // Logs are fetched a page at a time (keyset cursor from the server)
+    const PAGE_SIZE = 200;
+    let   _page     = null;        // { endpoint, params, colspan, rowFn, shown, cursor }
+
     function switchTab(tab, linkEl) {
         currentTab = tab;
 
@@ -60,6 +64,14 @@ const AttendanceLog = (() => {
         }
     }
 
+    async function loadMore() {
+        if (!_page?.cursor) return;
+        const tbody = document.getElementById('logTableBody');
+        const page  = await Api.get(
+            `${_page.endpoint}?${_page.params}&limit=${PAGE_SIZE}&cursor=${encodeURIComponent(_page.cursor)}`);
+        if (tbody) _appendPage(tbody, page);
+    }
+
     function clearFilters() {
         const dateEl  = document.getElementById('logDateFilter');
         const gradeEl = document.getElementById('logGradeFilter');
@@ -68,6 +80,20 @@ const AttendanceLog = (() => {
         load();
     }
 
+    /** Download the log as currently filtered, streamed by the server ('xlsx' | 'csv') */
+    function exportLog(format) {
+        const dateVal  = document.getElementById('logDateFilter')?.value  || '';
+        const gradeVal = document.getElementById('logGradeFilter')?.value || 'all';
+        const params   = new URLSearchParams({ format });
+        if (dateVal) { params.set('from', dateVal); params.set('to', dateVal); }
+        if (currentTab === 'students') {
+            if (gradeVal !== 'all') params.set('grade', gradeVal);
+            Api.download(`/export/attendance-log?${params}`);
+        } else {
+            Api.download(`/export/teacher-attendance-log?${params}`);
+        }
+    }
+
     // ── private ────────────────────────────────────────────────────────────
 
     async function _loadStudentLog(dateVal, gradeVal, thead, tbody, countEl) {
@@ -77,68 +103,84 @@ const AttendanceLog = (() => {
         const effectiveGrade = Store.isAdmin ? gradeVal : Store.assignedClass;
         if (effectiveGrade && effectiveGrade !== 'all') params.set('grade', effectiveGrade);
 
-        const records = await Api.get('/attendance/log?' + params.toString());
-
         thead.innerHTML = `
             <tr>
                 <th>#</th><th>الاسم</th><th>الفصل</th>
                 <th>التاريخ</th><th>الحالة</th>
             </tr>`;
 
-        if (!records.length) {
-            tbody.innerHTML = `
-                <tr>
-                    <td colspan="5" class="text-center text-muted py-4">
-                        لا توجد سجلات بهذه الفلاتر
-                    </td>
-                </tr>`;
-            return;
-        }
-
-        if (countEl) countEl.textContent = records.length + ' سجل';
-        tbody.innerHTML = records.map((r, i) => `
+        await _firstPage('/attendance/log', params.toString(), 5, (r, i) => `
             <tr>
                 <td class="text-muted small">${i + 1}</td>
                 <td><strong>${r.name}</strong></td>
                 <td><span class="grade-badge">${Utils.gradeLabel(r.grade)}</span></td>
                 <td>${Utils.formatDate(r.date)}</td>
                 <td><span class="status-badge status-${r.status}">${Utils.statusLabel(r.status)}</span></td>
-            </tr>`).join('');
+            </tr>`, tbody, countEl);
     }
 
     async function _loadTeacherLog(dateVal, thead, tbody, countEl) {
         const params = new URLSearchParams();
         if (dateVal) params.set('date', dateVal);
 
-        const records = await Api.get('/teacher-attendance/log?' + params.toString());
-
         thead.innerHTML = `
             <tr>
                 <th>#</th><th>الاسم</th><th>المادة</th>
                 <th>الفصل</th><th>التاريخ</th><th>الحالة</th>
             </tr>`;
 
-        if (!records.length) {
+        await _firstPage('/teacher-attendance/log', params.toString(), 6, (r, i) => `
+            <tr>
+                <td class="text-muted small">${i + 1}</td>
+                <td><strong>${r.name}</strong></td>
+                <td>${r.subject}</td>
+                <td>${r.assigned_class || '—'}</td>
+                <td>${Utils.formatDate(r.date)}</td>
+                <td><span class="status-badge status-${r.status}">${Utils.statusLabel(r.status)}</span></td>
+            </tr>`, tbody, countEl);
+    }
+
+    /** Fetch the record count and the first page together, then render */
+    async function _firstPage(endpoint, params, colspan, rowFn, tbody, countEl) {
+        const [{ count }, page] = await Promise.all([
+            Api.get(`${endpoint}?${params}&count=1`),
+            Api.get(`${endpoint}?${params}&limit=${PAGE_SIZE}`),
+        ]);
+
+        if (!page.records.length) {
+            _page = null;
             tbody.innerHTML = `
                 <tr>
-                    <td colspan="6" class="text-center text-muted py-4">
+                    <td colspan="${colspan}" class="text-center text-muted py-4">
                         لا توجد سجلات بهذه الفلاتر
                     </td>
                 </tr>`;
             return;
         }
 
-        if (countEl) countEl.textContent = records.length + ' سجل';
-        tbody.innerHTML = records.map((r, i) => `
-            <tr>
-                <td class="text-muted small">${i + 1}</td>
-                <td><strong>${r.name}</strong></td>
-                <td>${r.subject}</td>
-                <td>${r.assigned_class || '—'}</td>
-                <td>${Utils.formatDate(r.date)}</td>
-                <td><span class="status-badge status-${r.status}">${Utils.statusLabel(r.status)}</span></td>
-            </tr>`).join('');
+        if (countEl) countEl.textContent = count + ' سجل';
+        _page = { endpoint, params, colspan, rowFn, shown: 0, cursor: null };
+        tbody.innerHTML = '';
+        _appendPage(tbody, page);
+    }
+
+    function _appendPage(tbody, page) {
+        document.getElementById('logLoadMoreRow')?.remove();
+        tbody.insertAdjacentHTML('beforeend',
+            page.records.map((r, i) => _page.rowFn(r, _page.shown + i)).join(''));
+        _page.shown  += page.records.length;
+        _page.cursor  = page.next_cursor;
+        if (_page.cursor) {
+            tbody.insertAdjacentHTML('beforeend', `
+                <tr id="logLoadMoreRow">
+                    <td colspan="${_page.colspan}" class="text-center py-2">
+                        <button class="btn btn-outline-primary btn-sm" onclick="AttendanceLog.loadMore()">
+                            <i class="bi bi-arrow-down-circle me-1"></i>تحميل المزيد
+                        </button>
+                    </td>
+                </tr>`);
+        }
     }
 
-    return { switchTab, load, clearFilters };
+    return { switchTab, load, loadMore, clearFilters, exportLog };
 })();
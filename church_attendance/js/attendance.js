@@ -4,6 +4,10 @@
 
 const Attendance = (() => {
 
+    // Taps are coalesced into /attendance/mark-batch requests
+    const _marks = Api.batcher('/attendance/mark-batch');
+    document.addEventListener('visibilitychange', () => { if (document.hidden) _marks.flush(); });
+
     function filterByClass() {
         Store.selectedAttendanceClass = document.getElementById('attendanceClassFilter').value;
         render();
@@ -74,7 +78,7 @@ const Attendance = (() => {
     function mark(studentId, status) {
         const date = Utils.today();
         Store.attendanceRecords[studentId] = { status, date };
-        Api.post('/attendance/mark', { studentId, status, date }).catch(() => {});
+        _marks.queue(studentId, status, date);
         render();
         Dashboard.updateStats();
     }
@@ -95,8 +99,9 @@ const Attendance = (() => {
         if (!hasAny) { alert('لم يتم تسجيل أي حضور اليوم!'); return; }
 
         try {
+            await _marks.flush();
             const result = await Api.post('/attendance/save', { date: today, records });
-            await Store.reload();
+            await Store.sync();
             alert(`تم حفظ الحضور بنجاح! تم تحديث ${result.updated} طالب.`);
             render();
             Dashboard.updateStats();
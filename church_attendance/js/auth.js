@@ -33,6 +33,9 @@ const Auth = (() => {
                 document.getElementById('loginPasswordInput').value = '';
 
                 _showDashboard();
+            } else if (res.status === 503) {
+                // server busy checking other logins — keep what was typed for a retry
+                errorEl.textContent = data.error;
             } else {
                 errorEl.textContent = data.error || 'فشل تسجيل الدخول';
                 _shake(box);
@@ -44,6 +47,7 @@ const Auth = (() => {
     }
 
     function logout() {
+        Live.stop();
         if (Store.token) {
             fetch(API_BASE + '/logout', {
                 method:  'POST',
@@ -78,6 +82,7 @@ const Auth = (() => {
         Sidebar.setup();
         await Store.reload();
         Dashboard.init();
+        Live.start();
     }
 
     function _shake(el) {
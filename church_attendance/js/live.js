@@ -0,0 +1,99 @@
+/**
+ * live.js — Changes from other devices, pushed by the server (/api/events).
+ * Marks, saves and roster edits are merged into the Store as they are
+ * committed and the dashboard redraws from it — no polling, no refetching.
+ */
+
+const Live = (() => {
+
+    let _source = null;
+    let _retry  = null;
+
+    function start() {
+        stop();
+        if (!Store.token || !window.EventSource) return;
+        // EventSource can't send an Authorization header, so the token goes in the query
+        _source = new EventSource(`${API_BASE}/events?token=${encodeURIComponent(Store.token)}`);
+        _source.addEventListener('mark',    e => _onMark(JSON.parse(e.data)));
+        _source.addEventListener('save',    e => _onSave(JSON.parse(e.data)));
+        _source.addEventListener('history', e => _onHistory(JSON.parse(e.data)));
+        _source.addEventListener('roster',  e => _onRoster(JSON.parse(e.data)));
+        _source.addEventListener('reset',   () => _resync());
+        _source.onerror = () => {
+            // the browser reconnects by itself, resuming after the last event id,
+            // unless the server refused the stream (busy, or the session ended)
+            if (_source?.readyState === EventSource.CLOSED) {
+                _retry = setTimeout(() => _resync().then(start).catch(() => {}), 10000);
+            }
+        };
+    }
+
+    function stop() {
+        clearTimeout(_retry);
+        _source?.close();
+        _source = null;
+    }
+
+    // ── private ────────────────────────────────────────────────────────────
+
+    function _onMark(d) {
+        if (d.date !== Store.syncDate) return;
+        const records = _records(d.kind);
+        for (const [id, status] of Object.entries(d.marks)) records[parseInt(id)] = { status, date: d.date };
+        Dashboard.updateStats();
+    }
+
+    function _onSave(d) {
+        _merge(d.kind, d.people, []);
+        if (d.date === Store.syncDate) {
+            // the server resets saved marks; the day's totals now come from its history row
+            const records = _records(d.kind);
+            for (const id of Object.keys(d.marks)) records[parseInt(id)] = { status: 'none', date: d.date };
+        }
+        Dashboard.updateStats();
+        Dashboard.renderTopPerformers();
+    }
+
+    function _onHistory(day) {
+        Store.attendanceHistory = [day, ...Store.attendanceHistory.filter(h => h.date !== day.date)]
+            .sort((a, b) => (a.date < b.date ? 1 : -1))
+            .slice(0, Store.historyDays);
+        Dashboard.updateStats();
+        Dashboard.renderTrends();
+    }
+
+    function _onRoster(d) {
+        if (d.op === 'import') return _resync();
+        if (d.op === 'delete') {
+            _merge(d.kind, null, [d.id]);
+            delete _records(d.kind)[d.id];
+        } else {
+            _merge(d.kind, d.people, []);
+        }
+        Dashboard.updateStats();
+        Dashboard.renderTopPerformers();
+    }
+
+    function _merge(kind, people, removed) {
+        const rows = people ? Store._decode(people, kind === 'teacher' ? Store._mapTeacher : Store._mapStudent) : [];
+        if (kind === 'teacher') {
+            Store.teachers = Store._mergeById(Store.teachers, rows, removed);
+            Store.filteredTeachers = [...Store.teachers];
+        } else {
+            Store.students = Store._mergeById(Store.students, rows, removed);
+            Store.filteredStudents = [...Store.students];
+        }
+    }
+
+    function _records(kind) {
+        return kind === 'teacher' ? Store.teacherAttendanceRecords : Store.attendanceRecords;
+    }
+
+    /** Events were missed (server restart, long disconnect): catch up with a delta sync. */
+    async function _resync() {
+        await Store.sync();
+        Dashboard.init();
+    }
+
+    return { start, stop };
+})();
@@ -1,32 +1,49 @@
 /**
  * reports.js — Reports page: grade attendance, monthly summary, attention list.
+ *
+ * All aggregation happens server-side (/api/reports/*); this module only
+ * renders the small result sets.
  */
 
 const Reports = (() => {
 
-    function render() {
-        _renderGradeAttendance();
-        _renderMonthlySummary();
-        _renderAttentionStudents();
+    const SUMMARY_DAYS        = 30;   // window of the "monthly" summary
+    const ATTENTION_THRESHOLD = 85;   // follow-up list: attendance below this %
+
+    async function render() {
+        const from = new Date(Date.now() - SUMMARY_DAYS * 86400000).toISOString().split('T')[0];
+        try {
+            const [grades, summary, attention] = await Promise.all([
+                Api.get('/reports/grades'),
+                Api.get('/reports/summary?from=' + from),
+                Api.get('/reports/attention?threshold=' + ATTENTION_THRESHOLD),
+            ]);
+            _renderGradeAttendance(grades);
+            _renderMonthlySummary(summary);
+            _renderAttentionStudents(attention);
+        } catch (err) {
+            console.error('Reports error:', err);
+        }
     }
 
     // ── private ────────────────────────────────────────────────────────────
 
-    function _renderGradeAttendance() {
+    function _renderGradeAttendance(rows) {
         const container = document.getElementById('gradeAttendance');
         if (!container) return;
 
-        const grades = ['KG1','KG2','1','2','3','4','5','6','7','8','9','10','11','12'];
-        const html   = grades.map(g => {
-            const list = Store.students.filter(s => s.grade === g);
-            if (!list.length) return '';
-            const avg = Math.round(list.reduce((sum, s) => sum + s.attendance, 0) / list.length);
+        const byGrade = Object.fromEntries(rows.map(r => [r.grade, r]));
+        const grades  = ['KG1','KG2','1','2','3','4','5','6','7','8','9','10','11','12'];
+        const html    = grades.map(g => {
+            const row = byGrade[g];
+            if (!row) return '';
+            const avg = row.average ?? 0;
             return `
                 <div class="grade-report">
                     <div class="grade-header">
                         <div>
                             <h4 class="grade-title">${Utils.gradeLabel(g)}</h4>
-                            <p class="grade-count">${list.length} طالب</p>
+                            <p class="grade-count">${row.students} طالب</p>
                         </div>
                         <div class="grade-percentage">
                             <h3>${avg}%</h3>
@@ -44,27 +61,24 @@ const Reports = (() => {
             : '<p class="text-muted text-center mt-3">لا يوجد طلاب بعد</p>';
     }
 
-    function _renderMonthlySummary() {
+    function _renderMonthlySummary(summary) {
         const container = document.getElementById('monthlySummary');
         if (!container) return;
 
-        const hist = Store.attendanceHistory;
-        if (!hist.length) {
+        if (!summary.days) {
             container.innerHTML = '<p class="text-muted text-center mt-3">لا توجد بيانات بعد</p>';
             return;
         }
 
-        const tp = hist.reduce((s, d) => s + d.present, 0);
-        const ta = hist.reduce((s, d) => s + d.absent,  0);
-        const tl = hist.reduce((s, d) => s + d.late,    0);
+        const tp = summary.present, ta = summary.absent, tl = summary.late;
         const gt = tp + ta + tl;
 
         const pp = gt ? Math.round(tp / gt * 100) : 0;
         const ap = gt ? Math.round(ta / gt * 100) : 0;
         const lp = gt ? Math.round(tl / gt * 100) : 0;
 
-        const maxDay = hist.reduce((m, d) => d.present > m.present ? d : m, hist[0]);
-        const minDay = hist.reduce((m, d) => d.present < m.present ? d : m, hist[0]);
+        const maxDay = summary.best;
+        const minDay = summary.worst;
 
         container.innerHTML = `
             <div class="row g-3 mb-4">
@@ -81,11 +95,11 @@ const Reports = (() => {
             <div class="summary-details">
                 <div class="summary-item">
                     <span>إجمالي أيام مسجلة</span>
-                    <strong>${hist.length}</strong>
+                    <strong>${summary.days}</strong>
                 </div>
                 <div class="summary-item">
                     <span>متوسط الحضور اليومي</span>
-                    <strong>${Math.round(tp / hist.length)} طالب</strong>
+                    <strong>${Math.round(tp / summary.days)} طالب</strong>
                 </div>
                 <div class="summary-item">
                     <span>أعلى يوم حضور</span>
@@ -98,11 +112,10 @@ const Reports = (() => {
             </div>`;
     }
 
-    function _renderAttentionStudents() {
+    function _renderAttentionStudents(low) {
         const container = document.getElementById('attentionStudents');
         if (!container) return;
 
-        const low = Store.students.filter(s => s.attendance < 85);
         if (!low.length) {
             container.innerHTML = '<div class="col-12 text-center text-muted py-3">جميع الطلاب بحضور ممتاز! 🎉</div>';
             return;
@@ -18,6 +18,7 @@ const Sidebar = (() => {
             { page: 'reports',           icon: 'bi-bar-chart-fill',       label: 'التقارير',          always: true  },
             { page: 'attendanceLog',     icon: 'bi-journal-check',        label: 'سجل الحضور',       admin: true  },
             { page: 'users',             icon: 'bi-shield-lock-fill',     label: 'إدارة الحسابات',   admin: true   },
+            { page: 'slowQueries',       icon: 'bi-speedometer2',         label: 'الاستعلامات البطيئة', admin: true },
         ];
 
         nav.innerHTML = links
@@ -58,7 +59,7 @@ const Sidebar = (() => {
     /** Navigate to a named page */
     function navigate(page) {
         // Permission guard
-        const adminOnly = ['teachers', 'teacherAttendance', 'users'];
+        const adminOnly = ['teachers', 'teacherAttendance', 'users', 'slowQueries'];
         if (!Store.isAdmin && adminOnly.includes(page)) return;
 
         _setActive(page);
@@ -82,6 +83,7 @@ const Sidebar = (() => {
             reports:           () => Reports.render(),
             attendanceLog:     () => AttendanceLog.load(),
             users:             () => UserMgmt.load(),
+            slowQueries:       () => SlowQueries.load(),
         };
         renders[page]?.();
     }
@@ -96,7 +98,7 @@ const Sidebar = (() => {
 
     function _showPage(page) {
         const pages = ['dashboard','students','teachers','attendance',
-                       'teacherAttendance','reports','attendanceLog','users'];
+                       'teacherAttendance','reports','attendanceLog','users','slowQueries'];
         pages.forEach(p => {
             document.getElementById(p + 'Page')?.classList.toggle('d-none', p !== page);
         });
@@ -0,0 +1,68 @@
+/**
+ * slow-queries.js — Slow SQL statements the server logged (admin only).
+ * One row per statement and calling function; click a row for its plan.
+ */
+
+const SlowQueries = (() => {
+
+    let _rows = [];
+
+    async function load() {
+        const body = document.getElementById('slowQueriesBody');
+        try {
+            _rows = await Api.get('/slow-queries');
+        } catch (err) {
+            body.innerHTML = `<tr><td colspan="6" class="text-center text-danger py-4">
+                <i class="bi bi-exclamation-triangle me-2"></i>خطأ في تحميل السجل</td></tr>`;
+            return;
+        }
+        if (!_rows.length) {
+            body.innerHTML = `<tr><td colspan="6" class="text-center text-muted py-4">
+                <i class="bi bi-check-circle me-2"></i>لا توجد استعلامات بطيئة</td></tr>`;
+            return;
+        }
+        body.innerHTML = _rows.map((r, i) => `
+            <tr style="cursor:pointer" onclick="SlowQueries.show(${i})">
+                <td dir="ltr" class="text-start small"><code>${_esc(_short(r.statement))}</code></td>
+                <td dir="ltr" class="small">${_esc(r.caller)}</td>
+                <td>${r.count}</td>
+                <td>${r.avg_ms}</td>
+                <td class="fw-bold">${r.max_ms}</td>
+                <td dir="ltr" class="small">${r.last_at}</td>
+            </tr>`).join('');
+    }
+
+    function show(i) {
+        const r = _rows[i];
+        if (!r) return;
+        Utils.showModal(`
+            <p class="mb-1 fw-semibold">الاستعلام</p>
+            <pre dir="ltr" class="small bg-light p-2 rounded" style="white-space:pre-wrap">${_esc(r.statement)}</pre>
+            <p class="mb-1 fw-semibold">المعاملات</p>
+            <pre dir="ltr" class="small bg-light p-2 rounded">${_esc(r.params)}</pre>
+            <p class="mb-1 fw-semibold">خطة التنفيذ</p>
+            <pre dir="ltr" class="small bg-light p-2 rounded">${_esc(r.plan || '—')}</pre>
+            <p class="text-muted small mb-0">${_esc(r.caller)} — ${r.count} مرة، أقصى ${r.max_ms} ms</p>`,
+            'استعلام بطيء');
+    }
+
+    async function clear() {
+        if (!confirm('مسح سجل الاستعلامات البطيئة؟')) return;
+        try {
+            await Api.del('/slow-queries');
+            load();
+        } catch (err) { alert('خطأ: ' + err.message); }
+    }
+
+    // ── private ────────────────────────────────────────────────────────────
+
+    function _short(sql) {
+        return sql.length > 120 ? sql.slice(0, 120) + '…' : sql;
+    }
+
+    function _esc(s) {
+        return String(s ?? '').replace(/[&<>"]/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;' }[c]));
+    }
+
+    return { load, show, clear };
+})();
@@ -46,51 +46,98 @@ const Store = {
         sessionStorage.removeItem('church_user');
     },
 
+    // ── Sync state ──────────────────────────────────────────────────────────
+    syncVersion: 0,      // server change version the data above is current to
+    syncDate:    null,   // date the working records belong to
+    historyDays: 60,     // matches the server's SYNC_HISTORY_DAYS
+
     /** Load all data from the API and populate store arrays */
     async reload() {
-        const today   = new Date().toISOString().split('T')[0];
-        const fetches = [
-            Api.get('/students'),
-            Api.get('/attendance/history'),
-            Api.get('/attendance/records?date=' + today),
-        ];
-        if (this.isAdmin) {
-            fetches.push(Api.get('/teachers'));
-            fetches.push(Api.get('/teacher-attendance/records?date=' + today));
+        this.syncVersion = 0;
+        await this.sync();
+    },
+
+    /**
+     * Fetch only what changed since the last sync and merge it in.
+     * Falls back to a full snapshot on first load, on a new day, or when
+     * the server says the delta can't be applied (full: true).
+     */
+    async sync() {
+        const today = new Date().toISOString().split('T')[0];
+        if (today !== this.syncDate) this.syncVersion = 0;
+
+        const d = await Api.get(`/sync?since=${this.syncVersion}&date=${today}&format=columnar`);
+        if (d.full) {
+            this.students = []; this.teachers = []; this.attendanceHistory = [];
+            this.attendanceRecords = {}; this.teacherAttendanceRecords = {};
         }
 
-        const results = await Promise.all(fetches);
-        const [rawStudents, history, attRec] = results;
-        const rawTeachers = this.isAdmin ? results[3] : [];
-        const teacherRec  = this.isAdmin ? results[4] : {};
-
-        this.students = rawStudents.map(s => ({
-            id: s.id, name: s.name, grade: s.grade,
-            whatsapp: s.whatsapp || '', avatar: s.avatar || s.name.substring(0, 2).toUpperCase(),
-            birthdate: s.birthdate || '', attendance: s.attendance, status: s.status,
-            totalClasses: s.total_classes, present: s.present_count, absent: s.absent_count,
-        }));
-
-        this.teachers = rawTeachers.map(t => ({
-            id: t.id, name: t.name, subject: t.subject, assignedClass: t.assigned_class,
-            whatsapp: t.whatsapp || '', avatar: t.avatar || t.name.substring(0, 2).toUpperCase(),
-            attendance: t.attendance, status: t.status,
-            totalClasses: t.total_classes, present: t.present_count, absent: t.absent_count,
-        }));
-
-        this.attendanceHistory = history;
-
-        this.attendanceRecords = {};
-        for (const [sid, status] of Object.entries(attRec)) {
-            this.attendanceRecords[parseInt(sid)] = { status, date: today };
+        this.students = this._mergeById(this.students, this._decode(d.students, this._mapStudent), d.removed.students);
+        if (d.teachers) {
+            this.teachers = this._mergeById(this.teachers, this._decode(d.teachers, this._mapTeacher), d.removed.teachers);
         }
 
-        this.teacherAttendanceRecords = {};
-        for (const [tid, status] of Object.entries(teacherRec)) {
+        for (const id of d.removed.students) delete this.attendanceRecords[id];
+        for (const [sid, status] of Object.entries(d.records)) {
+            this.attendanceRecords[parseInt(sid)] = { status, date: today };
+        }
+        for (const id of d.removed.teachers) delete this.teacherAttendanceRecords[id];
+        for (const [tid, status] of Object.entries(d.teacher_records || {})) {
             this.teacherAttendanceRecords[parseInt(tid)] = { status, date: today };
         }
 
+        const byDate = new Map(this.attendanceHistory.map(h => [h.date, h]));
+        for (const h of this._decode(d.history, this._mapHistory)) byDate.set(h.date, h);
+        this.attendanceHistory = [...byDate.values()]
+            .sort((a, b) => (a.date < b.date ? 1 : -1))
+            .slice(0, this.historyDays);
+
+        this.syncVersion = d.version;
+        this.syncDate    = today;
+
         this.filteredStudents = [...this.students];
         this.filteredTeachers = [...this.teachers];
     },
+
+    /**
+     * Columnar {columns, rows} → store objects. `map(r, c)` builds one object
+     * from a row array, where c maps column name → index.
+     */
+    _decode(table, map) {
+        const c = {};
+        table.columns.forEach((name, i) => { c[name] = i; });
+        return table.rows.map(r => map(r, c));
+    },
+
+    _mapStudent(r, c) {
+        const name = r[c.name];
+        return {
+            id: r[c.id], name, grade: r[c.grade],
+            whatsapp: r[c.whatsapp] || '', avatar: r[c.avatar] || name.substring(0, 2).toUpperCase(),
+            birthdate: r[c.birthdate] || '', attendance: r[c.attendance], status: r[c.status],
+            totalClasses: r[c.total_classes], present: r[c.present_count], absent: r[c.absent_count],
+        };
+    },
+
+    _mapTeacher(r, c) {
+        const name = r[c.name];
+        return {
+            id: r[c.id], name, subject: r[c.subject], assignedClass: r[c.assigned_class],
+            whatsapp: r[c.whatsapp] || '', avatar: r[c.avatar] || name.substring(0, 2).toUpperCase(),
+            attendance: r[c.attendance], status: r[c.status],
+            totalClasses: r[c.total_classes], present: r[c.present_count], absent: r[c.absent_count],
+        };
+    },
+
+    _mapHistory(r, c) {
+        return { date: r[c.date], present: r[c.present], absent: r[c.absent], late: r[c.late] };
+    },
+
+    /** Replace changed rows in place, append new ones, drop removed ids — list order is kept. */
+    _mergeById(list, rows, removedIds) {
+        const byId = new Map(list.map(x => [x.id, x]));
+        for (const id of removedIds) byId.delete(id);
+        for (const row of rows) byId.set(row.id, row);
+        return [...byId.values()];
+    },
 };
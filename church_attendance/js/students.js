@@ -259,22 +259,25 @@ const Students = (() => {
         } catch (err) { alert('خطأ: ' + err.message); }
     }
 
+    /** Import a CSV/XLSX roster: the server validates it first (dry run), then inserts on confirm. */
+    async function importFile(input) {
+        const file = input.files[0];
+        input.value = '';
+        if (!file) return;
+        try {
+            const check = await Api.upload('/students/import?dry_run=1', file);
+            if (!check.accepted) { alert(Utils.importReport(check)); return; }
+            if (!confirm(Utils.importReport(check) + '\n\nمتابعة الاستيراد؟')) return;
+            const result = await Api.upload('/students/import', file);
+            await Store.sync();
+            filter();
+            alert(`تم استيراد ${result.inserted} طالب بنجاح!`);
+        } catch (err) { alert('خطأ: ' + err.message); }
+    }
+
+    /** Whole roster as XLSX, generated and streamed by the server (servants get their grade) */
     function exportToExcel() {
-        const rows = Store.students.map(s => ({
-            'ID':             String(s.id).padStart(4, '0'),
-            'الاسم':          s.name,
-            'الفصل':          s.grade,
-            'الحالة':         Utils.statusLabel(s.status),
-            'نسبة الحضور':   s.attendance + '%',
-            'حاضر':           s.present,
-            'غائب':           s.absent,
-            'إجمالي الحصص': s.totalClasses,
-            'واتساب':        s.whatsapp,
-        }));
-        const ws = XLSX.utils.json_to_sheet(rows);
-        const wb = XLSX.utils.book_new();
-        XLSX.utils.book_append_sheet(wb, ws, 'الطلاب');
-        XLSX.writeFile(wb, `الطلاب_${new Date().toLocaleDateString('ar-EG').replace(/\//g, '-')}.xlsx`);
+        Api.download('/export/students?format=xlsx');
     }
 
     // ── private helpers ────────────────────────────────────────────────────
@@ -305,5 +308,5 @@ const Students = (() => {
         if (idx > -1) Store.students[idx] = { ...Store.students[idx], ..._mapStudent(raw) };
     }
 
-    return { init, filter, render, showModal, showAddModal, showEditModal, delete: deleteStudent, exportToExcel };
+    return { init, filter, render, showModal, showAddModal, showEditModal, delete: deleteStudent, importFile, exportToExcel };
 })();
@@ -4,6 +4,10 @@
 
 const TeacherAttendance = (() => {
 
+    // Taps are coalesced into /teacher-attendance/mark-batch requests
+    const _marks = Api.batcher('/teacher-attendance/mark-batch');
+    document.addEventListener('visibilitychange', () => { if (document.hidden) _marks.flush(); });
+
     function render() {
         const tbody = document.querySelector('#teacherAttendanceTable tbody');
         if (!tbody) return;
@@ -62,7 +66,7 @@ const TeacherAttendance = (() => {
     function mark(teacherId, status) {
         const date = Utils.today();
         Store.teacherAttendanceRecords[teacherId] = { status, date };
-        Api.post('/teacher-attendance/mark', { teacherId, status, date }).catch(() => {});
+        _marks.queue(teacherId, status, date);
         render();
     }
 
@@ -82,8 +86,9 @@ const TeacherAttendance = (() => {
         if (!hasAny) { alert('لم يتم تسجيل أي حضور اليوم!'); return; }
 
         try {
+            await _marks.flush();
             const result = await Api.post('/teacher-attendance/save', { date: today, records });
-            await Store.reload();
+            await Store.sync();
             alert(`تم حفظ حضور الخدام بنجاح! تم تحديث ${result.updated} خادم.`);
             render();
         } catch (err) {
@@ -206,23 +206,24 @@ const Teachers = (() => {
         } catch (err) { alert('خطأ: ' + err.message); }
     }
 
+    /** Import a CSV/XLSX roster: the server validates it first (dry run), then inserts on confirm. */
+    async function importFile(input) {
+        const file = input.files[0];
+        input.value = '';
+        if (!file) return;
+        try {
+            const check = await Api.upload('/teachers/import?dry_run=1', file);
+            if (!check.accepted) { alert(Utils.importReport(check)); return; }
+            if (!confirm(Utils.importReport(check) + '\n\nمتابعة الاستيراد؟')) return;
+            const result = await Api.upload('/teachers/import', file);
+            await Store.sync();
+            filter();
+            alert(`تم استيراد ${result.inserted} خادم بنجاح!`);
+        } catch (err) { alert('خطأ: ' + err.message); }
+    }
+
     function exportToExcel() {
-        const rows = Store.teachers.map(t => ({
-            'ID':             String(t.id).padStart(4, '0'),
-            'الاسم':          t.name,
-            'المادة':         t.subject,
-            'الفصل المخصص':  t.assignedClass,
-            'الحالة':         Utils.statusLabel(t.status),
-            'نسبة الحضور':   t.attendance + '%',
-            'حاضر':           t.present,
-            'غائب':           t.absent,
-            'إجمالي الحصص': t.totalClasses,
-            'واتساب':        t.whatsapp,
-        }));
-        const ws = XLSX.utils.json_to_sheet(rows);
-        const wb = XLSX.utils.book_new();
-        XLSX.utils.book_append_sheet(wb, ws, 'الخدام');
-        XLSX.writeFile(wb, `الخدام_${new Date().toLocaleDateString('ar-EG').replace(/\//g, '-')}.xlsx`);
+        Api.download('/export/teachers?format=xlsx');
     }
 
     // ── private ────────────────────────────────────────────────────────────
@@ -246,5 +247,5 @@ const Teachers = (() => {
         if (idx > -1) Store.teachers[idx] = { ...Store.teachers[idx], ..._map(raw) };
     }
 
-    return { filter, render, showModal, showAddModal, showEditModal, delete: deleteTeacher, exportToExcel };
+    return { filter, render, showModal, showAddModal, showEditModal, delete: deleteTeacher, importFile, exportToExcel };
 })();
@@ -66,5 +66,15 @@ const Utils = (() => {
         URL.revokeObjectURL(url);
     }
 
-    return { gradeLabel, statusLabel, today, formatDate, makeAvatar, progressClass, rateColor, showModal, downloadBlob };
+    /** Summary of a roster import (or dry-run) response, for alert()/confirm() */
+    function importReport(r) {
+        const lines = [`عدد الصفوف: ${r.rows}`, `صالحة للإضافة: ${r.accepted}`, `مرفوضة: ${r.skipped}`];
+        for (const e of r.errors.slice(0, 10)) {
+            lines.push(`• صف ${e.row}${e.name ? ` (${e.name})` : ''}: ${e.error}`);
+        }
+        if (r.errors.length > 10) lines.push(`… و${r.errors.length - 10} أخرى`);
+        return lines.join('\n');
+    }
+
+    return { gradeLabel, statusLabel, today, formatDate, makeAvatar, progressClass, rateColor, showModal, downloadBlob, importReport };
 })();
@@ -6,29 +6,207 @@ Open: http://localhost:5000
 Default admin  →  username: admin  |  password: virginmarry
 """
 
-import sqlite3, json, os, hashlib, secrets
+import sqlite3, json, os, sys, hashlib, hmac, secrets, threading, asyncio, socket, io, argparse, gzip, zlib, re, time, base64, bisect, queue
+import traceback
+import logging.handlers
+from email.utils import formatdate, parsedate_to_datetime
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import parse_qs
+from urllib.request import pathname2url
 
-# ─── Paths ────────────────────────────────────────────────────────────────────
+from spreadsheet import read_rows, write_csv, write_xlsx, SpreadsheetError, XLSX_MIME
 
-# ─── In-memory session store: token → session dict ────────────────────────────
-sessions: dict = {}
+# ─── Paths ────────────────────────────────────────────────────────────────────
+BASE_DIR     = os.path.dirname(os.path.abspath(__file__))
+FRONTEND_DIR = BASE_DIR
+DB_PATH      = os.environ.get('CHURCH_DB', os.path.join(BASE_DIR, 'church.DB'))
+
+# Seconds a connection waits on a locked database before giving up
+DB_TIMEOUT = 15
+
+# ─── Connection tuning (applied once when a pooled connection is opened) ──────
+DB_CACHE_KIB       = 16 * 1024            # page cache per connection
+DB_MMAP_BYTES      = 256 * 1024 * 1024    # memory-mapped I/O window
+DB_STATEMENT_CACHE = 256                  # prepared statements kept per connection
+
+# ─── Sessions ─────────────────────────────────────────────────────────────────
+SESSION_TTL         = 12 * 3600   # idle seconds before a session expires (sliding)
+SESSION_MAX         = 10_000      # sessions kept in memory; least recently used go first
+SESSION_REVALIDATE  = 30          # seconds a persisted session is trusted before re-reading its row
+
+# ─── Password hashing ─────────────────────────────────────────────────────────
+PW_SCRYPT_N         = 2 ** 14     # scrypt cost: 16 MiB and ~70 ms per hash
+PW_SCRYPT_R         = 8
+PW_SCRYPT_P         = 1
+PW_HASH_WORKERS     = 2           # hashes computed at once
+PW_HASH_QUEUE       = 6           # further hashes allowed to wait; past that a login gets 503
+
+# ─── Metrics ──────────────────────────────────────────────────────────────────
+METRICS_LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)          # seconds
+METRICS_BYTES_BUCKETS   = (512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)  # response bytes
+METRICS_MAX_STATEMENTS  = 300         # distinct SQL statements tracked; any further ones count as "other"
+METRICS_DUMP_INTERVAL   = 300         # seconds between --metrics-log snapshots
+METRICS_DUMP_BYTES      = 1024 * 1024 # --metrics-log rotates at this size …
+METRICS_DUMP_BACKUPS    = 5           # … keeping this many old files
+
+# ─── Slow-query log ───────────────────────────────────────────────────────────
+SLOW_QUERY_MS    = 250       # statements slower than this (execute + fetch) go to slow_queries; 0 turns it off
+SLOW_QUERY_KEEP  = 2000      # rows kept in slow_queries, newest first
+SLOW_QUERY_QUEUE = 200       # slow queries waiting to be written; past that they are dropped
+
+# ─── Log archive ──────────────────────────────────────────────────────────────
+ARCHIVE_DIR          = os.environ.get('CHURCH_ARCHIVE_DIR')   # default: an "archive" folder next to DB_PATH
+SERVICE_YEAR_START   = 9     # month a service year begins (September)
+ARCHIVE_MAX_ATTACHED = 6     # archive files kept attached per connection (SQLite allows 10 at once)
+
+# ─── Live events (/api/events) ────────────────────────────────────────────────
+EVENTS_BACKLOG     = 1000         # recent events kept for Last-Event-ID resume
+EVENTS_HEARTBEAT   = 15           # seconds of silence before a stream gets a keep-alive comment
+EVENTS_MAX_CLIENTS = 500          # open streams; past that new ones get 503
+EVENTS_MAX_PENDING = 256 * 1024   # bytes queued for a client that isn't reading before it is dropped
+EVENTS_RETRY_MS    = 3000         # reconnect delay the browser is told to use
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 #  DATABASE
 # ══════════════════════════════════════════════════════════════════════════════
 
+class PooledConnection(sqlite3.Connection):
+    """
+    Long-lived connection owned by one worker thread.
+    close() hands it back to the pool (rolling back anything left uncommitted,
+    exactly like a real close would) instead of tearing it down.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def discard(self):
+        super().close()
+
+    # every statement runs on a TimedCursor (sqlite3's own execute shortcuts
+    # make a plain Cursor, so they are routed through cursor() here)
+    def cursor(self, factory=None):
+        return super().cursor(factory or TimedCursor)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def executemany(self, sql, params):
+        return self.cursor().executemany(sql, params)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that times its statements, and the fetch*() calls reading their
+    rows, into `metrics`. A statement whose execute + fetch time crosses
+    the slow-query threshold is handed to `slow_queries` once.
+    """
+
+    sql    = None
+    params = ()
+    spent  = 0.0
+
+    def execute(self, sql, *params):
+        self.sql, self.params, self.spent = sql, params[0] if params else (), 0.0
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, *params)
+        finally:
+            self._observe(time.perf_counter() - t0)
+
+    def executemany(self, sql, params):
+        if isinstance(params, (list, tuple)):
+            self.params = params[0] if params else ()
+        else:
+            self.params = None        # a generator, already being consumed
+        self.sql, self.spent = sql, 0.0
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, params)
+        finally:
+            self._observe(time.perf_counter() - t0)
+
+    def _timed_fetch(self, fetch, *args):
+        t0 = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if self.sql:
+                self._observe(time.perf_counter() - t0, calls=0)
+
+    def _observe(self, seconds: float, calls: int = 1):
+        metrics.observe_sql(self.sql, seconds, calls)
+        before = self.spent
+        self.spent += seconds
+        if self.spent >= slow_queries.threshold > before:
+            slow_queries.record(self)
+
+    def fetchone(self):            return self._timed_fetch(super().fetchone)
+    def fetchmany(self, *size):    return self._timed_fetch(super().fetchmany, *size)
+    def fetchall(self):            return self._timed_fetch(super().fetchall)
+
+
+_pool_local = threading.local()
+_pool_lock  = threading.Lock()
+_pool_conns: list = []
+
+
+def _open_conn() -> PooledConnection:
+    conn = sqlite3.connect(
+        DB_PATH, timeout=DB_TIMEOUT, factory=PooledConnection,
+        cached_statements=DB_STATEMENT_CACHE, check_same_thread=False, uri=True,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{DB_CACHE_KIB}')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_BYTES}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.db_path  = DB_PATH
+    conn.archives = OrderedDict()     # service year → attached schema, least recently used first
+    with _pool_lock:
+        _pool_conns.append(conn)
+    metrics.conn_opened()
+    return conn
+
+
 def get_conn():
-    
-    
+    """Return this thread's pooled connection, opening it on first use."""
+    conn = getattr(_pool_local, 'conn', None)
+    if conn is None or conn.db_path != DB_PATH:
+        conn = _pool_local.conn = _open_conn()
     return conn
 
 
+def release_conn():
+    """
+    End of a request: roll back whatever it left uncommitted, so a handler
+    that raised mid-write neither keeps the write lock nor has its half-done
+    changes committed by the next request on this thread.
+    """
+    conn = getattr(_pool_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def close_all_conns():
+    """Tear down every pooled connection (server shutdown)."""
+    with _pool_lock:
+        conns = _pool_conns[:]
+        _pool_conns.clear()
+    for conn in conns:
+        conn.discard()
+
+
 def init_db():
     """Create all tables and seed the default admin account."""
     conn = get_conn()
+    # WAL lets readers keep going while a save is committing; the mode is
+    # stored in the database file, so setting it once at startup is enough.
+    conn.execute('PRAGMA journal_mode=WAL')
     c = conn.cursor()
 
     # Users  (username-based, not email)
@@ -138,24 +316,452 @@ def init_db():
         )
     ''')
 
+    # Delta sync: one change counter for the whole database; every synced row
+    # carries the version of the write that last touched it, deletions leave
+    # a tombstone at theirs.
+    c.execute('CREATE TABLE IF NOT EXISTS sync_state (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)')
+    c.execute('INSERT OR IGNORE INTO sync_state VALUES (1, 0)')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sync_tombstones (
+            version INTEGER NOT NULL,
+            kind    TEXT    NOT NULL,
+            id      INTEGER NOT NULL
+        )
+    ''')
+    for table in _SYNCED_TABLES:
+        _ensure_column(conn, table, 'sync_version', 'INTEGER NOT NULL DEFAULT 0')
+
+    # Change counters behind the API ETags (see TableVersions)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS etag_versions (
+            name    TEXT    NOT NULL,
+            scope   TEXT    NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (name, scope)
+        ) WITHOUT ROWID
+    ''')
+
+    # Service years moved out to archive files (see LOG ARCHIVE)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS log_archives (
+            year         INTEGER PRIMARY KEY,
+            file         TEXT    NOT NULL,
+            first_date   TEXT    NOT NULL,
+            last_date    TEXT    NOT NULL,
+            student_rows INTEGER NOT NULL,
+            teacher_rows INTEGER NOT NULL,
+            checksum     TEXT    NOT NULL,
+            archived_at  TEXT    NOT NULL
+        )
+    ''')
+
+    # Statements that ran over SLOW_QUERY_MS, with their plan (see SlowQueryLog)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS slow_queries (
+            id        INTEGER PRIMARY KEY AUTOINCREMENT,
+            logged_at TEXT NOT NULL,
+            ms        REAL NOT NULL,
+            statement TEXT NOT NULL,
+            params    TEXT DEFAULT '',
+            caller    TEXT DEFAULT '',
+            plan      TEXT DEFAULT ''
+        )
+    ''')
+
+    # Sessions (only used when the server runs with --persist-sessions)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS app_sessions (
+            token_hash TEXT PRIMARY KEY,
+            user_id    INTEGER NOT NULL,
+            data       TEXT    NOT NULL,
+            last_seen  REAL    NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    # Rollups: per-grade and per-department present/absent/late, by day and by month
+    for key_col, daily, monthly in _ROLLUPS.values():
+        c.execute(f'''
+            CREATE TABLE IF NOT EXISTS {daily} (
+                {key_col}   TEXT NOT NULL,
+                record_date TEXT NOT NULL,
+                present     INTEGER DEFAULT 0,
+                absent      INTEGER DEFAULT 0,
+                late        INTEGER DEFAULT 0,
+                PRIMARY KEY ({key_col}, record_date)
+            ) WITHOUT ROWID
+        ''')
+        c.execute(f'''
+            CREATE TABLE IF NOT EXISTS {monthly} (
+                {key_col} TEXT NOT NULL,
+                month     TEXT NOT NULL,
+                present   INTEGER DEFAULT 0,
+                absent    INTEGER DEFAULT 0,
+                late      INTEGER DEFAULT 0,
+                PRIMARY KEY ({key_col}, month)
+            ) WITHOUT ROWID
+        ''')
+
+    _ensure_indexes(conn)
+    conn.commit()       # archives can only be attached outside a transaction
+    # first start on a database that already has history: build the rollups once
+    if (not c.execute('SELECT 1 FROM grade_daily_stats LIMIT 1').fetchone()
+            and c.execute('SELECT 1 FROM attendance_log LIMIT 1').fetchone()):
+        rebuild_rollups(conn)
     conn.commit()
+    conn.execute('PRAGMA optimize')
+    student_grades.load(conn)
     conn.close()
     print('✓ Database initialised')
 
 
+# tables whose rows carry a sync_version for /api/sync
+_SYNCED_TABLES = ('app_students', 'app_teachers', 'attendance_records',
+                  'teacher_attendance_records', 'attendance_history')
+
+
+def _ensure_column(conn, table: str, column: str, decl: str):
+    """Add `column` to an existing table created before it was introduced."""
+    if column not in {r['name'] for r in conn.execute(f'PRAGMA table_info({table})')}:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+
+def _next_version(conn) -> int:
+    """
+    Claim the next change version for the current write transaction.
+    Taking it also takes SQLite's write lock, so versions become visible
+    in commit order.
+    """
+    return conn.execute('UPDATE sync_state SET version = version + 1 RETURNING version').fetchone()[0]
+
+
+# ─── Change counters behind the API ETags ─────────────────────────────────────
+
+class TableVersions:
+    """
+    Per-table change counters, optionally split by scope (a grade), that
+    writers bump once their change is in. Cacheable GETs build their ETag from
+    these alone, so a 304 costs one primary-key read of etag_versions and
+    never touches the table itself. The counters live in the database rather
+    than in memory so every server process sharing it hands out the same tags
+    and sees the others' writes.
+    """
+
+    def bump(self, table: str, *scopes):
+        """
+        Record a change to `table` — within `scopes`, or anywhere when none are
+        given. Joins the caller's transaction when one is still open.
+        """
+        conn = get_conn()
+        own  = not conn.in_transaction
+        conn.executemany(
+            'INSERT INTO etag_versions VALUES (?, ?, 1)'
+            ' ON CONFLICT(name, scope) DO UPDATE SET version = version + 1',
+            [(table, sc) for sc in ('', *({sc for sc in scopes if sc} or {'*'}))]
+        )
+        if own:
+            conn.commit()
+
+    def etag(self, table: str, scope=None, variant: str = '') -> str:
+        """
+        Strong ETag for the whole table, or for one scope of it. `variant`
+        names a different representation of the same rows (format=columnar).
+        """
+        counts = {r['scope']: r['version'] for r in get_conn().execute(
+            'SELECT scope, version FROM etag_versions WHERE name=? AND scope IN (?, ?, ?)',
+            (table, '', '*', '' if scope is None else str(scope)))}
+        suffix = f'-{variant}' if variant else ''
+        if scope is None:
+            return f'"{counts.get("", 0)}{suffix}"'
+        return f'"{counts.get("*", 0)}.{counts.get(str(scope), 0)}-{str(scope).encode().hex()}{suffix}"'
+
+
+table_versions = TableVersions()
+
+
+# ─── Managed secondary indexes ────────────────────────────────────────────────
+# One entry per real access pattern; init_db creates missing ones and drops
+# any idx_* index that is no longer listed. tests/test_query_plans.py fails
+# if an endpoint's SQL stops using them.
+_INDEXES = {
+    # api_get_students — grade filter ORDER BY name, and the full ORDER BY grade, name
+    'idx_students_grade_name':     'app_students (grade, name)',
+    # api_get_teachers — ORDER BY name
+    'idx_teachers_name':           'app_teachers (name)',
+    # api_login — LOWER(username)=?
+    'idx_users_username_lower':    'app_users (LOWER(username))',
+    # log endpoints — date filter and the date-descending page order
+    'idx_attendance_log_date':     'attendance_log (record_date)',
+    'idx_teacher_log_date':        'teacher_attendance_log (record_date)',
+    # SessionStore — a user's sessions, and the expiry sweep
+    'idx_sessions_user':           'app_sessions (user_id)',
+    'idx_sessions_last_seen':      'app_sessions (last_seen)',
+    # rollup date-range reads across every grade / department
+    'idx_grade_daily_date':        'grade_daily_stats (record_date)',
+    'idx_department_daily_date':   'department_daily_stats (record_date)',
+    # working records for one date (dashboard / attendance page load), and
+    # the ones on that date changed since a sync version
+    'idx_attendance_records_sync': 'attendance_records (record_date, sync_version)',
+    'idx_teacher_records_sync':    'teacher_attendance_records (record_date, sync_version)',
+    # /api/sync — rows and deletions newer than the client's version
+    'idx_students_sync':           'app_students (sync_version)',
+    'idx_teachers_sync':           'app_teachers (sync_version)',
+    'idx_history_sync':            'attendance_history (sync_version)',
+    'idx_tombstones_version':      'sync_tombstones (version)',
+    # api_get_student_history and the per-request grade checks are served by
+    # UNIQUE(student_id, record_date) and the students' primary key.
+}
+
+
+def _ensure_indexes(conn):
+    existing = {r['name'] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx\\_%' ESCAPE '\\'")}
+    for name in existing - _INDEXES.keys():
+        conn.execute(f'DROP INDEX {name}')
+    for name, target in _INDEXES.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  AUTH HELPERS
 # ══════════════════════════════════════════════════════════════════════════════
 
 def _hash(pw: str) -> str:
+    """Unsalted SHA-256 — session token keys, and the legacy password format."""
     return hashlib.sha256(pw.encode()).hexdigest()
 
 
-def get_session(handler) -> dict | None:
+class PasswordHasherBusy(Exception):
+    """Every hashing slot is taken; the client should retry in a moment."""
+
+
+class PasswordHasher:
+    """
+    Salted scrypt password hashes, computed on a small dedicated executor.
+
+    At most `workers` hashes run at once and `queue` more may wait for them;
+    one more raises PasswordHasherBusy straight away instead of parking yet
+    another HTTP worker behind the KDF, so a burst of logins can't starve
+    attendance marking. hashlib.scrypt releases the GIL while it works.
+
+    Stored format is scrypt$n$r$p$<salt hex>$<key hex>. A bare 64-char hex
+    string is the old unsalted SHA-256; verify() still accepts it and hands
+    back a replacement hash so the caller can upgrade the row.
+    """
+
+    def __init__(self, workers=PW_HASH_WORKERS, queue=PW_HASH_QUEUE,
+                 n=PW_SCRYPT_N, r=PW_SCRYPT_R, p=PW_SCRYPT_P):
+        self.n, self.r, self.p = n, r, p
+        self._pool  = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pwhash')
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        # a valid hash nobody knows the password for — unknown users are checked
+        # against it; made on the pool, like every other hash
+        self._dummy = self._pool.submit(self._hash, secrets.token_hex(16))
+
+    def hash(self, password: str) -> str:
+        return self._run(self._hash, password)
+
+    def verify(self, password: str, stored: str | None) -> tuple:
+        """
+        (matches, replacement) — replacement is a fresh hash when `stored` is
+        legacy or weaker. stored=None (no such user) costs the same hash and
+        never matches.
+        """
+        return self._run(self._verify, password, stored)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _key(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p, dklen=32)
+
+    def _hash(self, password: str) -> str:
+        salt = secrets.token_bytes(16)
+        key  = self._key(password, salt, self.n, self.r, self.p)
+        return f'scrypt${self.n}${self.r}${self.p}${salt.hex()}${key.hex()}'
+
+    def _verify(self, password: str, stored: str | None) -> tuple:
+        if stored is None:
+            self._verify(password, self._dummy.result())
+            return False, None
+        if stored.startswith('scrypt$'):
+            _, n, r, p, salt, key = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+            ok    = hmac.compare_digest(self._key(password, bytes.fromhex(salt), n, r, p), bytes.fromhex(key))
+            stale = (n, r, p) != (self.n, self.r, self.p)
+        else:
+            ok    = hmac.compare_digest(_hash(password), stored)
+            stale = True
+        return ok, (self._hash(password) if ok and stale else None)
+
+
+password_hasher = PasswordHasher()
+
+
+class SessionStore:
+    """
+    token → session dict with sliding expiry, an LRU size cap and a
+    user_id → tokens index, all guarded by one lock.
+
+    With persist=True every login, update and logout is also written to
+    app_sessions (keyed by the token's hash, never the token), so sessions
+    survive a restart and server processes sharing church.DB share them:
+    a token this process hasn't seen is looked up there, and a cached one is
+    re-read every SESSION_REVALIDATE seconds so another process's logout or
+    user edit takes effect here too.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_size=SESSION_MAX, persist=False):
+        self.ttl      = ttl
+        self.max_size = max_size
+        self.persist  = persist
+        self._lock    = threading.Lock()
+        self._items   = OrderedDict()   # token → [session, last_seen, checked_at]; oldest first
+        self._by_user = {}              # user_id → {token, ...}
+
+    def __len__(self):
+        return len(self._items)
+
+    # ── public API ──
+    def create(self, session: dict) -> str:
+        token = secrets.token_hex(32)
+        now   = time.time()
+        with self._lock:
+            self._put(token, session, now, now)
+            self._evict(now)
+        if self.persist:
+            conn = get_conn()
+            conn.execute('DELETE FROM app_sessions WHERE last_seen < ?', (now - self.ttl,))
+            conn.execute('INSERT OR REPLACE INTO app_sessions VALUES (?,?,?,?)',
+                         (_hash(token), session['user_id'], json.dumps(session, ensure_ascii=False), now))
+            conn.commit()
+            conn.close()
+        return token
+
+    def get(self, token: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            item = self._items.get(token)
+            if item and now - item[1] > self.ttl:
+                self._remove(token)
+                item = None
+            if item:
+                item[1] = now
+                self._items.move_to_end(token)
+                if not self.persist or now - item[2] < SESSION_REVALIDATE:
+                    return item[0]
+        return self._load(token, now) if self.persist else None
+
+    def peek(self, token: str) -> dict | None:
+        """get() without sliding the expiry, for checks that aren't the user's own activity."""
+        now = time.time()
+        with self._lock:
+            item = self._items.get(token)
+            if item and now - item[1] <= self.ttl and (not self.persist or now - item[2] < SESSION_REVALIDATE):
+                return item[0]
+        if not self.persist:
+            return None
+        conn = get_conn()
+        row  = conn.execute('SELECT data FROM app_sessions WHERE token_hash=? AND last_seen >= ?',
+                            (_hash(token), now - self.ttl)).fetchone()
+        conn.close()
+        return json.loads(row['data']) if row else None
+
+    def update_user(self, user_id: int, **fields):
+        """Apply `fields` to every live session of `user_id`."""
+        with self._lock:
+            for token in self._by_user.get(user_id, ()):
+                self._items[token][0].update(fields)
+        if self.persist:
+            conn = get_conn()
+            paths = ', '.join(f"'$.{k}', ?" for k in fields)
+            conn.execute(f'UPDATE app_sessions SET data=json_set(data, {paths}) WHERE user_id=?',
+                         (*fields.values(), user_id))
+            conn.commit()
+            conn.close()
+
+    def drop(self, token: str):
+        with self._lock:
+            self._remove(token)
+        if self.persist:
+            conn = get_conn()
+            conn.execute('DELETE FROM app_sessions WHERE token_hash=?', (_hash(token),))
+            conn.commit()
+            conn.close()
+
+    def drop_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._remove(token)
+        if self.persist:
+            conn = get_conn()
+            conn.execute('DELETE FROM app_sessions WHERE user_id=?', (user_id,))
+            conn.commit()
+            conn.close()
+
+    # ── internals ──
+    def _load(self, token: str, now: float) -> dict | None:
+        """Read (or re-read) a persisted session, sliding its expiry in the same statement."""
+        conn = get_conn()
+        row  = conn.execute(
+            'UPDATE app_sessions SET last_seen=? WHERE token_hash=? AND last_seen >= ? RETURNING user_id, data',
+            (now, _hash(token), now - self.ttl)
+        ).fetchone()
+        conn.commit()
+        conn.close()
+        with self._lock:
+            self._remove(token)
+            if row is None:
+                return None
+            session = json.loads(row['data'])
+            self._put(token, session, now, now)
+            self._evict(now)
+            return session
+
+    def _put(self, token, session, last_seen, checked_at):
+        self._items[token] = [session, last_seen, checked_at]
+        self._by_user.setdefault(session['user_id'], set()).add(token)
+
+    def _remove(self, token):
+        item = self._items.pop(token, None)
+        if item:
+            tokens = self._by_user.get(item[0]['user_id'])
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[item[0]['user_id']]
+
+    def _evict(self, now):
+        # least recently used first: expired sessions and anything over the cap
+        while self._items:
+            token, item = next(iter(self._items.items()))
+            if len(self._items) <= self.max_size and now - item[1] <= self.ttl:
+                break
+            self._remove(token)
+
+
+sessions = SessionStore()
+
+
+def session_token(handler) -> str:
+    """The session token a request carries, '' when none."""
     auth = handler.headers.get('Authorization', '')
     if auth.startswith('Bearer '):
-        return sessions.get(auth[7:])
-    return None
+        return auth[7:]
+    # a plain link download or an EventSource can't set headers — those take the token in the query
+    path, _, query = handler.path.partition('?')
+    if path.startswith('/api/export/') or path == '/api/events':
+        return parse_qs(query).get('token', [''])[0]
+    return ''
+
+
+def get_session(handler) -> dict | None:
+    token = session_token(handler)
+    return sessions.get(token) if token else None
 
 
 def require_auth(handler) -> dict | None:
@@ -166,25 +772,33 @@ def require_auth(handler) -> dict | None:
 #  USER MANAGEMENT
 # ══════════════════════════════════════════════════════════════════════════════
 
+_BUSY_MESSAGE = 'الخادم مشغول، حاول مرة أخرى بعد لحظات'
+
+
 def api_login(data: dict):
+    """Raises PasswordHasherBusy when too many logins are already being checked."""
     username = data.get('username', '').strip().lower()
-    pw_hash  = _hash(data.get('password', ''))
+    password = data.get('password', '')
     conn = get_conn()
-    row  = conn.execute(
-        'SELECT * FROM app_users WHERE LOWER(username)=? AND password_hash=?',
-        (username, pw_hash)
-    ).fetchone()
+    row  = conn.execute('SELECT * FROM app_users WHERE LOWER(username)=?', (username,)).fetchone()
     conn.close()
-    if not row:
+    # unknown usernames still cost one hash, so timing doesn't reveal which ones exist
+    ok, upgraded = password_hasher.verify(password, row['password_hash'] if row else None)
+    if not row or not ok:
         return {'success': False, 'error': 'اسم المستخدم أو كلمة المرور غير صحيحة'}
-    token = secrets.token_hex(32)
-    sessions[token] = {
+    if upgraded:
+        conn = get_conn()
+        conn.execute('UPDATE app_users SET password_hash=? WHERE id=? AND password_hash=?',
+                     (upgraded, row['id'], row['password_hash']))
+        conn.commit()
+        conn.close()
+    token = sessions.create({
         'user_id':       row['id'],
         'role':          row['role'],
         'assigned_class': row['assigned_class'],
         'name':          row['name'],
         'username':      row['username'],
-    }
+    })
     return {
         'success':       True,
         'token':         token,
@@ -211,14 +825,19 @@ def api_create_user(data: dict):
     assigned_class = data.get('assigned_class') or None
     if not name or not username or not password:
         return {'error': 'جميع الحقول مطلوبة'}, 400
+    try:
+        pw_hash = password_hasher.hash(password)
+    except PasswordHasherBusy:
+        return {'error': _BUSY_MESSAGE}, 503
     conn = get_conn()
     try:
         c = conn.cursor()
         c.execute(
             'INSERT INTO app_users (name, username, password_hash, role, assigned_class) VALUES (?,?,?,?,?)',
-            (name, username, _hash(password), role, assigned_class)
+            (name, username, pw_hash, role, assigned_class)
         )
         conn.commit()
+        table_versions.bump('app_users')
         row = conn.execute(
             'SELECT id, name, username, role, assigned_class, created_at FROM app_users WHERE id=?',
             (c.lastrowid,)
@@ -238,12 +857,16 @@ def api_edit_user(user_id: int, data: dict):
     password       = data.get('password', '').strip()
     if not name or not username:
         return {'error': 'الاسم واسم المستخدم مطلوبان'}, 400
+    try:
+        pw_hash = password_hasher.hash(password) if password else None
+    except PasswordHasherBusy:
+        return {'error': _BUSY_MESSAGE}, 503
     conn = get_conn()
     try:
-        if password:
+        if pw_hash:
             conn.execute(
                 'UPDATE app_users SET name=?, username=?, role=?, assigned_class=?, password_hash=? WHERE id=?',
-                (name, username, role, assigned_class, _hash(password), user_id)
+                (name, username, role, assigned_class, pw_hash, user_id)
             )
         else:
             conn.execute(
@@ -251,15 +874,15 @@ def api_edit_user(user_id: int, data: dict):
                 (name, username, role, assigned_class, user_id)
             )
         conn.commit()
+        table_versions.bump('app_users')
         row = conn.execute(
             'SELECT id, name, username, role, assigned_class, created_at FROM app_users WHERE id=?',
             (user_id,)
         ).fetchone()
         conn.close()
         # refresh live sessions
-        for s in sessions.values():
-            if s['user_id'] == user_id:
-                s.update({'name': name, 'role': role, 'assigned_class': assigned_class})
+        sessions.update_user(user_id, name=name, username=username, role=role, assigned_class=assigned_class)
+        events.close(user_id=user_id)       # the browser reconnects with the new scope
         return dict(row), None
     except sqlite3.IntegrityError:
         conn.close()
@@ -280,8 +903,9 @@ def api_delete_user(user_id: int):
     conn.execute('DELETE FROM app_users WHERE id=?', (user_id,))
     conn.commit()
     conn.close()
-    for t in [k for k, v in sessions.items() if v['user_id'] == user_id]:
-        del sessions[t]
+    table_versions.bump('app_users')
+    sessions.drop_user(user_id)
+    events.close(user_id=user_id)
     return {'success': True}, None
 
 
@@ -292,14 +916,16 @@ def api_delete_user(user_id: int):
 _STUDENT_COLS = 'id, name, grade, whatsapp, avatar, COALESCE(birthdate,"") AS birthdate, attendance, status, total_classes, present_count, absent_count'
 
 
-def api_get_students(grade_filter=None):
+def api_get_students(grade_filter=None, columnar=False):
     conn = get_conn()
+    cur  = _raw_cursor(conn)
     if grade_filter:
-        rows = conn.execute(f'SELECT {_STUDENT_COLS} FROM app_students WHERE grade=? ORDER BY name', (grade_filter,)).fetchall()
+        cur.execute(f'SELECT {_STUDENT_COLS} FROM app_students WHERE grade=? ORDER BY name', (grade_filter,))
     else:
-        rows = conn.execute(f'SELECT {_STUDENT_COLS} FROM app_students ORDER BY grade, name').fetchall()
+        cur.execute(f'SELECT {_STUDENT_COLS} FROM app_students ORDER BY grade, name')
+    result = _shape(_columns(cur), cur.fetchall(), columnar)
     conn.close()
-    return [dict(r) for r in rows]
+    return result
 
 
 def api_add_student(data: dict):
@@ -310,13 +936,16 @@ def api_add_student(data: dict):
     conn = get_conn()
     c = conn.cursor()
     c.execute(
-        "INSERT INTO app_students (name, grade, whatsapp, avatar, attendance, status, total_classes, present_count, absent_count)"
-        " VALUES (?,?,?,?,100,'present',0,0,0)",
-        (name, grade, whatsapp, avatar)
+        "INSERT INTO app_students (name, grade, whatsapp, avatar, attendance, status, total_classes, present_count, absent_count, sync_version)"
+        " VALUES (?,?,?,?,100,'present',0,0,0,?)",
+        (name, grade, whatsapp, avatar, _next_version(conn))
     )
     conn.commit()
+    table_versions.bump('app_students', grade)
+    student_grades.set(c.lastrowid, grade)
     row = conn.execute(f'SELECT {_STUDENT_COLS} FROM app_students WHERE id=?', (c.lastrowid,)).fetchone()
     conn.close()
+    publish_roster('student', row, grade=grade)
     return dict(row)
 
 
@@ -328,23 +957,38 @@ def api_edit_student(student_id: int, data: dict):
     if not name:
         return {'error': 'الاسم مطلوب'}, 400
     conn = get_conn()
+    old  = conn.execute('SELECT grade FROM app_students WHERE id=?', (student_id,)).fetchone()
     conn.execute(
-        'UPDATE app_students SET name=?, grade=?, whatsapp=?, birthdate=?, avatar=? WHERE id=?',
-        (name, grade, whatsapp, birthdate, _make_avatar(name), student_id)
+        'UPDATE app_students SET name=?, grade=?, whatsapp=?, birthdate=?, avatar=?, sync_version=? WHERE id=?',
+        (name, grade, whatsapp, birthdate, _make_avatar(name), _next_version(conn), student_id)
     )
     conn.commit()
+    table_versions.bump('app_students', grade, old and old['grade'])
+    if old:
+        student_grades.set(student_id, grade)
     row = conn.execute(f'SELECT {_STUDENT_COLS} FROM app_students WHERE id=?', (student_id,)).fetchone()
     conn.close()
+    if old and old['grade'] != grade:
+        publish_roster('student', removed_id=student_id, grade=old['grade'])
+    if row:
+        publish_roster('student', row, grade=grade)
     return dict(row) if row else ({'error': 'غير موجود'}, 404)
 
 
 def api_delete_student(student_id: int):
     conn = get_conn()
+    old  = conn.execute('SELECT grade FROM app_students WHERE id=?', (student_id,)).fetchone()
+    _rollup_remove_person(conn, 'student', student_id)
     conn.execute('DELETE FROM app_students WHERE id=?', (student_id,))
     conn.execute('DELETE FROM attendance_records WHERE student_id=?', (student_id,))
     conn.execute('DELETE FROM attendance_log WHERE student_id=?', (student_id,))
+    conn.execute("INSERT INTO sync_tombstones VALUES (?, 'student', ?)", (_next_version(conn), student_id))
     conn.commit()
     conn.close()
+    if old:
+        table_versions.bump('app_students', old['grade'])
+        publish_roster('student', removed_id=student_id, grade=old['grade'])
+    student_grades.discard(student_id)
     return {'success': True}
 
 
@@ -352,11 +996,12 @@ def api_delete_student(student_id: int):
 #  TEACHERS
 # ══════════════════════════════════════════════════════════════════════════════
 
-def api_get_teachers():
+def api_get_teachers(columnar=False):
     conn = get_conn()
-    rows = conn.execute('SELECT * FROM app_teachers ORDER BY name').fetchall()
+    cur  = _raw_cursor(conn).execute('SELECT * FROM app_teachers ORDER BY name')
+    result = _shape(_columns(cur), cur.fetchall(), columnar)
     conn.close()
-    return [dict(r) for r in rows]
+    return result
 
 
 def api_add_teacher(data: dict):
@@ -367,13 +1012,15 @@ def api_add_teacher(data: dict):
     conn = get_conn()
     c = conn.cursor()
     c.execute(
-        "INSERT INTO app_teachers (name, subject, assigned_class, whatsapp, avatar, attendance, status, total_classes, present_count, absent_count)"
-        " VALUES (?,?,?,?,?,100,'present',0,0,0)",
-        (name, subject, assigned_class, whatsapp, _make_avatar(name))
+        "INSERT INTO app_teachers (name, subject, assigned_class, whatsapp, avatar, attendance, status, total_classes, present_count, absent_count, sync_version)"
+        " VALUES (?,?,?,?,?,100,'present',0,0,0,?)",
+        (name, subject, assigned_class, whatsapp, _make_avatar(name), _next_version(conn))
     )
     conn.commit()
+    table_versions.bump('app_teachers')
     row = conn.execute('SELECT * FROM app_teachers WHERE id=?', (c.lastrowid,)).fetchone()
     conn.close()
+    publish_roster('teacher', row)
     return dict(row)
 
 
@@ -386,250 +1033,1426 @@ def api_edit_teacher(teacher_id: int, data: dict):
         return {'error': 'الاسم مطلوب'}, 400
     conn = get_conn()
     conn.execute(
-        'UPDATE app_teachers SET name=?, subject=?, assigned_class=?, whatsapp=?, avatar=? WHERE id=?',
-        (name, subject, assigned_class, whatsapp, _make_avatar(name), teacher_id)
+        'UPDATE app_teachers SET name=?, subject=?, assigned_class=?, whatsapp=?, avatar=?, sync_version=? WHERE id=?',
+        (name, subject, assigned_class, whatsapp, _make_avatar(name), _next_version(conn), teacher_id)
     )
     conn.commit()
+    table_versions.bump('app_teachers')
     row = conn.execute('SELECT * FROM app_teachers WHERE id=?', (teacher_id,)).fetchone()
     conn.close()
+    if row:
+        publish_roster('teacher', row)
     return dict(row) if row else ({'error': 'غير موجود'}, 404)
 
 
 def api_delete_teacher(teacher_id: int):
     conn = get_conn()
+    _rollup_remove_person(conn, 'teacher', teacher_id)
     conn.execute('DELETE FROM app_teachers WHERE id=?', (teacher_id,))
     conn.execute('DELETE FROM teacher_attendance_records WHERE teacher_id=?', (teacher_id,))
     conn.execute('DELETE FROM teacher_attendance_log WHERE teacher_id=?', (teacher_id,))
+    conn.execute("INSERT INTO sync_tombstones VALUES (?, 'teacher', ?)", (_next_version(conn), teacher_id))
     conn.commit()
     conn.close()
+    table_versions.bump('app_teachers')
+    publish_roster('teacher', removed_id=teacher_id)
     return {'success': True}
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-#  STUDENT ATTENDANCE
+#  BULK IMPORT
 # ══════════════════════════════════════════════════════════════════════════════
+#
+#  A roster file is validated and de-duplicated in Python, then inserted with
+#  one executemany in one transaction instead of a request, an insert, a
+#  commit and a re-select per person.
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+GRADES = ('KG1', 'KG2') + tuple(str(g) for g in range(1, 13))
+
+# kind → field → header names accepted for it (compared lower-cased); the
+# headers the Excel exports write are included so an export re-imports as is
+_IMPORT_FIELDS = {
+    'student': {
+        'name':           ('name', 'الاسم'),
+        'grade':          ('grade', 'الفصل'),
+        'whatsapp':       ('whatsapp', 'واتساب'),
+        'birthdate':      ('birthdate', 'تاريخ الميلاد'),
+    },
+    'teacher': {
+        'name':           ('name', 'الاسم'),
+        'subject':        ('subject', 'المادة'),
+        'assigned_class': ('assigned_class', 'assignedclass', 'الفصل المخصص', 'الفصل'),
+        'whatsapp':       ('whatsapp', 'واتساب'),
+    },
+}
 
-def api_get_attendance_records(date: str):
-    conn = get_conn()
-    rows = conn.execute(
-        'SELECT student_id, status FROM attendance_records WHERE record_date=?', (date,)
-    ).fetchall()
-    conn.close()
-    return {str(r['student_id']): r['status'] for r in rows}
+# kind → (grade field, grade column on the people table, insert statement)
+_IMPORT_TARGETS = {
+    'student': ('grade', 'grade',
+                'INSERT INTO app_students (name, grade, whatsapp, birthdate, avatar, sync_version)'
+                ' VALUES (?,?,?,?,?,?)'),
+    'teacher': ('assigned_class', 'assigned_class',
+                'INSERT INTO app_teachers (name, assigned_class, subject, whatsapp, avatar, sync_version)'
+                ' VALUES (?,?,?,?,?,?)'),
+}
 
 
-def api_mark_attendance(data: dict):
+def api_import(kind: str, data: bytes, dry_run=False, forced_grade=None) -> dict:
+    """
+    Add students or teachers from an uploaded CSV/XLSX file (header row first).
+    Rows without a name, with an unknown grade, repeated in the file or already
+    on the roster under the same name and grade are reported and skipped.
+    `forced_grade` puts every row in that grade (a class servant's own class).
+    dry_run validates and reports without writing anything.
+    Raises SpreadsheetError when the file itself can't be read.
+    """
+    fields = _IMPORT_FIELDS[kind]
+    grade_field, grade_col, insert = _IMPORT_TARGETS[kind]
+    people = _SAVE_TABLES[kind][0]
+
+    rows   = read_rows(data)
+    header = next(rows, None)
+    if header is None:
+        raise SpreadsheetError('empty file')
+    names = [h.strip().lower() for h in header[1]]
+    cols  = {f: next((i for i, h in enumerate(names) if h in aliases), None) for f, aliases in fields.items()}
+    if cols['name'] is None:
+        raise SpreadsheetError('no name column')
+
     conn = get_conn()
-    conn.execute(
-        'INSERT INTO attendance_records (student_id, record_date, status) VALUES (?,?,?)'
-        ' ON CONFLICT(student_id, record_date) DO UPDATE SET status=excluded.status',
-        (data['studentId'], data['date'], data['status'])
-    )
-    conn.commit()
+    existing = {(' '.join(r[0].split()), r[1]) for r in conn.execute(f'SELECT name, {grade_col} FROM {people}')}
     conn.close()
-    return {'success': True}
 
+    staged, errors, total, in_file = [], [], 0, set()
+    for number, values in rows:
+        total += 1
+        row   = {f: (values[i].strip() if i is not None and i < len(values) else '') for f, i in cols.items()}
+        name  = ' '.join(row['name'].split())
+        grade = forced_grade or row[grade_field].upper() or ('' if kind == 'student' else 'KG1')
+        if not name:
+            errors.append({'row': number, 'name': '', 'error': 'الاسم مطلوب'}); continue
+        if grade not in GRADES:
+            errors.append({'row': number, 'name': name, 'error': f'فصل غير معروف: {row[grade_field]}'}); continue
+        if (name, grade) in existing:
+            errors.append({'row': number, 'name': name, 'error': 'موجود بالفعل'}); continue
+        if (name, grade) in in_file:
+            errors.append({'row': number, 'name': name, 'error': 'مكرر في الملف'}); continue
+        in_file.add((name, grade))
+        extra = (row['whatsapp'], row['birthdate']) if kind == 'student' else (row['subject'] or 'عام', row['whatsapp'])
+        staged.append((name, grade, *extra, _make_avatar(name)))
+
+    result = {'dry_run': dry_run, 'rows': total, 'accepted': len(staged),
+              'inserted': 0, 'skipped': len(errors), 'errors': errors}
+    if dry_run or not staged:
+        return result
 
-def api_save_attendance(data: dict):
-    """
-    Commit today's attendance:
-    - Update student stats (present_count, absent_count, total_classes, attendance %)
-    - Write to permanent attendance_log (upsert)
-    - Update daily summary in attendance_history
-    - Reset working attendance_records for those students
-    """
-    date    = data.get('date')
-    records = data.get('records', {})   # {student_id_str: status}
     conn    = get_conn()
-    present_c = absent_c = late_c = 0
+    version = _next_version(conn)
+    conn.executemany(insert, [(*r, version) for r in staged])
+    new_ids = conn.execute(f'SELECT id, {grade_col} FROM {people} WHERE sync_version=?', (version,)).fetchall()
+    conn.commit()
+    conn.close()
+    if kind == 'student':
+        for sid, grade in new_ids:
+            student_grades.set(sid, grade)
+        table_versions.bump('app_students', *{g for _, g in new_ids})
+    else:
+        table_versions.bump('app_teachers')
+    publish_roster(kind, imported=True)
+    result['inserted'] = len(staged)
+    return result
 
-    for sid_str, status in records.items():
-        sid = int(sid_str)
-        if status == 'none':
-            continue
-        if status == 'present':
-            conn.execute(
-                'UPDATE app_students SET present_count=present_count+1, total_classes=total_classes+1, status=? WHERE id=?',
-                (status, sid)
-            )
-            present_c += 1
-        elif status == 'absent':
-            conn.execute(
-                'UPDATE app_students SET absent_count=absent_count+1, total_classes=total_classes+1, status=? WHERE id=?',
-                (status, sid)
-            )
-            absent_c += 1
-        elif status == 'late':
-            conn.execute(
-                'UPDATE app_students SET present_count=present_count+1, total_classes=total_classes+1, status=? WHERE id=?',
-                (status, sid)
-            )
-            late_c += 1
 
-        # recalculate attendance %
-        conn.execute(
-            'UPDATE app_students SET attendance=ROUND(CAST(present_count AS REAL)/NULLIF(total_classes,0)*100) WHERE id=?',
-            (sid,)
-        )
-        # write to permanent log
-        conn.execute(
-            'INSERT INTO attendance_log (student_id, record_date, status) VALUES (?,?,?)'
-            ' ON CONFLICT(student_id, record_date) DO UPDATE SET status=excluded.status',
-            (sid, date, status)
-        )
-        # clear working record
-        conn.execute(
-            "UPDATE attendance_records SET status='none' WHERE student_id=? AND record_date=?",
-            (sid, date)
-        )
+# ══════════════════════════════════════════════════════════════════════════════
+#  BULK SAVE ENGINE
+# ══════════════════════════════════════════════════════════════════════════════
+#
+#  A save stages the day's marks once in a temp table, then applies counters,
+#  attendance %, the permanent log and the working-record reset as three
+#  set-based statements instead of four statements per person. Counters move
+#  by the difference from the status already logged for that day, so saving
+#  the same day again changes nothing, and reconcile_counters() can recompute
+#  them from the logs if they ever drift.
+
+# people table, permanent log, working records, id column in log/records
+_SAVE_TABLES = {
+    'student': ('app_students', 'attendance_log',         'attendance_records',         'student_id'),
+    'teacher': ('app_teachers', 'teacher_attendance_log', 'teacher_attendance_records', 'teacher_id'),
+}
 
-    # upsert daily summary
-    conn.execute(
-        'INSERT INTO attendance_history (record_date, present_count, absent_count, late_count) VALUES (?,?,?,?)'
-        ' ON CONFLICT(record_date) DO UPDATE SET present_count=excluded.present_count,'
-        ' absent_count=excluded.absent_count, late_count=excluded.late_count',
-        (date, present_c, absent_c, late_c)
-    )
-    conn.commit()
-    conn.close()
-    return {'success': True, 'updated': present_c + absent_c + late_c}
+# status → (present_count delta, absent_count delta); unknown statuses count for nothing
+_STUDENT_SAVE_DELTAS = {'present': (1, 0), 'late': (1, 0), 'absent': (0, 1)}
 
+# attendance % from present and total counts; 100 (the column default) before any class
+_ATTENDANCE_PCT = 'IFNULL(ROUND(CAST({present} AS REAL) / NULLIF({total}, 0) * 100), 100)'
 
-def api_get_attendance_history():
-    conn = get_conn()
-    rows = conn.execute(
-        'SELECT record_date AS date, present_count AS present, absent_count AS absent, late_count AS late'
-        ' FROM attendance_history ORDER BY record_date DESC LIMIT 60'
-    ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+# attendance_history's (present, absent, late) counted over attendance_log rows `l`
+_HISTORY_COUNTS = ("IFNULL(SUM(l.status = 'present'), 0), IFNULL(SUM(l.status = 'absent'), 0),"
+                   " IFNULL(SUM(l.status = 'late'), 0)")
 
 
-def api_get_attendance_log(date_filter=None, grade_filter=None):
+def _bulk_save(conn, kind: str, date: str, staged: list) -> int:
     """
-    Read from permanent attendance_log — always populated regardless of date.
+    Apply a day's marks for one kind of person.
+    staged: [(id, status, present_delta, absent_delta, counted)] — `counted`
+    rows also overwrite the person's current status. The deltas are those of
+    the new status; what the day's previously logged status counted is taken
+    back off, so re-saving a day is idempotent.
+    Returns the sync version the changed rows were stamped with.
     """
-    conn  = get_conn()
-    query = (
-        'SELECT al.record_date AS date, al.status, s.id AS student_id, s.name, s.grade'
-        ' FROM attendance_log al'
-        ' JOIN app_students s ON s.id = al.student_id'
-        ' WHERE 1=1'
+    people, log, working, id_col = _SAVE_TABLES[kind]
+    version = _next_version(conn)
+    conn.execute(
+        'CREATE TEMP TABLE IF NOT EXISTS save_stage'
+        ' (id INTEGER, status TEXT, dp INTEGER, da INTEGER, counted INTEGER)'
     )
-    params = []
-    if date_filter:
-        query += ' AND al.record_date=?'; params.append(date_filter)
-    if grade_filter and grade_filter != 'all':
-        query += ' AND s.grade=?';        params.append(grade_filter)
-    query += ' ORDER BY al.record_date DESC, s.grade, s.name'
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    conn.execute('DELETE FROM temp.save_stage')
+    conn.executemany('INSERT INTO temp.save_stage VALUES (?,?,?,?,?)', staged)
+
+    # rollups move by (new status − status already logged for that day)
+    new, old = _rollup_counts(kind, 'st.status'), _rollup_counts(kind, 'l.status')
+    _apply_rollup_delta(conn, kind, f'''
+        SELECT p.{_ROLLUP_SOURCE[kind]}, ?,
+               {new[0]} - {old[0]}, {new[1]} - {old[1]}, {new[2]} - {old[2]}
+        FROM temp.save_stage st
+        JOIN {people} p ON p.id = st.id
+        LEFT JOIN {log} l ON l.{id_col} = st.id AND l.record_date = ?
+    ''', (date, date))
+
+    conn.execute(f'''
+        UPDATE {people} SET
+            present_count = present_count + st.dp,
+            absent_count  = absent_count  + st.da,
+            total_classes = total_classes + st.dp + st.da,
+            status        = CASE WHEN st.counted THEN st.status ELSE {people}.status END,
+            attendance    = {_ATTENDANCE_PCT.format(present='present_count + st.dp',
+                                                    total='total_classes + st.dp + st.da')},
+            sync_version  = ?
+        FROM (
+            SELECT st.id, st.status, st.counted,
+                   st.dp - {old[0]} - {old[2]} AS dp,
+                   st.da - {old[1]}            AS da
+            FROM temp.save_stage st
+            LEFT JOIN {log} l ON l.{id_col} = st.id AND l.record_date = ?
+        ) st
+        WHERE {people}.id = st.id
+    ''', (version, date))
+    conn.execute(
+        f'INSERT INTO {log} ({id_col}, record_date, status)'
+        f' SELECT id, ?, status FROM temp.save_stage WHERE true'
+        f' ON CONFLICT({id_col}, record_date) DO UPDATE SET status=excluded.status',
+        (date,)
+    )
+    conn.execute(
+        f"UPDATE {working} SET status='none', sync_version=?"
+        f' WHERE record_date=? AND {id_col} IN (SELECT id FROM temp.save_stage)',
+        (version, date)
+    )
+    conn.execute('DELETE FROM temp.save_stage')
+    return version
 
 
-def api_get_student_history(student_id: int):
-    conn = get_conn()
-    rows = conn.execute(
-        'SELECT record_date AS date, status FROM attendance_log WHERE student_id=? ORDER BY record_date DESC',
-        (student_id,)
-    ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+def reconcile_counters(conn=None) -> dict:
+    """
+    Recompute every student's and teacher's counters, attendance % and
+    current status, and every attendance_history row, from the logs —
+    archived years included — in one grouped pass per log and tier. Only
+    rows whose values change are rewritten (and stamped for delta sync).
+    Returns how many students, teachers and history days changed.
+    """
+    own  = conn is None
+    conn = conn or get_conn()
+    per_person = {}
+    for kind in _SAVE_TABLES:
+        people, log, _, id_col = _SAVE_TABLES[kind]
+        present, absent, late = _rollup_counts(kind, 'status')
+        # MAX(record_date) makes the bare `status` that of each person's newest counted day
+        per_person[kind] = f'''
+            SELECT {id_col}, SUM({present} + {late}), SUM({absent}), MAX(record_date), status
+            FROM {{schema}}.{log}
+            WHERE {present} OR {absent} OR {late}
+            GROUP BY {id_col}
+        '''
+    per_day = f'''
+        SELECT l.record_date, {_HISTORY_COUNTS}
+        FROM {{schema}}.attendance_log l JOIN main.app_students s ON s.id = l.student_id
+        GROUP BY l.record_date
+    '''
+    # archived years are read first: attaching them can't happen inside the reconcile's transaction
+    archived = {kind: [row for schema in _log_tiers(conn, hot=False)
+                       for row in conn.execute(sql.format(schema=schema)).fetchall()]
+                for kind, sql in per_person.items()}
+    archived_days = [row for schema in _log_tiers(conn, hot=False)
+                     for row in conn.execute(per_day.format(schema=schema)).fetchall()]
+
+    version = _next_version(conn)
+    changed = {}
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS reconcile_stage'
+                 ' (id INTEGER, p INTEGER, a INTEGER, last_date TEXT, status TEXT)')
+    for kind, sql in per_person.items():
+        people = _SAVE_TABLES[kind][0]
+        conn.execute('DELETE FROM temp.reconcile_stage')
+        conn.execute('INSERT INTO temp.reconcile_stage ' + sql.format(schema='main'))
+        conn.executemany('INSERT INTO temp.reconcile_stage VALUES (?,?,?,?,?)', archived[kind])
+        cur = conn.execute(f'''
+            UPDATE {people} SET
+                present_count = r.p,
+                absent_count  = r.a,
+                total_classes = r.p + r.a,
+                attendance    = r.pct,
+                status        = COALESCE(r.status, {people}.status),
+                sync_version  = ?
+            FROM (
+                SELECT p.id, IFNULL(SUM(st.p), 0) AS p, IFNULL(SUM(st.a), 0) AS a,
+                       {_ATTENDANCE_PCT.format(present='SUM(st.p)', total='SUM(st.p) + SUM(st.a)')} AS pct,
+                       st.status, MAX(st.last_date)
+                FROM {people} p LEFT JOIN temp.reconcile_stage st ON st.id = p.id
+                GROUP BY p.id
+            ) r
+            WHERE {people}.id = r.id
+              AND ({people}.present_count, {people}.absent_count, {people}.total_classes,
+                   {people}.attendance, {people}.status)
+                  IS NOT (r.p, r.a, r.p + r.a, r.pct, COALESCE(r.status, {people}.status))
+        ''', (version,))
+        changed[kind] = cur.rowcount
+    conn.execute('DELETE FROM temp.reconcile_stage')
+
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS reconcile_days'
+                 ' (record_date TEXT PRIMARY KEY, present INTEGER, absent INTEGER, late INTEGER)')
+    conn.execute('DELETE FROM temp.reconcile_days')
+    conn.execute('INSERT INTO temp.reconcile_days ' + per_day.format(schema='main'))
+    conn.executemany('INSERT INTO temp.reconcile_days VALUES (?,?,?,?)', archived_days)
+    days = conn.execute('''
+        DELETE FROM attendance_history
+        WHERE record_date NOT IN (SELECT record_date FROM temp.reconcile_days)
+    ''').rowcount
+    days += conn.execute('''
+        INSERT INTO attendance_history (record_date, present_count, absent_count, late_count, sync_version)
+        SELECT d.record_date, d.present, d.absent, d.late, ?
+        FROM temp.reconcile_days d LEFT JOIN attendance_history h ON h.record_date = d.record_date
+        WHERE h.record_date IS NULL
+           OR (h.present_count, h.absent_count, h.late_count) IS NOT (d.present, d.absent, d.late)
+        ON CONFLICT(record_date) DO UPDATE SET present_count=excluded.present_count,
+            absent_count=excluded.absent_count, late_count=excluded.late_count, sync_version=excluded.sync_version
+    ''', (version,)).rowcount
+    conn.execute('DELETE FROM temp.reconcile_days')
+    if own:
+        conn.commit()
+        conn.close()
+    if changed['student']:
+        table_versions.bump('app_students')
+    if changed['teacher']:
+        table_versions.bump('app_teachers')
+    if days:
+        table_versions.bump('attendance_history')
+    return {'students': changed['student'], 'teachers': changed['teacher'], 'history_days': days}
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-#  TEACHER ATTENDANCE
+#  ROLLUPS
 # ══════════════════════════════════════════════════════════════════════════════
+#
+#  Present/absent/late totals per (grade, day), (grade, month) and the same
+#  per teacher department. Saves and deletes adjust them inside their own
+#  transaction, so reports read a handful of rows however long the history.
+
+# kind → (key column, daily table, monthly table)
+_ROLLUPS = {
+    'student': ('grade',      'grade_daily_stats',      'grade_monthly_stats'),
+    'teacher': ('department', 'department_daily_stats', 'department_monthly_stats'),
+}
 
-def api_get_teacher_attendance_records(date: str):
-    conn = get_conn()
-    rows = conn.execute(
-        'SELECT teacher_id, status FROM teacher_attendance_records WHERE record_date=?', (date,)
-    ).fetchall()
-    conn.close()
-    return {str(r['teacher_id']): r['status'] for r in rows}
+# column on the people table each rollup key comes from
+_ROLLUP_SOURCE = {'student': 'grade', 'teacher': 'subject'}
 
 
-def api_mark_teacher_attendance(data: dict):
-    conn = get_conn()
-    conn.execute(
-        'INSERT INTO teacher_attendance_records (teacher_id, record_date, status) VALUES (?,?,?)'
-        ' ON CONFLICT(teacher_id, record_date) DO UPDATE SET status=excluded.status',
-        (data['teacherId'], data['date'], data['status'])
-    )
-    conn.commit()
-    conn.close()
-    return {'success': True}
+def _rollup_counts(kind: str, col: str) -> tuple:
+    """SQL (present, absent, late) 0/1 expressions for a status column that may be NULL."""
+    absent = (f"({col} IS 'absent')" if kind == 'student'
+              else f"({col} IS NOT NULL AND {col} NOT IN ('present','late'))")
+    return f"({col} IS 'present')", absent, f"({col} IS 'late')"
 
 
-def api_save_teacher_attendance(data: dict):
-    date    = data.get('date')
-    records = data.get('records', {})
-    conn    = get_conn()
-    updated = 0
-    for tid_str, status in records.items():
-        tid = int(tid_str)
-        if status == 'none':
-            continue
-        if status in ('present', 'late'):
-            conn.execute(
-                'UPDATE app_teachers SET present_count=present_count+1, total_classes=total_classes+1, status=? WHERE id=?',
-                (status, tid)
-            )
-        else:
-            conn.execute(
-                'UPDATE app_teachers SET absent_count=absent_count+1, total_classes=total_classes+1, status=? WHERE id=?',
-                (status, tid)
-            )
-        conn.execute(
-            'UPDATE app_teachers SET attendance=ROUND(CAST(present_count AS REAL)/NULLIF(total_classes,0)*100) WHERE id=?',
-            (tid,)
-        )
+def _apply_rollup_delta(conn, kind: str, delta_sql: str, params=(), extra=()):
+    """
+    Add rows of (key, record_date, present, absent, late) deltas to the daily
+    and monthly rollups — those delta_sql selects, plus any `extra` rows.
+    """
+    key_col, daily, monthly = _ROLLUPS[kind]
+    conn.execute(
+        'CREATE TEMP TABLE IF NOT EXISTS rollup_delta'
+        ' (k TEXT, record_date TEXT, present INTEGER, absent INTEGER, late INTEGER)'
+    )
+    conn.execute('DELETE FROM temp.rollup_delta')
+    conn.execute(f'INSERT INTO temp.rollup_delta {delta_sql}', params)
+    conn.executemany('INSERT INTO temp.rollup_delta VALUES (?,?,?,?,?)', extra)
+    for table, period, period_col in ((daily,   'record_date',             'record_date'),
+                                      (monthly, 'substr(record_date,1,7)', 'month')):
         conn.execute(
-            'INSERT INTO teacher_attendance_log (teacher_id, record_date, status) VALUES (?,?,?)'
-            ' ON CONFLICT(teacher_id, record_date) DO UPDATE SET status=excluded.status',
-            (tid, date, status)
+            f'INSERT INTO {table} ({key_col}, {period_col}, present, absent, late)'
+            f' SELECT k, {period}, SUM(present), SUM(absent), SUM(late)'
+            f' FROM temp.rollup_delta WHERE true GROUP BY k, {period}'
+            f' ON CONFLICT({key_col}, {period_col}) DO UPDATE SET'
+            f'  present=present+excluded.present, absent=absent+excluded.absent, late=late+excluded.late'
         )
         conn.execute(
-            "UPDATE teacher_attendance_records SET status='none' WHERE teacher_id=? AND record_date=?",
-            (tid, date)
+            f'DELETE FROM {table} WHERE present=0 AND absent=0 AND late=0'
+            f' AND ({key_col}, {period_col}) IN (SELECT k, {period} FROM temp.rollup_delta)'
         )
-        updated += 1
-    conn.commit()
-    conn.close()
-    return {'success': True, 'updated': updated}
+    conn.execute('DELETE FROM temp.rollup_delta')
 
 
-def api_get_teacher_attendance_log(date_filter=None):
-    conn  = get_conn()
-    query = (
-        'SELECT tal.record_date AS date, tal.status,'
-        '       t.id AS teacher_id, t.name, t.subject, t.assigned_class'
-        ' FROM teacher_attendance_log tal'
-        ' JOIN app_teachers t ON t.id = tal.teacher_id'
-        ' WHERE 1=1'
-    )
-    params = []
-    if date_filter:
-        query += ' AND tal.record_date=?'; params.append(date_filter)
-    query += ' ORDER BY tal.record_date DESC, t.name'
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+def _rollup_remove_person(conn, kind: str, person_id: int):
+    """
+    Take a person's whole logged history back out of the rollups (before
+    deleting it). Must run before the delete's transaction starts, so the
+    archived years can be attached and read first.
+    """
+    people, log, _, id_col = _SAVE_TABLES[kind]
+    present, absent, late = _rollup_counts(kind, 'l.status')
+    delta = f'''
+        SELECT p.{_ROLLUP_SOURCE[kind]}, l.record_date, -{present}, -{absent}, -{late}
+        FROM {{schema}}.{log} l JOIN main.{people} p ON p.id = l.{id_col}
+        WHERE l.{id_col} = ?
+    '''
+    archived = [row for schema in _log_tiers(conn, hot=False)
+                for row in conn.execute(delta.format(schema=schema), (person_id,)).fetchall()]
+    _apply_rollup_delta(conn, kind, delta.format(schema='main'), (person_id,), archived)
+
+
+def rebuild_rollups(conn=None):
+    """
+    Regenerate every rollup from the permanent logs in one pass each.
+    History is attributed to each person's *current* grade / department —
+    the incremental path keeps the grade they had when the day was saved.
+    """
+    own  = conn is None
+    conn = conn or get_conn()
+    days = {}
+    for kind in _ROLLUPS:
+        people, log, _, id_col = _SAVE_TABLES[kind]
+        present, absent, late = _rollup_counts(kind, 'l.status')
+        days[kind] = f'''
+            SELECT p.{_ROLLUP_SOURCE[kind]}, l.record_date, SUM({present}), SUM({absent}), SUM({late})
+            FROM {{schema}}.{log} l JOIN main.{people} p ON p.id = l.{id_col}
+            GROUP BY 1, 2
+            HAVING SUM({present}) + SUM({absent}) + SUM({late}) > 0
+        '''
+    # archived years are summed first: attaching them can't happen inside the rebuild's transaction
+    archived = {kind: [row for schema in _log_tiers(conn, hot=False)
+                       for row in conn.execute(sql.format(schema=schema)).fetchall()]
+                for kind, sql in days.items()}
+    for kind, (key_col, daily, monthly) in _ROLLUPS.items():
+        conn.execute(f'DELETE FROM {daily}')
+        conn.execute(f'DELETE FROM {monthly}')
+        insert = f'INSERT INTO {daily} ({key_col}, record_date, present, absent, late) '
+        conn.execute(insert + days[kind].format(schema='main'))
+        conn.executemany(insert + 'VALUES (?,?,?,?,?)', archived[kind])
+        conn.execute(f'''
+            INSERT INTO {monthly} ({key_col}, month, present, absent, late)
+            SELECT {key_col}, substr(record_date,1,7), SUM(present), SUM(absent), SUM(late)
+            FROM {daily} GROUP BY 1, 2
+        ''')
+    if own:
+        conn.commit()
+        conn.close()
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-#  HELPERS
+#  LOG PAGING
 # ══════════════════════════════════════════════════════════════════════════════
 
-def _make_avatar(name: str) -> str:
-    parts = name.split()
-    return (parts[0][0] + parts[1][0]).upper() if len(parts) > 1 else name[:2].upper()
+LOG_PAGE_SIZE = 200
+LOG_PAGE_MAX  = 1000
 
 
-# ══════════════════════════════════════════════════════════════════════════════
-#  HTTP HANDLER
-# ══════════════════════════════════════════════════════════════════════════════
+def _encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, arity: int):
+    """Opaque page cursor → keyset list of `arity` values (ValueError if it was tampered with)."""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError('invalid cursor') from e
+    if not isinstance(key, list) or len(key) != arity:
+        raise ValueError('invalid cursor')
+    return key
+
+
+def _log_page(query: str, params: list, limit: int, key: tuple, columnar=False, span=None) -> dict:
+    """
+    One keyset page; `key` names the columns the next_cursor is built from.
+    With a `span` the query is a log query (see _log_tiers), run tier by
+    tier, newest first, until the page is full.
+    """
+    limit = max(1, min(int(limit), LOG_PAGE_MAX))
+    conn  = get_conn()
+    rows  = []
+    for tier_query in _tier_queries(conn, query, span):
+        cur   = _raw_cursor(conn).execute(tier_query + ' LIMIT ?', (*params, limit + 1 - len(rows)))
+        cols  = _columns(cur)
+        rows += cur.fetchall()
+        if len(rows) > limit:
+            break
+    conn.close()
+    more  = len(rows) > limit
+    rows  = rows[:limit]
+    return {
+        'records':     _shape(cols, rows, columnar),
+        'next_cursor': _encode_cursor([rows[-1][cols.index(k)] for k in key]) if more else None,
+    }
+
+
+def _iter_rows(query: str, params: list, batch: int = 500, columnar=False, span=None):
+    """
+    Rows straight off the cursor as dicts — or, with columnar=True, the list
+    of column names first and then each row as a plain tuple. A log query
+    with a `span` streams every tier it covers, one after the other.
+    """
+    conn = get_conn()
+    try:
+        cols = None
+        for tier_query in _tier_queries(conn, query, span):
+            cur = _raw_cursor(conn).execute(tier_query, params)
+            if cols is None:
+                cols = _columns(cur)
+                if columnar:
+                    yield cols
+            while True:
+                rows = cur.fetchmany(batch)
+                if not rows:
+                    break
+                if columnar:
+                    yield from rows
+                else:
+                    for r in rows:
+                        yield dict(zip(cols, r))
+    finally:
+        conn.close()
+
+
+def _log_count(query: str, params: list, span) -> dict:
+    conn = get_conn()
+    n    = sum(conn.execute(q, params).fetchall()[0]['count'] for q in _tier_queries(conn, query, span))
+    conn.close()
+    return {'count': n}
+
+
+# ── columnar results ──────────────────────────────────────────────────────────
+#
+# List endpoints answer ?format=columnar with {"columns": [...], "rows": [[...]]}
+# built from plain cursor tuples: no per-row dict, and no key repeated on every
+# row. _shape() produces either form from the same cursor output.
+
+def _raw_cursor(conn):
+    """A cursor that returns plain tuples instead of sqlite3.Row."""
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur
+
+
+def _columns(cur) -> list:
+    return [d[0] for d in cur.description]
+
+
+def _shape(cols: list, rows: list, columnar=False):
+    if columnar:
+        return {'columns': cols, 'rows': rows}
+    return [dict(zip(cols, r)) for r in rows]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  LOG ARCHIVE
+# ══════════════════════════════════════════════════════════════════════════════
+#
+# Closed service years (September to August) of attendance_log and
+# teacher_attendance_log move out of the hot database into one file each,
+# archive/attendance-2023-2024.db next to it, registered in log_archives.
+# Archives are always the oldest years, and saves into an archived year are
+# refused, so the tiers never overlap: hot rows are newer than every archived
+# one. Log readers walk the tiers newest first, attaching each archive
+# read-only the first time a connection needs it, and concatenate — keyset
+# pages, counts and streams stay in order without merging. A date range skips
+# the archives outside it. The rollups and attendance_history stay hot, so
+# reports never touch the archives.
+
+def _archive_dir() -> str:
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), 'archive')
+
+
+def service_year(date: str) -> int:
+    """The calendar year a service year starts in: 2024-03-10 → 2023."""
+    year, month = int(date[:4]), int(date[5:7])
+    return year if month >= SERVICE_YEAR_START else year - 1
+
+
+def _service_year_bounds(year: int) -> tuple:
+    """[first day, first day of the next service year) as ISO dates."""
+    return f'{year}-{SERVICE_YEAR_START:02d}-01', f'{year + 1}-{SERVICE_YEAR_START:02d}-01'
+
+
+def _archived_until(conn):
+    """First date still in the hot tier when anything is archived, else None."""
+    year = conn.execute('SELECT MAX(year) FROM log_archives').fetchone()[0]
+    return _service_year_bounds(year)[1] if year is not None else None
+
+
+def _log_span(date_filter=None, date_from=None, date_to=None, after=None) -> tuple:
+    """(from, to) dates a log query can match; a page cursor caps `to`."""
+    lo = date_filter or date_from
+    hi = date_filter or date_to
+    if after:
+        hi = min(hi, str(after[0])) if hi else str(after[0])
+    return lo, hi
+
+
+def _attach_archive(conn, year: int, file: str) -> str:
+    schema = f'arc_{year}'
+    if year in conn.archives:
+        conn.archives.move_to_end(year)
+        return schema
+    if conn.in_transaction:
+        raise RuntimeError('log archives can only be attached outside a transaction')
+    while len(conn.archives) >= ARCHIVE_MAX_ATTACHED:
+        old, _ = conn.archives.popitem(last=False)
+        conn.execute(f'DETACH DATABASE arc_{old}')
+    uri = 'file:' + pathname2url(os.path.join(_archive_dir(), file)) + '?mode=ro&immutable=1'
+    conn.execute(f'ATTACH DATABASE ? AS {schema}', (uri,))
+    conn.archives[year] = schema
+    return schema
+
+
+def _log_tiers(conn, date_from=None, date_to=None, hot=True):
+    """
+    Schemas holding log rows between date_from and date_to, newest first:
+    'main', then every overlapping archive, attached as it is reached.
+    """
+    archives = conn.execute(
+        'SELECT year, file, first_date, last_date FROM log_archives ORDER BY year DESC'
+    ).fetchall()
+    if hot:
+        yield 'main'
+    for year, file, first, last in archives:
+        if (date_from and last < date_from) or (date_to and first > date_to):
+            continue
+        yield _attach_archive(conn, year, file)
+
+
+_ARCHIVED_YEAR_ERROR = 'هذه السنة مؤرشفة ولا يمكن تعديل حضورها'
+
+
+def _saves_archived_year(conn, date) -> bool:
+    """True when `date` falls in an archived service year (saving it would split the tiers)."""
+    until = _archived_until(conn)
+    return bool(until and date and str(date) < until)
+
+
+def _tier_queries(conn, query: str, span):
+    """`query` once per tier of `span` with {tier} filled in — or just `query` without a span."""
+    if span is None:
+        yield query
+        return
+    for schema in _log_tiers(conn, *span):
+        yield query.format(tier=schema)
+
+
+# ── archiving ─────────────────────────────────────────────────────────────────
+
+_ARCHIVE_SCHEMA = """
+    CREATE TABLE attendance_log (
+        id          INTEGER PRIMARY KEY,
+        student_id  INTEGER NOT NULL,
+        record_date TEXT    NOT NULL,
+        status      TEXT    NOT NULL,
+        UNIQUE(student_id, record_date)
+    );
+    CREATE TABLE teacher_attendance_log (
+        id          INTEGER PRIMARY KEY,
+        teacher_id  INTEGER NOT NULL,
+        record_date TEXT    NOT NULL,
+        status      TEXT    NOT NULL,
+        UNIQUE(teacher_id, record_date)
+    );
+    CREATE INDEX idx_attendance_log_date ON attendance_log (record_date);
+    CREATE INDEX idx_teacher_log_date    ON teacher_attendance_log (record_date);
+    CREATE TABLE archive_meta (
+        year INTEGER, first_date TEXT, last_date TEXT,
+        student_rows INTEGER, teacher_rows INTEGER, checksum TEXT, archived_at TEXT
+    );
+"""
+
+
+def _log_digest(conn, schema: str, lo: str, hi: str) -> tuple:
+    """(student rows, teacher rows, SHA-256 over both logs in id order) for [lo, hi)."""
+    digest = hashlib.sha256()
+    counts = []
+    for kind in ('student', 'teacher'):
+        _, log, _, id_col = _SAVE_TABLES[kind]
+        n = 0
+        cur = _raw_cursor(conn).execute(
+            f'SELECT id, {id_col}, record_date, status FROM {schema}.{log}'
+            f' WHERE record_date >= ? AND record_date < ? ORDER BY id', (lo, hi))
+        for row in cur:
+            digest.update(('|'.join(map(str, row)) + '\n').encode())
+            n += 1
+        digest.update(f'-- {log} {n}\n'.encode())
+        counts.append(n)
+    return counts[0], counts[1], digest.hexdigest()
+
+
+def _archive_year(conn, year: int) -> dict:
+    """Move one closed service year out of the hot logs into its archive file."""
+    lo, hi = _service_year_bounds(year)
+    students, teachers, checksum = _log_digest(conn, 'main', lo, hi)
+    first, last = conn.execute(
+        'SELECT MIN(d), MAX(d) FROM (SELECT record_date AS d FROM attendance_log WHERE record_date >= ? AND record_date < ?'
+        ' UNION ALL SELECT record_date FROM teacher_attendance_log WHERE record_date >= ? AND record_date < ?)',
+        (lo, hi, lo, hi)).fetchone()
+    file = f'attendance-{year}-{year + 1}.db'
+    path = os.path.join(_archive_dir(), file)
+    part = path + '.part'
+    os.makedirs(_archive_dir(), exist_ok=True)
+    if os.path.exists(part):
+        os.remove(part)
+
+    out = sqlite3.connect(part)
+    out.executescript(_ARCHIVE_SCHEMA)
+    out.close()
+    conn.execute('ATTACH DATABASE ? AS archive_out', (part,))
+    try:
+        for kind in ('student', 'teacher'):
+            _, log, _, id_col = _SAVE_TABLES[kind]
+            conn.execute(f'INSERT INTO archive_out.{log} (id, {id_col}, record_date, status)'
+                         f' SELECT id, {id_col}, record_date, status FROM main.{log}'
+                         f' WHERE record_date >= ? AND record_date < ? ORDER BY id', (lo, hi))
+        archived_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        conn.execute('INSERT INTO archive_out.archive_meta VALUES (?,?,?,?,?,?,?)',
+                     (year, first, last, students, teachers, checksum, archived_at))
+        conn.commit()
+        if _log_digest(conn, 'archive_out', lo, hi) != (students, teachers, checksum):
+            raise RuntimeError(f'archive of {year}-{year + 1} does not match the hot log')
+    finally:
+        conn.rollback()
+        conn.execute('DETACH DATABASE archive_out')
+    os.replace(part, path)
+
+    # registry row and hot delete in one transaction: a crash leaves either both tiers or the archive.
+    # The year is digested again under the write lock, so a save that landed after the copy fails
+    # the run instead of being deleted with the rest; saves check the registry under the same lock.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if _log_digest(conn, 'main', lo, hi) != (students, teachers, checksum):
+            raise RuntimeError(f'the hot log of {year}-{year + 1} changed while it was archived; run the archive again')
+        conn.execute('INSERT INTO log_archives VALUES (?,?,?,?,?,?,?,?)',
+                     (year, file, first, last, students, teachers, checksum, archived_at))
+        for kind in ('student', 'teacher'):
+            conn.execute(f'DELETE FROM {_SAVE_TABLES[kind][1]} WHERE record_date >= ? AND record_date < ?', (lo, hi))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        os.remove(path)
+        raise
+    return {'year': year, 'file': file, 'student_rows': students, 'teacher_rows': teachers}
+
+
+def archive_logs(through=None) -> list:
+    """
+    Archive every closed service year still in the hot logs, oldest first,
+    up to and including the one starting in `through` (default: all but the
+    current service year). Returns one summary per archived year.
+    """
+    current = service_year(time.strftime('%Y-%m-%d'))
+    through = current - 1 if through is None else min(through, current - 1)
+    conn = get_conn()
+    years = [service_year(r[0]) for r in conn.execute(
+        'SELECT MIN(record_date) FROM attendance_log UNION ALL SELECT MIN(record_date) FROM teacher_attendance_log'
+    ).fetchall() if r[0]]
+    done = []
+    if years:
+        for year in range(min(years), through + 1):
+            if conn.execute('SELECT 1 FROM log_archives WHERE year=?', (year,)).fetchone():
+                continue
+            lo, hi = _service_year_bounds(year)
+            if not conn.execute('SELECT 1 FROM attendance_log WHERE record_date >= ? AND record_date < ?'
+                                ' UNION ALL SELECT 1 FROM teacher_attendance_log'
+                                ' WHERE record_date >= ? AND record_date < ? LIMIT 1', (lo, hi, lo, hi)).fetchone():
+                continue
+            done.append(_archive_year(conn, year))
+    if done:
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')     # VACUUM went through the WAL
+    conn.close()
+    return done
+
+
+def verify_archives() -> list:
+    """
+    Check every registered archive: the file opens and passes integrity_check,
+    its rows match the registry's counts and checksum, and none of its service
+    year is left in the hot logs. Returns a list of problems (empty when sound).
+    """
+    conn = get_conn()
+    problems = []
+    for year, file, students, teachers, checksum in conn.execute(
+            'SELECT year, file, student_rows, teacher_rows, checksum FROM log_archives ORDER BY year').fetchall():
+        lo, hi = _service_year_bounds(year)
+        name = f'{year}-{year + 1} ({file})'
+        if not os.path.exists(os.path.join(_archive_dir(), file)):
+            problems.append(f'{name}: file missing')
+            continue
+        try:
+            schema = _attach_archive(conn, year, file)
+            ok = conn.execute(f'PRAGMA {schema}.integrity_check').fetchall()
+            if [r[0] for r in ok] != ['ok']:
+                problems.append(f'{name}: integrity_check failed: {ok[0][0]}')
+                continue
+            if _log_digest(conn, schema, lo, hi) != (students, teachers, checksum):
+                problems.append(f'{name}: rows do not match the registry checksum')
+            meta = conn.execute(f'SELECT year, checksum FROM {schema}.archive_meta').fetchall()
+            if [tuple(r) for r in meta] != [(year, checksum)]:
+                problems.append(f'{name}: archive_meta does not match the registry')
+        except sqlite3.DatabaseError as e:
+            problems.append(f'{name}: {e}')
+        if conn.execute('SELECT 1 FROM attendance_log WHERE record_date >= ? AND record_date < ?'
+                        ' UNION ALL SELECT 1 FROM teacher_attendance_log'
+                        ' WHERE record_date >= ? AND record_date < ? LIMIT 1', (lo, hi, lo, hi)).fetchone():
+            problems.append(f'{name}: rows for this year are still in the hot log')
+    conn.close()
+    return problems
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  STUDENT ATTENDANCE
+# ══════════════════════════════════════════════════════════════════════════════
+
+def api_get_attendance_records(date: str):
+    conn = get_conn()
+    rows = conn.execute(
+        'SELECT student_id, status FROM attendance_records WHERE record_date=?', (date,)
+    ).fetchall()
+    conn.close()
+    return {str(r['student_id']): r['status'] for r in rows}
+
+
+def api_mark_attendance(data: dict):
+    conn = get_conn()
+    conn.execute(
+        'INSERT INTO attendance_records (student_id, record_date, status, sync_version) VALUES (?,?,?,?)'
+        ' ON CONFLICT(student_id, record_date) DO UPDATE SET status=excluded.status, sync_version=excluded.sync_version',
+        (data['studentId'], data['date'], data['status'], _next_version(conn))
+    )
+    conn.commit()
+    conn.close()
+    publish_marks('student', data['date'], {str(data['studentId']): data['status']})
+    return {'success': True}
+
+
+_BAD_PARAMS_ERROR = 'معاملات غير صالحة'
+
+
+def _batch_marks(data: dict):
+    """
+    A mark-batch body's marks as [(id, status)], or None when it is malformed
+    (no date, or marks not a list of {id, status}). Checked before the write
+    transaction is opened.
+    """
+    marks = data.get('marks', [])
+    if not data.get('date') or not isinstance(marks, list):
+        return None
+    if not all(isinstance(m, dict) and m.get('id') is not None and 'status' in m for m in marks):
+        return None
+    return [(m['id'], m['status']) for m in marks]
+
+
+def api_mark_attendance_batch(data: dict):
+    """Upsert many {id, status} working marks for one date in a single transaction."""
+    pairs = _batch_marks(data)
+    if pairs is None:
+        return {'error': _BAD_PARAMS_ERROR}, 400
+    date    = data['date']
+    conn    = get_conn()
+    version = _next_version(conn)
+    marks   = [(sid, date, status, version) for sid, status in pairs]
+    conn.executemany(
+        'INSERT INTO attendance_records (student_id, record_date, status, sync_version) VALUES (?,?,?,?)'
+        ' ON CONFLICT(student_id, record_date) DO UPDATE SET status=excluded.status, sync_version=excluded.sync_version',
+        marks
+    )
+    conn.commit()
+    conn.close()
+    publish_marks('student', date, {str(m[0]): m[2] for m in marks})
+    return {'success': True, 'marked': len(marks)}
+
+
+def api_save_attendance(data: dict):
+    """
+    Commit today's attendance:
+    - Update student stats (present_count, absent_count, total_classes, attendance %)
+    - Write to permanent attendance_log (upsert)
+    - Recount the day's summary in attendance_history from the log
+    - Reset working attendance_records for those students
+    """
+    date    = data.get('date')
+    records = data.get('records', {})   # {student_id_str: status}
+    staged  = []
+    present_c = absent_c = late_c = 0
+
+    for sid_str, status in records.items():
+        if status == 'none':
+            continue
+        if status == 'present':
+            present_c += 1
+        elif status == 'absent':
+            absent_c += 1
+        elif status == 'late':
+            late_c += 1
+        dp, da = _STUDENT_SAVE_DELTAS.get(status, (0, 0))
+        staged.append((int(sid_str), status, dp, da, int(dp or da)))
+
+    conn = get_conn()
+    conn.execute('BEGIN IMMEDIATE')     # checked under the write lock the save then holds: see _archive_year
+    if _saves_archived_year(conn, date):
+        conn.close()
+        return {'error': _ARCHIVED_YEAR_ERROR}, 409
+    version = _bulk_save(conn, 'student', date, staged)
+    # the day's summary is recounted from the log, so saves of other grades that day are kept
+    conn.execute(
+        'INSERT INTO attendance_history (record_date, present_count, absent_count, late_count, sync_version)'
+        f' SELECT ?, {_HISTORY_COUNTS}, ?'
+        ' FROM attendance_log l JOIN app_students s ON s.id = l.student_id WHERE l.record_date=?'
+        ' ON CONFLICT(record_date) DO UPDATE SET present_count=excluded.present_count,'
+        ' absent_count=excluded.absent_count, late_count=excluded.late_count, sync_version=excluded.sync_version',
+        (date, version, date)
+    )
+    conn.commit()
+    publish_save(conn, 'student', date, {str(r[0]): r[1] for r in staged}, version)
+    conn.close()
+    table_versions.bump('app_students')
+    table_versions.bump('attendance_history')
+    return {'success': True, 'updated': present_c + absent_c + late_c}
+
+
+def api_get_attendance_history():
+    conn = get_conn()
+    rows = conn.execute(
+        'SELECT record_date AS date, present_count AS present, absent_count AS absent, late_count AS late'
+        ' FROM attendance_history ORDER BY record_date DESC LIMIT 60'
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def _attendance_log_query(date_filter=None, grade_filter=None, after=None, count=False,
+                          date_from=None, date_to=None):
+    """
+    (sql, params, span) for the permanent student log in page order —
+    record_date DESC, grade, name, student id. `after` is the key of the
+    last row already sent (keyset pagination); `count` builds the COUNT(*) form.
+    date_from / date_to bound the range inclusively (exports). The sql names
+    the log's schema as {tier}; `span` is the date range it needs (see LOG ARCHIVE).
+    """
+    query = (
+        ('SELECT COUNT(*) AS count' if count else
+         'SELECT al.record_date AS date, al.status, s.id AS student_id, s.name, s.grade')
+        + ' FROM {tier}.attendance_log al'
+          ' JOIN app_students s ON s.id = al.student_id'
+          ' WHERE 1=1'
+    )
+    params = []
+    if date_filter:
+        query += ' AND al.record_date=?'; params.append(date_filter)
+    if date_from:
+        query += ' AND al.record_date>=?'; params.append(date_from)
+    if date_to:
+        query += ' AND al.record_date<=?'; params.append(date_to)
+    if grade_filter and grade_filter != 'all':
+        query += ' AND s.grade=?';        params.append(grade_filter)
+    if after:
+        query += ' AND (al.record_date < ? OR (al.record_date = ? AND (s.grade, s.name, s.id) > (?,?,?)))'
+        params += [after[0], *after]
+    if not count:
+        query += ' ORDER BY al.record_date DESC, s.grade, s.name, s.id'
+    return query, params, _log_span(date_filter, date_from, date_to, after)
+
+
+def api_get_attendance_log(date_filter=None, grade_filter=None, cursor=None, limit=LOG_PAGE_SIZE, columnar=False):
+    """
+    One page of the permanent attendance_log — always populated regardless of date.
+    Pass the returned next_cursor back to continue where this page stopped.
+    """
+    query, params, span = _attendance_log_query(date_filter, grade_filter, _decode_cursor(cursor, 4))
+    return _log_page(query, params, limit, ('date', 'grade', 'name', 'student_id'), columnar, span)
+
+
+def api_count_attendance_log(date_filter=None, grade_filter=None):
+    return _log_count(*_attendance_log_query(date_filter, grade_filter, count=True))
+
+
+def iter_attendance_log(date_filter=None, grade_filter=None, columnar=False):
+    """The whole filtered log, one row at a time straight off the cursor."""
+    query, params, span = _attendance_log_query(date_filter, grade_filter)
+    return _iter_rows(query, params, columnar=columnar, span=span)
+
+
+def api_get_student_history(student_id: int):
+    """Every logged Sunday of one student, newest first, archived years included."""
+    conn = get_conn()
+    # a deleted student's hot rows are gone; their archived ones stay behind, unreachable
+    known = conn.execute('SELECT 1 FROM app_students WHERE id=?', (student_id,)).fetchone()
+    rows = [dict(r) for tier in (_log_tiers(conn) if known else ['main']) for r in conn.execute(
+        f'SELECT record_date AS date, status FROM {tier}.attendance_log WHERE student_id=? ORDER BY record_date DESC',
+        (student_id,)
+    ).fetchall()]
+    conn.close()
+    return rows
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  TEACHER ATTENDANCE
+# ══════════════════════════════════════════════════════════════════════════════
+
+def api_get_teacher_attendance_records(date: str):
+    conn = get_conn()
+    rows = conn.execute(
+        'SELECT teacher_id, status FROM teacher_attendance_records WHERE record_date=?', (date,)
+    ).fetchall()
+    conn.close()
+    return {str(r['teacher_id']): r['status'] for r in rows}
+
+
+def api_mark_teacher_attendance(data: dict):
+    conn = get_conn()
+    conn.execute(
+        'INSERT INTO teacher_attendance_records (teacher_id, record_date, status, sync_version) VALUES (?,?,?,?)'
+        ' ON CONFLICT(teacher_id, record_date) DO UPDATE SET status=excluded.status, sync_version=excluded.sync_version',
+        (data['teacherId'], data['date'], data['status'], _next_version(conn))
+    )
+    conn.commit()
+    conn.close()
+    publish_marks('teacher', data['date'], {str(data['teacherId']): data['status']})
+    return {'success': True}
+
+
+def api_mark_teacher_attendance_batch(data: dict):
+    pairs = _batch_marks(data)
+    if pairs is None:
+        return {'error': _BAD_PARAMS_ERROR}, 400
+    date    = data['date']
+    conn    = get_conn()
+    version = _next_version(conn)
+    marks   = [(tid, date, status, version) for tid, status in pairs]
+    conn.executemany(
+        'INSERT INTO teacher_attendance_records (teacher_id, record_date, status, sync_version) VALUES (?,?,?,?)'
+        ' ON CONFLICT(teacher_id, record_date) DO UPDATE SET status=excluded.status, sync_version=excluded.sync_version',
+        marks
+    )
+    conn.commit()
+    conn.close()
+    publish_marks('teacher', date, {str(m[0]): m[2] for m in marks})
+    return {'success': True, 'marked': len(marks)}
+
+
+def api_save_teacher_attendance(data: dict):
+    date    = data.get('date')
+    records = data.get('records', {})
+    staged  = []
+    for tid_str, status in records.items():
+        if status == 'none':
+            continue
+        dp, da = (1, 0) if status in ('present', 'late') else (0, 1)
+        staged.append((int(tid_str), status, dp, da, 1))
+
+    conn = get_conn()
+    conn.execute('BEGIN IMMEDIATE')     # checked under the write lock the save then holds: see _archive_year
+    if _saves_archived_year(conn, date):
+        conn.close()
+        return {'error': _ARCHIVED_YEAR_ERROR}, 409
+    version = _bulk_save(conn, 'teacher', date, staged)
+    conn.commit()
+    publish_save(conn, 'teacher', date, {str(r[0]): r[1] for r in staged}, version)
+    conn.close()
+    table_versions.bump('app_teachers')
+    return {'success': True, 'updated': len(staged)}
+
+
+def _teacher_attendance_log_query(date_filter=None, after=None, count=False, date_from=None, date_to=None):
+    """(sql, params, span) for the teacher log in page order — record_date DESC, name, teacher id."""
+    query = (
+        ('SELECT COUNT(*) AS count' if count else
+         'SELECT tal.record_date AS date, tal.status,'
+         '       t.id AS teacher_id, t.name, t.subject, t.assigned_class')
+        + ' FROM {tier}.teacher_attendance_log tal'
+          ' JOIN app_teachers t ON t.id = tal.teacher_id'
+          ' WHERE 1=1'
+    )
+    params = []
+    if date_filter:
+        query += ' AND tal.record_date=?'; params.append(date_filter)
+    if date_from:
+        query += ' AND tal.record_date>=?'; params.append(date_from)
+    if date_to:
+        query += ' AND tal.record_date<=?'; params.append(date_to)
+    if after:
+        query += ' AND (tal.record_date < ? OR (tal.record_date = ? AND (t.name, t.id) > (?,?)))'
+        params += [after[0], *after]
+    if not count:
+        query += ' ORDER BY tal.record_date DESC, t.name, t.id'
+    return query, params, _log_span(date_filter, date_from, date_to, after)
+
+
+def api_get_teacher_attendance_log(date_filter=None, cursor=None, limit=LOG_PAGE_SIZE, columnar=False):
+    query, params, span = _teacher_attendance_log_query(date_filter, _decode_cursor(cursor, 3))
+    return _log_page(query, params, limit, ('date', 'name', 'teacher_id'), columnar, span)
+
+
+def api_count_teacher_attendance_log(date_filter=None):
+    return _log_count(*_teacher_attendance_log_query(date_filter, count=True))
+
+
+def iter_teacher_attendance_log(date_filter=None, columnar=False):
+    query, params, span = _teacher_attendance_log_query(date_filter)
+    return _iter_rows(query, params, columnar=columnar, span=span)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  DELTA SYNC
+# ══════════════════════════════════════════════════════════════════════════════
+#
+#  The client store remembers the version it last synced to and asks only for
+#  what changed after it. Every write claims a version with _next_version and
+#  stamps the rows it touches; deletions are recorded in sync_tombstones.
+
+SYNC_HISTORY_DAYS = 60
+
+
+def api_sync(since: int, date: str, grade_filter=None, include_teachers=False, columnar=False):
+    """
+    Students (and teachers, for admins), working records for `date`, history
+    rows and deletions newer than version `since`. A `since` of 0 — or one
+    ahead of the database, e.g. after a restore — gets a full snapshot with
+    full=True so the client replaces its data instead of merging. With
+    columnar=True the students, teachers and history lists are {columns, rows}.
+    """
+    conn = get_conn()
+    conn.execute('BEGIN')   # the rows and the version they are current to come from one snapshot
+    try:
+        version = conn.execute('SELECT version FROM sync_state WHERE id=1').fetchone()[0]
+        full    = since <= 0 or since > version
+        newer   = '' if full else ' AND sync_version > ?'
+        after   = () if full else (since,)
+        # deltas are merged by id on the client, so only snapshots need ordering
+        by_name = ' ORDER BY name' if full else ''
+
+        result = {'version': version, 'full': full,
+                  'removed': {'students': [], 'teachers': []}}
+
+        cur = _raw_cursor(conn)
+        if full and grade_filter:
+            cur.execute(f'SELECT {_STUDENT_COLS} FROM app_students WHERE grade=?{by_name}', (grade_filter,))
+        else:
+            cur.execute(f'SELECT {_STUDENT_COLS} FROM app_students WHERE 1=1{newer}'
+                        + (' ORDER BY grade, name' if full else ''), after)
+        cols, rows = _columns(cur), cur.fetchall()
+        if grade_filter:
+            # a student moved out of a servant's grade disappears from their store
+            sid, grade = cols.index('id'), cols.index('grade')
+            result['removed']['students'] = [r[sid] for r in rows if r[grade] != grade_filter]
+            rows = [r for r in rows if r[grade] == grade_filter]
+        result['students'] = _shape(cols, rows, columnar)
+
+        if grade_filter:
+            # scoped like the roster: a servant only ever sees their grade's marks
+            records = conn.execute(
+                'SELECT r.student_id, r.status FROM attendance_records r JOIN app_students s ON s.id = r.student_id'
+                ' WHERE r.record_date=? AND s.grade=?' + ('' if full else ' AND r.sync_version > ?'),
+                (date, grade_filter, *after))
+        else:
+            records = conn.execute(
+                f'SELECT student_id, status FROM attendance_records WHERE record_date=?{newer}', (date, *after))
+        result['records'] = {str(r[0]): r[1] for r in records}
+
+        cur = _raw_cursor(conn).execute(
+            'SELECT record_date AS date, present_count AS present, absent_count AS absent, late_count AS late'
+            f' FROM attendance_history WHERE 1=1{newer}'
+            + (' ORDER BY record_date DESC LIMIT ?' if full else ''),
+            (*after, SYNC_HISTORY_DAYS) if full else after)
+        result['history'] = _shape(_columns(cur), cur.fetchall(), columnar)
+
+        if include_teachers:
+            cur = _raw_cursor(conn).execute(f'SELECT * FROM app_teachers WHERE 1=1{newer}{by_name}', after)
+            result['teachers'] = _shape(_columns(cur), cur.fetchall(), columnar)
+            result['teacher_records'] = {str(r[0]): r[1] for r in conn.execute(
+                f'SELECT teacher_id, status FROM teacher_attendance_records WHERE record_date=?{newer}',
+                (date, *after))}
+
+        if not full:
+            for kind, rid in conn.execute('SELECT kind, id FROM sync_tombstones WHERE version > ?', (since,)):
+                if kind == 'student' or include_teachers:
+                    result['removed'][kind + 's'].append(rid)
+    finally:
+        conn.close()
+    return result
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  EXPORTS
+# ══════════════════════════════════════════════════════════════════════════════
+#
+# Each export_* returns (header, rows) where rows is a generator over a live
+# cursor (_iter_rows), so the handler can write CSV / XLSX as rows arrive and
+# memory stays flat however long the log is. Headers match the columns the
+# pages used to build in the browser, and are accepted back by api_import.
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+_STATUS_LABELS = {'present': 'حاضر', 'absent': 'غائب', 'late': 'متأخر'}
+
+
+def _status_label(status):
+    return _STATUS_LABELS.get(status, status or '')
+
+
+def export_attendance_log(date_from=None, date_to=None, grade_filter=None):
+    query, params, span = _attendance_log_query(grade_filter=grade_filter, date_from=date_from, date_to=date_to)
+    rows = _iter_rows(query, params, span=span)
+    return (('التاريخ', 'ID', 'الاسم', 'الفصل', 'الحالة'),
+            ((r['date'], r['student_id'], r['name'], r['grade'], _status_label(r['status'])) for r in rows))
+
+
+def export_teacher_attendance_log(date_from=None, date_to=None):
+    query, params, span = _teacher_attendance_log_query(date_from=date_from, date_to=date_to)
+    rows = _iter_rows(query, params, span=span)
+    return (('التاريخ', 'ID', 'الاسم', 'المادة', 'الفصل المخصص', 'الحالة'),
+            ((r['date'], r['teacher_id'], r['name'], r['subject'], r['assigned_class'],
+              _status_label(r['status'])) for r in rows))
+
+
+def export_students(grade_filter=None):
+    if grade_filter and grade_filter != 'all':
+        rows = _iter_rows(f'SELECT {_STUDENT_COLS} FROM app_students WHERE grade=? ORDER BY name', [grade_filter])
+    else:
+        rows = _iter_rows(f'SELECT {_STUDENT_COLS} FROM app_students ORDER BY grade, name', [])
+    return (('ID', 'الاسم', 'الفصل', 'الحالة', 'نسبة الحضور', 'حاضر', 'غائب', 'إجمالي الحصص', 'واتساب'),
+            ((r['id'], r['name'], r['grade'], _status_label(r['status']), r['attendance'],
+              r['present_count'], r['absent_count'], r['total_classes'], r['whatsapp']) for r in rows))
+
+
+def export_teachers():
+    rows = _iter_rows('SELECT * FROM app_teachers ORDER BY name', [])
+    return (('ID', 'الاسم', 'المادة', 'الفصل المخصص', 'الحالة', 'نسبة الحضور', 'حاضر', 'غائب',
+             'إجمالي الحصص', 'واتساب'),
+            ((r['id'], r['name'], r['subject'], r['assigned_class'], _status_label(r['status']),
+              r['attendance'], r['present_count'], r['absent_count'], r['total_classes'], r['whatsapp'])
+             for r in rows))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  REPORTS
+# ══════════════════════════════════════════════════════════════════════════════
+
+ATTENTION_THRESHOLD = 85
+
+
+def api_report_grades(grade_filter=None):
+    """Student count and average attendance % per grade."""
+    query  = 'SELECT grade, COUNT(*) AS students, CAST(ROUND(AVG(attendance)) AS INTEGER) AS average FROM app_students'
+    params = []
+    if grade_filter:
+        query += ' WHERE grade=?'; params.append(grade_filter)
+    query += ' GROUP BY grade'
+    conn = get_conn()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def api_report_summary(date_from=None, date_to=None, grade_filter=None):
+    """
+    Totals over the saved days in [date_from, date_to] (either end optional),
+    plus the best and worst day by present count.
+    """
+    query = (
+        'SELECT record_date AS date,'
+        '       SUM(present) AS present, SUM(absent) AS absent, SUM(late) AS late'
+        ' FROM grade_daily_stats WHERE 1=1'
+    )
+    params = []
+    if grade_filter:
+        query += ' AND grade=?'; params.append(grade_filter)
+    if date_from:
+        query += ' AND record_date>=?'; params.append(date_from)
+    if date_to:
+        query += ' AND record_date<=?'; params.append(date_to)
+    query += ' GROUP BY record_date'
+
+    conn = get_conn()
+    row  = conn.execute(
+        f'WITH days AS ({query})'
+        ' SELECT COUNT(*) AS days,'
+        '        COALESCE(SUM(present), 0) AS present,'
+        '        COALESCE(SUM(absent),  0) AS absent,'
+        '        COALESCE(SUM(late),    0) AS late,'
+        '        (SELECT json_object(\'date\', date, \'present\', present) FROM days'
+        '          ORDER BY present DESC, date DESC LIMIT 1) AS best,'
+        '        (SELECT json_object(\'date\', date, \'present\', present) FROM days'
+        '          ORDER BY present ASC,  date DESC LIMIT 1) AS worst'
+        ' FROM days',
+        params
+    ).fetchone()
+    conn.close()
+    result = dict(row)
+    result['best']  = json.loads(row['best'])  if row['best']  else None
+    result['worst'] = json.loads(row['worst']) if row['worst'] else None
+    return result
+
+
+def api_report_monthly(kind='student', month_from=None, month_to=None, key_filter=None):
+    """
+    Month-by-month totals per grade (students) or per department (teachers),
+    straight from the monthly rollup. Months are 'YYYY-MM'.
+    """
+    key_col, _, monthly = _ROLLUPS[kind]
+    query  = f'SELECT {key_col}, month, present, absent, late FROM {monthly} WHERE 1=1'
+    params = []
+    if key_filter:
+        query += f' AND {key_col}=?'; params.append(key_filter)
+    if month_from:
+        query += ' AND month>=?'; params.append(month_from)
+    if month_to:
+        query += ' AND month<=?'; params.append(month_to)
+    query += f' ORDER BY month DESC, {key_col}'
+    conn = get_conn()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def api_report_departments(date_from=None, date_to=None):
+    """Teacher present/absent/late totals per department over [date_from, date_to]."""
+    query  = ('SELECT department, SUM(present) AS present, SUM(absent) AS absent, SUM(late) AS late'
+              ' FROM department_daily_stats WHERE 1=1')
+    params = []
+    if date_from:
+        query += ' AND record_date>=?'; params.append(date_from)
+    if date_to:
+        query += ' AND record_date<=?'; params.append(date_to)
+    query += ' GROUP BY department ORDER BY department'
+    conn = get_conn()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def api_report_attention(threshold=ATTENTION_THRESHOLD, grade_filter=None):
+    """Students whose attendance % is below `threshold`, lowest first."""
+    query  = 'SELECT id, name, grade, avatar, attendance FROM app_students WHERE attendance < ?'
+    params = [threshold]
+    if grade_filter:
+        query += ' AND grade=?'; params.append(grade_filter)
+    query += ' ORDER BY attendance, name'
+    conn = get_conn()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  HELPERS
+# ══════════════════════════════════════════════════════════════════════════════
+
+class StudentGrades:
+    """
+    In-process student id → grade map behind the class-servant scope checks.
+    init_db loads it and the student add/edit/delete functions keep it current.
+    Every check first reads the app_students counter in etag_versions (one
+    primary-key read); when another process has added, moved or deleted a
+    student since, the map is dropped and refilled on demand. An id it doesn't
+    know is fetched once, in one query for a whole batch.
+    """
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._grades  = {}
+        self._version = None
+
+    def load(self, conn=None):
+        own  = conn is None
+        conn = conn or get_conn()
+        version = self._current(conn)       # before the rows: a write in between only costs a reload
+        grades  = dict(conn.execute('SELECT id, grade FROM app_students').fetchall())
+        if own:
+            conn.close()
+        with self._lock:
+            self._grades, self._version = grades, version
+
+    def set(self, student_id: int, grade: str):
+        with self._lock:
+            self._grades[student_id] = grade
+
+    def discard(self, student_id: int):
+        with self._lock:
+            self._grades.pop(student_id, None)
+
+    def in_grade(self, student_id, grade: str) -> bool:
+        """True when `student_id` is a student of `grade`."""
+        return self.all_in([student_id], grade)
+
+    def all_in(self, ids: list, grade: str) -> bool:
+        """True when every id belongs to a student of `grade` (False for junk ids)."""
+        try:
+            wanted = {int(i) for i in ids}
+        except (TypeError, ValueError):
+            return False
+        grades = self.grades_of(wanted)
+        return all(grades.get(i) == grade for i in wanted)
+
+    def grades_of(self, ids) -> dict:
+        """id → grade for each of the (int) `ids` that is a student."""
+        version = self._current(get_conn())
+        with self._lock:
+            if version != self._version:
+                self._grades, self._version = {}, version
+            grades = self._grades
+        missing = [i for i in ids if i not in grades]
+        if missing:
+            grades = {**grades, **self._fetch(missing, version)}
+        return {i: grades[i] for i in ids if i in grades}
+
+    @staticmethod
+    def _current(conn) -> int:
+        row = conn.execute("SELECT version FROM etag_versions WHERE name='app_students' AND scope=''").fetchone()
+        return row[0] if row else 0
+
+    def _fetch(self, ids: list, version: int) -> dict:
+        conn = get_conn()
+        rows = dict(conn.execute(
+            'SELECT id, grade FROM app_students WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(sorted(ids)),)
+        ).fetchall())
+        conn.close()
+        with self._lock:
+            # kept only if no other thread has seen a newer version: these rows may predate it
+            if self._version == version:
+                self._grades.update(rows)
+        return rows
+
+
+student_grades = StudentGrades()
+
+
+def _make_avatar(name: str) -> str:
+    parts = name.split()
+    return (parts[0][0] + parts[1][0]).upper() if len(parts) > 1 else name[:2].upper()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  STATIC ASSETS
+# ══════════════════════════════════════════════════════════════════════════════
 
 MIME = {
     '.html': 'text/html; charset=utf-8',
@@ -640,33 +2463,1169 @@ MIME = {
     '.png':  'image/png',
 }
 
+# app shell files are revalidated on every load (a cheap 304); images rarely change
+_REVALIDATE_EXTS = ('.html', '.css', '.js')
+_IMAGE_MAX_AGE   = 86400
+
+JS_BUNDLE_URL = '/js/app.bundle.js'
+_LOCAL_SCRIPT = re.compile(r'[ \t]*<script src="(js/[^"]+\.js)"></script>\n?')
+
+
+class Asset:
+    __slots__ = ('body', 'gzipped', 'etag', 'last_modified', 'mime', 'cache_control')
+
+    def __init__(self, body: bytes, mtime: float, mime: str, cache_control: str):
+        self.body          = body
+        self.etag          = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.last_modified = formatdate(int(mtime), usegmt=True)
+        self.mime          = mime
+        self.cache_control = cache_control
+        self.gzipped       = None
+        if not mime.startswith('image/'):
+            packed = gzip.compress(body, 9, mtime=0)
+            if len(packed) < len(body):
+                self.gzipped = packed
+
+
+class StaticAssets:
+    """
+    The frontend files under FRONTEND_DIR, held in memory with their ETags
+    and gzip variants. A watcher thread reloads them when anything on disk
+    changes. With bundle=True the local <script> tags in index.html collapse
+    into one request for JS_BUNDLE_URL.
+    """
+
+    WATCH_INTERVAL = 2.0
+
+    def __init__(self, root: str, bundle: bool = False):
+        self.root    = root
+        self.bundle  = bundle
+        self._assets = {}
+        self._mtimes = {}
+        self.reload()
+
+    def get(self, url_path: str) -> Asset | None:
+        return self._assets.get(url_path)
+
+    def _scan(self) -> dict:
+        files  = ['index.html', 'style.css', 'logo.jpeg', 'logo.jpg']
+        js_dir = os.path.join(self.root, 'js')
+        if os.path.isdir(js_dir):
+            files += ['js/' + n for n in os.listdir(js_dir) if n.endswith('.js')]
+        mtimes = {}
+        for rel in files:
+            try:
+                mtimes[rel] = os.path.getmtime(os.path.join(self.root, rel))
+            except OSError:
+                pass
+        return mtimes
+
+    def reload(self):
+        mtimes, assets = self._scan(), {}
+        for rel, mtime in mtimes.items():
+            with open(os.path.join(self.root, rel), 'rb') as f:
+                body = f.read()
+            assets['/' + rel] = self._make(rel, body, mtime)
+        if '/index.html' in assets:
+            if self.bundle:
+                self._add_bundle(assets, mtimes)
+            assets['/'] = assets['/index.html']
+        self._assets, self._mtimes = assets, mtimes   # swap in one step for reader threads
+
+    def _make(self, rel: str, body: bytes, mtime: float) -> Asset:
+        ext   = os.path.splitext(rel)[1]
+        cache = 'no-cache' if ext in _REVALIDATE_EXTS else f'public, max-age={_IMAGE_MAX_AGE}'
+        return Asset(body, mtime, MIME.get(ext, 'text/plain'), cache)
+
+    def _add_bundle(self, assets: dict, mtimes: dict):
+        html    = assets['/index.html'].body.decode()
+        scripts = [m.group(1) for m in _LOCAL_SCRIPT.finditer(html) if m.group(1) in mtimes]
+        if not scripts:
+            return
+        body = b';\n'.join(f'/* {rel} */\n'.encode() + assets['/' + rel].body for rel in scripts)
+        assets[JS_BUNDLE_URL] = self._make('bundle.js', body, max(mtimes[rel] for rel in scripts))
+
+        # the first local script tag becomes the bundle, the rest disappear
+        seen = []
+        def collapse(m):
+            seen.append(m)
+            return m.group(0).replace(m.group(1), JS_BUNDLE_URL.lstrip('/')) if len(seen) == 1 else ''
+
+        assets['/index.html'] = self._make(
+            'index.html', _LOCAL_SCRIPT.sub(collapse, html).encode(), mtimes['index.html'])
+
+    def watch(self):
+        def loop():
+            while True:
+                time.sleep(self.WATCH_INTERVAL)
+                if self._scan() != self._mtimes:
+                    try:
+                        self.reload()
+                    except OSError:
+                        pass   # a file mid-save; the next pass picks it up
+        threading.Thread(target=loop, name='static-watch', daemon=True).start()
+
+
+static_assets: StaticAssets | None = None   # created by the entry point
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        if coding.strip().lower() in ('gzip', '*'):
+            q = params.strip()
+            try:
+                return not (q.startswith('q=') and float(q[2:]) == 0)
+            except ValueError:
+                return False
+    return False
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ROUTING
+# ══════════════════════════════════════════════════════════════════════════════
+#
+# Routes are registered with @router.get('/api/students/{id:int}/history', ...)
+# next to their handler functions (see ROUTES below). Plain paths resolve with
+# one dict lookup; paths with parameters walk a small per-method trie, one
+# segment at a time. At each level a literal segment wins over a parameter
+# (there is no backtracking), and a parameter that fails its converter
+# ("/api/students/abc") simply doesn't match → 404.
+#
+# Auth is declared per route (auth=False for the public ones, admin=True for
+# admin-only) and checked once in dispatch. Hooks — router.hooks for every
+# route, hooks=(...) for one — wrap the handler call as hook(h, req, call_next),
+# so timing, caching and the like are attached in one place.
+
+_PARAM_TYPES = {'int': int, 'str': str}
+
+
+class Request:
+    """What a route handler gets besides the Handler: parsed URL, params, body and session."""
+
+    __slots__ = ('method', 'path', 'query', 'qs', 'params', 'data', 'route',
+                 'session', 'role', 'assigned_class', 'is_admin')
+
+    def __init__(self, method: str, path: str, query: str, params: dict, route: 'Route'):
+        self.method, self.path, self.query, self.params, self.route = method, path, query, params, route
+        self.qs             = parse_qs(query)
+        self.data           = None
+        self.session        = None
+        self.role           = None
+        self.assigned_class = None
+        self.is_admin       = False
+
+    def arg(self, name: str, default=''):
+        """First value of query parameter `name`."""
+        return self.qs.get(name, [default])[0]
+
+    @property
+    def scope(self):
+        """The grade this user is limited to — None for admins."""
+        return None if self.is_admin else self.assigned_class
+
+    @property
+    def columnar(self) -> bool:
+        """?format=columnar — lists as {columns, rows} instead of one object per row."""
+        return self.arg('format') == 'columnar'
+
+
+class Route:
+    __slots__ = ('method', 'pattern', 'func', 'auth', 'admin', 'body', 'hooks')
+
+    def __init__(self, method, pattern, func, auth, admin, body, hooks):
+        self.method, self.pattern, self.func = method, pattern, func
+        self.auth, self.admin, self.body, self.hooks = auth, admin, body, tuple(hooks)
+
+    def __repr__(self):
+        return f'<Route {self.method} {self.pattern}>'
+
+
+class Router:
+    """method + path → Route, with {name} / {name:int} path parameters."""
+
+    def __init__(self):
+        self.routes = []
+        self.hooks  = []        # hook(h, req, call_next) around every route
+        self._static = {}       # (method, path) → Route
+        self._trie   = {}       # method → node: {'lit': {segment: node}, 'param': [(name, conv, node)], 'route': Route}
+
+    def add(self, method: str, pattern: str, func, auth=True, admin=False, body=None, hooks=()):
+        """
+        Register `func(h, req)`. body: read the JSON request body first —
+        defaults to True for POST and PUT; pass False for raw uploads.
+        """
+        route = Route(method, pattern, func, auth or admin, admin,
+                      method in ('POST', 'PUT') if body is None else body, hooks)
+        self.routes.append(route)
+        if '{' not in pattern:
+            self._static[(method, pattern)] = route
+            return route
+        node = self._trie.setdefault(method, {'lit': {}, 'param': []})
+        for seg in pattern.strip('/').split('/'):
+            if seg.startswith('{'):
+                name, _, kind = seg[1:-1].partition(':')
+                conv = _PARAM_TYPES[kind or 'str']
+                for pname, pconv, child in node['param']:
+                    if (pname, pconv) == (name, conv):
+                        node = child
+                        break
+                else:
+                    child = {'lit': {}, 'param': []}
+                    node['param'].append((name, conv, child))
+                    node = child
+            else:
+                node = node['lit'].setdefault(seg, {'lit': {}, 'param': []})
+        node['route'] = route
+        return route
+
+    def route(self, method: str, pattern: str, **opts):
+        def register(func):
+            self.add(method, pattern, func, **opts)
+            return func
+        return register
+
+    def get(self, pattern, **opts):    return self.route('GET',    pattern, **opts)
+    def post(self, pattern, **opts):   return self.route('POST',   pattern, **opts)
+    def put(self, pattern, **opts):    return self.route('PUT',    pattern, **opts)
+    def delete(self, pattern, **opts): return self.route('DELETE', pattern, **opts)
+
+    def match(self, method: str, path: str):
+        """(route, params), or (None, None) when nothing matches."""
+        route = self._static.get((method, path))
+        if route:
+            return route, {}
+        node = self._trie.get(method)
+        if node is None:
+            return None, None
+        params = {}
+        for seg in path.strip('/').split('/'):
+            child = node['lit'].get(seg)
+            if child is None:
+                for name, conv, child in node['param']:
+                    try:
+                        params[name] = conv(seg)
+                        break
+                    except ValueError:
+                        pass
+                else:
+                    return None, None
+            node = child
+        route = node.get('route')
+        return (route, params) if route else (None, None)
+
+    def call(self, h, req: Request):
+        """
+        Run the route's handler inside the global hooks, then the route's own.
+        A handler that raises is answered by h.send_failure() right there, so
+        the hooks still see the status it got.
+        """
+        chain = (*self.hooks, *req.route.hooks) if self.hooks else req.route.hooks
+        if not chain:
+            return self._run(h, req)
+
+        def step(i):
+            if i == len(chain):
+                return self._run(h, req)
+            return chain[i](h, req, lambda: step(i + 1))
+        return step(0)
+
+    @staticmethod
+    def _run(h, req: Request):
+        try:
+            return req.route.func(h, req)
+        except Exception as exc:
+            h.send_failure(exc)
+
+
+router = Router()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  METRICS
+# ══════════════════════════════════════════════════════════════════════════════
+#
+#  Each worker thread records into its own shard, so recording takes no lock;
+#  the shards are only summed when /api/metrics is scraped or a snapshot is
+#  written. Routes are timed by a router hook, SQL by PooledConnection.
+
+class Histogram:
+    """Counts per upper bound (the last slot is +Inf), plus the sum of what was observed."""
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum    = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def merge(self, other: 'Histogram'):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+
+
+class _MetricShard:
+    __slots__ = ('requests', 'latency', 'sizes', 'sql', 'conns')
+
+    def __init__(self):
+        self.requests = {}      # (method, route, status) → count
+        self.latency  = {}      # (method, route) → Histogram of seconds
+        self.sizes    = {}      # (method, route) → Histogram of response bytes
+        self.sql      = {}      # statement → [executions, seconds, slowest]
+        self.conns    = 0       # connections opened
+
+
+_SQL_PARAM_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+class Metrics:
+    def __init__(self):
+        self.started  = time.time()
+        self._local   = threading.local()
+        self._lock    = threading.Lock()
+        self._shards  = []
+        self._sql_key = {}      # raw SQL → label (whitespace collapsed, "?, ?, ?" lists folded)
+
+    def _shard(self) -> _MetricShard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _MetricShard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    # ── recording (hot path) ───────────────────────────────────────────────
+    def observe_request(self, method: str, route: str, status, seconds: float, size: int):
+        shard = self._shard()
+        key   = (method, route)
+        shard.requests[(method, route, status)] = shard.requests.get((method, route, status), 0) + 1
+        hist  = shard.latency.get(key)
+        if hist is None:
+            hist = shard.latency[key] = Histogram(METRICS_LATENCY_BUCKETS)
+            shard.sizes[key] = Histogram(METRICS_BYTES_BUCKETS)
+        hist.observe(seconds)
+        shard.sizes[key].observe(size)
+
+    def statement(self, sql: str) -> str:
+        """The label a statement is tracked under."""
+        key = self._sql_key.get(sql)
+        if key is None:
+            key = _SQL_PARAM_LIST.sub('?, …', ' '.join(sql.split()))
+            if len(self._sql_key) < 4 * METRICS_MAX_STATEMENTS:
+                self._sql_key[sql] = key
+        return key
+
+    def observe_sql(self, sql: str, seconds: float, calls: int = 1):
+        """calls=0 adds time spent fetching a statement's rows without counting another execution."""
+        key   = self.statement(sql)
+        stats = self._shard().sql
+        entry = stats.get(key)
+        if entry is None:
+            if len(stats) >= METRICS_MAX_STATEMENTS:
+                key = 'other'
+            entry = stats.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+
+    def conn_opened(self):
+        self._shard().conns += 1
+
+    # ── reading ────────────────────────────────────────────────────────────
+    def snapshot(self) -> dict:
+        """All shards summed. Counters are cumulative since the server started."""
+        requests, latency, sizes, sql, conns = {}, {}, {}, {}, 0
+        with self._lock:
+            shards = self._shards[:]
+        for shard in shards:
+            for key, n in list(shard.requests.items()):
+                requests[key] = requests.get(key, 0) + n
+            for into, part in ((latency, shard.latency), (sizes, shard.sizes)):
+                for key, hist in list(part.items()):
+                    if key not in into:
+                        into[key] = Histogram(hist.bounds)
+                    into[key].merge(hist)
+            for key, (n, secs, worst) in list(shard.sql.items()):
+                total = sql.setdefault(key, [0, 0.0, 0.0])
+                total[0] += n
+                total[1] += secs
+                total[2]  = max(total[2], worst)
+            conns += shard.conns
+        with _pool_lock:
+            pooled = len(_pool_conns)
+        return {'time': time.time(), 'started': self.started, 'requests': requests, 'latency': latency,
+                'sizes': sizes, 'sql': sql, 'conns_opened': conns, 'conns_open': pooled}
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        snap  = self.snapshot()
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, hists):
+            for (method, route), hist in sorted(hists.items()):
+                labels, running = f'method="{method}",route="{_prom_label(route)}"', 0
+                for bound, n in zip((*hist.bounds, '+Inf'), hist.counts):
+                    running += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {running}')
+                lines.append(f'{name}_sum{{{labels}}} {hist.sum:.6g}')
+                lines.append(f'{name}_count{{{labels}}} {running}')
+
+        family('church_http_requests_total', 'counter', 'Requests answered, by route and status.')
+        for (method, route, status), n in sorted(snap['requests'].items(), key=str):
+            lines.append(f'church_http_requests_total{{method="{method}",route="{_prom_label(route)}",'
+                         f'status="{status}"}} {n}')
+        family('church_http_request_duration_seconds', 'histogram', 'Time in the route handler, up to its last byte written.')
+        histogram('church_http_request_duration_seconds', snap['latency'])
+        family('church_http_response_bytes', 'histogram', 'Bytes written per response, headers included.')
+        histogram('church_http_response_bytes', snap['sizes'])
+
+        statements = sorted(snap['sql'].items(), key=lambda kv: -kv[1][1])   # most total time first
+        for i, (name, kind, help_text) in enumerate((
+            ('church_sql_executions_total', 'counter', 'Executions per SQL statement.'),
+            ('church_sql_seconds_total',    'counter', 'Time per SQL statement, executing and fetching rows.'),
+            ('church_sql_max_seconds',      'gauge',   'Slowest single execution or fetch per SQL statement.'),
+        )):
+            family(name, kind, help_text)
+            for stmt, values in statements:
+                lines.append(f'{name}{{statement="{_prom_label(stmt)}"}} {values[i]:.6g}')
+
+        family('church_db_connections_opened_total', 'counter', 'SQLite connections opened by the pool.')
+        lines.append(f'church_db_connections_opened_total {snap["conns_opened"]}')
+        family('church_db_connections_open', 'gauge', 'SQLite connections currently pooled.')
+        lines.append(f'church_db_connections_open {snap["conns_open"]}')
+        family('process_start_time_seconds', 'gauge', 'Server start, seconds since the epoch.')
+        lines.append(f'process_start_time_seconds {snap["started"]:.3f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _prom_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+def _time_route(h, req, call_next):
+    """router hook: latency, status and response size of every routed request."""
+    t0, sent = time.perf_counter(), h.wfile.written
+    try:
+        return call_next()
+    finally:
+        metrics.observe_request(req.method, req.route.pattern, h.status,
+                                time.perf_counter() - t0, h.wfile.written - sent)
+
+
+router.hooks.append(_time_route)
+
+
+# ── slow queries ─────────────────────────────────────────────────────────────
+
+# functions a statement is attributed to, searched for up the stack
+_SQL_ENTRY_POINTS = ('api_', 'iter_', 'export_', 'rebuild_')
+_SQL_PLUMBING     = {'execute', 'executemany', 'fetchone', 'fetchmany', 'fetchall', '_timed_fetch', '_observe', 'record'}
+
+
+def _param_shape(params) -> str:
+    """Types (and string lengths) of bound parameters — never their values."""
+    def shape(v):
+        if v is None:                    return 'NULL'
+        if isinstance(v, (bool, int)):   return 'int'
+        if isinstance(v, float):         return 'real'
+        if isinstance(v, str):           return f'text({len(v)})'
+        if isinstance(v, (bytes, memoryview)): return f'blob({len(v)})'
+        return type(v).__name__
+    if params is None:
+        return 'many'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f':{k} {shape(v)}' for k, v in params.items()) + '}'
+    runs = []                       # (shape, repeat) — long IN (?, ?, …) lists stay short
+    for v in params:
+        sh = shape(v)
+        if runs and runs[-1][0] == sh:
+            runs[-1][1] += 1
+        else:
+            runs.append([sh, 1])
+    return '(' + ', '.join(sh if n == 1 else f'{sh}×{n}' for sh, n in runs) + ')'
+
+
+def _sql_caller() -> str:
+    """
+    The api_* (or iter_/export_) function that ran the statement. Rows
+    read later from a generator have lost that frame; they get the nearest
+    caller and the route being served instead.
+    """
+    frame, nearest = sys._getframe(1), None
+    while frame:
+        name = frame.f_code.co_name
+        if name.startswith(_SQL_ENTRY_POINTS):
+            return name
+        if nearest is None and name not in _SQL_PLUMBING:
+            nearest = name
+        req = frame.f_locals.get('req')
+        if isinstance(req, Request):
+            return f'{nearest} ({req.method} {req.route.pattern})'
+        frame = frame.f_back
+    return nearest or ''
+
+
+def _query_plan(conn, sql: str, params) -> str:
+    """EXPLAIN QUERY PLAN as the sqlite3 shell draws it; '' when it can't be explained."""
+    if params is None:
+        params = (None,) * sql.count('?')
+    try:
+        rows = conn.cursor(sqlite3.Cursor).execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    except (sqlite3.Error, ValueError):
+        return ''
+    depth, lines = {0: -1}, []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return '\n'.join(lines)
+
+
+class SlowQueryLog:
+    """
+    Statements that ran over `threshold_ms`, with their parameter shapes,
+    calling api_* function and query plan, kept in the slow_queries table.
+    The plan is taken on the spot, on the statement's own connection (it
+    may reference temp tables); the row is written by a background thread
+    on a connection of its own, so it never joins a request's transaction.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS):
+        self.threshold = threshold_ms / 1000 if threshold_ms > 0 else float('inf')
+        self._queue    = queue.Queue(SLOW_QUERY_QUEUE)
+        self._thread   = None
+        self._lock     = threading.Lock()
+
+    def record(self, cur: TimedCursor):
+        entry = (time.strftime('%Y-%m-%d %H:%M:%S'), round(cur.spent * 1000, 1), metrics.statement(cur.sql),
+                 _param_shape(cur.params), _sql_caller(), _query_plan(cur.connection, cur.sql, cur.params))
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='slow-queries', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            entries = [self._queue.get()]
+            while not self._queue.empty():
+                entries.append(self._queue.get_nowait())
+            try:
+                self._write(entries)
+            except sqlite3.Error as e:
+                print(f'  slow query log: {e}')
+
+    def _write(self, entries):
+        conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
+        try:
+            conn.executemany('INSERT INTO slow_queries (logged_at, ms, statement, params, caller, plan)'
+                             ' VALUES (?,?,?,?,?,?)', entries)
+            conn.execute('DELETE FROM slow_queries WHERE id <= (SELECT MAX(id) FROM slow_queries) - ?',
+                         (SLOW_QUERY_KEEP,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+slow_queries = SlowQueryLog()
+
+
+def api_get_slow_queries(limit: int = 100):
+    """Slow statements grouped by text and caller, most recently seen first, with the latest plan."""
+    conn = get_conn()
+    rows = conn.execute('''
+        SELECT g.statement, g.caller, g.count, g.avg_ms, g.max_ms,
+               s.logged_at AS last_at, s.params, s.plan
+        FROM (
+            SELECT statement, caller, COUNT(*) AS count, ROUND(AVG(ms), 1) AS avg_ms,
+                   MAX(ms) AS max_ms, MAX(id) AS last_id
+            FROM slow_queries GROUP BY statement, caller
+        ) g
+        JOIN slow_queries s ON s.id = g.last_id
+        ORDER BY g.last_id DESC LIMIT ?
+    ''', (limit,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def api_clear_slow_queries():
+    conn = get_conn()
+    conn.execute('DELETE FROM slow_queries')
+    conn.commit()
+    conn.close()
+    return {'success': True}
+
+
+class MetricsDump:
+    """
+    Appends a JSON snapshot of `metrics` to a size-rotated file every
+    `interval` seconds (and once more at shutdown), so history survives
+    on a machine nothing scrapes.
+    """
+
+    def __init__(self, path: str, interval: float = METRICS_DUMP_INTERVAL):
+        self.interval = interval
+        self._out  = logging.handlers.RotatingFileHandler(
+            path, maxBytes=METRICS_DUMP_BYTES, backupCount=METRICS_DUMP_BACKUPS, encoding='utf-8')
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name='metrics-dump', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self.write()
+        self._out.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        snap = metrics.snapshot()
+        line = json.dumps({
+            'time':         round(snap['time'], 3),
+            'requests':     {' '.join(map(str, k)): n for k, n in snap['requests'].items()},
+            'latency':      {' '.join(k): {'counts': h.counts, 'sum': round(h.sum, 6)}
+                             for k, h in snap['latency'].items()},
+            'bytes':        {' '.join(k): {'counts': h.counts, 'sum': h.sum} for k, h in snap['sizes'].items()},
+            'sql':          {k: [n, round(secs, 6), round(worst, 6)] for k, (n, secs, worst) in snap['sql'].items()},
+            'conns_opened': snap['conns_opened'],
+        }, ensure_ascii=False)
+        self._out.emit(logging.makeLogRecord({'msg': line}))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  LIVE EVENTS
+# ══════════════════════════════════════════════════════════════════════════════
+#
+# /api/events is a Server-Sent Events stream of changes as they commit:
+#
+#   mark     {kind, date, marks: {id: status}}          working marks
+#   save     {kind, date, marks: {id: status}, people}  a saved day and the
+#                                                       people rows it changed
+#   history  {date, present, absent, late}              a day's new summary
+#   roster   {kind, op: upsert, people} | {kind, op: delete, id} | {kind, op: import}
+#   reset    {}                                          events were missed —
+#                                                       sync before carrying on
+#
+# `kind` is student or teacher and `people` a columnar {columns, rows} list.
+# Student events reach admins and the servants of that grade; teacher events
+# reach admins only; history goes to everyone.
+
+class _EventClient:
+    __slots__ = ('sock', 'admin', 'grade', 'token', 'user_id', 'pending', 'sent_at', 'checked_at')
+
+    def __init__(self, sock, admin: bool, grade, token, user_id, pending: bytes):
+        self.sock, self.admin, self.grade = sock, admin, grade
+        self.token, self.user_id = token, user_id
+        self.pending = bytearray(pending)
+        self.sent_at = self.checked_at = time.monotonic()
+
+    def wants(self, grade, admin_only: bool) -> bool:
+        return self.admin or (not admin_only and (grade is None or grade == self.grade))
+
+
+class EventHub:
+    """
+    Fan-out behind /api/events. A stream's handler writes the response head,
+    hands its socket over here and returns, so an open stream holds no worker
+    thread; the servers leave sockets the hub holds() open. One thread writes
+    every client's queued frames with non-blocking sends, adds a heartbeat
+    comment to streams idle for EVENTS_HEARTBEAT, and drops clients that hang
+    up or fall EVENTS_MAX_PENDING behind. Each stream's session is checked
+    again every EVENTS_HEARTBEAT, and close() ends a user's streams at once on
+    logout, deletion or a role/class change, so a stream never outlives the
+    access it was opened with. The last EVENTS_BACKLOG events are
+    kept for Last-Event-ID resume; event ids carry a boot id, so an id from an
+    earlier run — or one older than the backlog — gets a `reset` instead.
+    """
+
+    def __init__(self, backlog: int = EVENTS_BACKLOG, heartbeat: float = EVENTS_HEARTBEAT):
+        self.boot      = secrets.token_hex(4)
+        self.heartbeat = heartbeat
+        self._lock     = threading.Lock()
+        self._wake     = threading.Event()
+        self._seq      = 0
+        self._backlog  = deque(maxlen=backlog)    # (seq, grade, admin_only, frame)
+        self._clients  = {}                       # socket → _EventClient
+        self._thread   = None
+
+    def publish(self, event: str, data: dict, grade=None, admin_only=False):
+        """Queue an event for every matching stream (and the backlog). Call after committing."""
+        with self._lock:
+            self._seq += 1
+            frame = (f'id: {self.boot}-{self._seq}\nevent: {event}\n'
+                     f'data: {json.dumps(data, ensure_ascii=False)}\n\n').encode()
+            self._backlog.append((self._seq, grade, admin_only, frame))
+            for client in self._clients.values():
+                if client.wants(grade, admin_only):
+                    client.pending += frame
+        self._wake.set()
+
+    def full(self) -> bool:
+        return len(self._clients) >= EVENTS_MAX_CLIENTS
+
+    def holds(self, sock) -> bool:
+        return sock in self._clients
+
+    def subscribe(self, sock, admin: bool, grade, last_id=None, token=None, user_id=None):
+        """
+        Take over `sock` (response head already sent), replaying what it missed
+        after last_id. `token` is the session the stream stays authorized by.
+        """
+        client = _EventClient(sock, admin, grade, token, user_id, b'retry: %d\n\n' % EVENTS_RETRY_MS)
+        with self._lock:
+            client.pending += self._replay(client, last_id)
+            sock.setblocking(False)
+            self._clients[sock] = client
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='events', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def close(self, token=None, user_id=None):
+        """End the streams opened with session `token`, or every stream of `user_id`."""
+        with self._lock:
+            for sock, client in list(self._clients.items()):
+                if (token and client.token == token) or (user_id is not None and client.user_id == user_id):
+                    self._drop(sock)
+
+    def _replay(self, client: _EventClient, last_id) -> bytes:
+        if not last_id:
+            return b''
+        boot, _, seq = last_id.partition('-')
+        oldest = self._backlog[0][0] if self._backlog else self._seq + 1
+        if boot != self.boot or not seq.isdigit() or not oldest - 1 <= int(seq) <= self._seq:
+            return f'id: {self.boot}-{self._seq}\nevent: reset\ndata: {{}}\n\n'.encode()
+        return b''.join(frame for n, grade, admin_only, frame in self._backlog
+                        if n > int(seq) and client.wants(grade, admin_only))
+
+    def _run(self):
+        while True:
+            self._wake.wait(1)
+            self._wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                due = [c for c in self._clients.values() if now - c.checked_at >= self.heartbeat]
+            # outside the lock: a persisted session may be re-read from the database
+            revoked = set()
+            for client in due:
+                client.checked_at = now
+                if not self._authorized(client):
+                    revoked.add(client.sock)
+            with self._lock:
+                for sock, client in list(self._clients.items()):
+                    if sock in revoked:
+                        self._drop(sock); continue
+                    if not client.pending and now - client.sent_at >= self.heartbeat:
+                        if self._hung_up(sock):
+                            self._drop(sock); continue
+                        client.pending += b': ping\n\n'
+                    if client.pending and not self._flush(client, now):
+                        self._drop(sock)
+
+    @staticmethod
+    def _authorized(client: _EventClient) -> bool:
+        """True while the stream's session is live with the scope it subscribed with."""
+        if client.token is None:
+            return True
+        try:
+            session = sessions.peek(client.token)
+        except sqlite3.Error:
+            return True         # checked again at the next heartbeat
+        return bool(session) and session['user_id'] == client.user_id \
+            and (session['role'] == 'admin') == client.admin and session['assigned_class'] == client.grade
+
+    @staticmethod
+    def _hung_up(sock) -> bool:
+        try:
+            return sock.recv(4096) == b''
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    @staticmethod
+    def _flush(client: _EventClient, now: float) -> bool:
+        """Send what the socket takes right now; False when the client is gone or too far behind."""
+        try:
+            sent = client.sock.send(client.pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            return False
+        if sent:
+            del client.pending[:sent]
+            client.sent_at = now
+        return len(client.pending) <= EVENTS_MAX_PENDING
+
+    def _drop(self, sock):
+        self._clients.pop(sock, None)
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+
+events = EventHub()
+
+
+def _people_table(rows) -> dict:
+    """sqlite3.Row list → the columnar {columns, rows} form the store decodes."""
+    return {'columns': list(rows[0].keys()) if rows else [], 'rows': [list(r) for r in rows]}
+
+
+def publish_marks(kind: str, date: str, marks: dict):
+    """A `mark` event for {id: status} working marks — one per grade for students."""
+    if kind == 'teacher':
+        events.publish('mark', {'kind': kind, 'date': date, 'marks': marks}, admin_only=True)
+        return
+    try:
+        grades = student_grades.grades_of({int(i) for i in marks})
+    except (TypeError, ValueError):
+        return
+    by_grade = {}
+    for sid, status in marks.items():
+        if int(sid) in grades:
+            by_grade.setdefault(grades[int(sid)], {})[str(sid)] = status
+    for grade, part in by_grade.items():
+        events.publish('mark', {'kind': kind, 'date': date, 'marks': part}, grade=grade)
+
+
+def publish_save(conn, kind: str, date: str, marks: dict, version: int):
+    """`save` events for a committed day — with the people rows stamped `version` — and its `history` row."""
+    if kind == 'teacher':
+        rows = conn.execute('SELECT * FROM app_teachers WHERE sync_version=?', (version,)).fetchall()
+        events.publish('save', {'kind': kind, 'date': date, 'marks': marks, 'people': _people_table(rows)},
+                       admin_only=True)
+        return
+    rows = conn.execute(f'SELECT {_STUDENT_COLS} FROM app_students WHERE sync_version=?', (version,)).fetchall()
+    by_grade = {}
+    for row in rows:
+        by_grade.setdefault(row['grade'], []).append(row)
+    for grade, part in by_grade.items():
+        ids = {str(r['id']) for r in part}
+        events.publish('save', {'kind': kind, 'date': date, 'people': _people_table(part),
+                                'marks': {sid: s for sid, s in marks.items() if sid in ids}}, grade=grade)
+    day = conn.execute(
+        'SELECT record_date AS date, present_count AS present, absent_count AS absent, late_count AS late'
+        ' FROM attendance_history WHERE record_date=?', (date,)).fetchone()
+    if day:
+        events.publish('history', dict(day))
+
+
+def publish_roster(kind: str, row=None, removed_id=None, grade=None, imported=False):
+    """A `roster` event: a person added or edited (`row`), removed, or a whole import."""
+    scope = {'admin_only': True} if kind == 'teacher' else {'grade': None if imported else grade}
+    if imported:
+        events.publish('roster', {'kind': kind, 'op': 'import'}, **scope)
+    elif row is not None:
+        events.publish('roster', {'kind': kind, 'op': 'upsert', 'people': _people_table([row])}, **scope)
+    else:
+        events.publish('roster', {'kind': kind, 'op': 'delete', 'id': removed_id}, **scope)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  HTTP HANDLER
+# ══════════════════════════════════════════════════════════════════════════════
+
+
+STREAM_CHUNK   = 16 * 1024
+GZIP_MIN_BYTES = 1024      # JSON bodies smaller than this go out uncompressed
+GZIP_LEVEL     = 5         # API response compression, 1 (fast) … 9 (small); 0 turns it off
+
+_REDACT_TOKEN = re.compile(r'token=[^&]*')
+
+# what a JSON body of the wrong shape makes a handler raise
+_MALFORMED_BODY_ERRORS = (KeyError, ValueError, TypeError, AttributeError)
+_SERVER_ERROR          = 'حدث خطأ في الخادم'
+
+
+class _StreamWriter:
+    """
+    Buffers a streamed body into ~STREAM_CHUNK writes, framing them when
+    chunked. With gzip_level set, each buffer goes through one running gzip
+    stream first, so compression never needs the whole body in memory.
+    """
+
+    def __init__(self, wfile, chunked: bool, gzip_level: int = 0):
+        self._wfile   = wfile
+        self._chunked = chunked
+        self._buf     = []
+        self._size    = 0
+        self._zip     = zlib.compressobj(gzip_level, zlib.DEFLATED, 31) if gzip_level else None
+
+    def write(self, data: bytes):
+        self._buf.append(data)
+        self._size += len(data)
+        if self._size >= STREAM_CHUNK:
+            self.flush()
+        return len(data)     # file-like, so zipfile can track its offset
+
+    def flush(self):
+        if not self._size:
+            return
+        data = b''.join(self._buf)
+        self._buf, self._size = [], 0
+        if self._zip:
+            data = self._zip.compress(data)
+        self._send(data)
+
+    def close(self):
+        self.flush()
+        if self._zip:
+            self._send(self._zip.flush())
+        if self._chunked:
+            self._wfile.write(b'0\r\n\r\n')
+
+    def _send(self, data: bytes):
+        if not data:
+            return      # a zero-length chunk would end the body early
+        if self._chunked:
+            self._wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        else:
+            self._wfile.write(data)
+
+
+def _gzip_etag(etag: str) -> str:
+    """The strong ETag of a representation's gzip-encoded form."""
+    return etag[:-1] + '-gzip"'
+
+
+class _CountingWriter:
+    """wfile wrapper that keeps a running total of bytes written, for metrics."""
+
+    def __init__(self, wfile):
+        self._wfile  = wfile
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self._wfile.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._wfile, name)
+
 
 class Handler(BaseHTTPRequestHandler):
 
+    # a stalled client (e.g. a phone that dropped off Wi-Fi) frees its worker after this
+    timeout = 30
+    status  = None      # last status sent, for metrics
+
+    def setup(self):
+        super().setup()
+        self.wfile = _CountingWriter(self.wfile)
+
+    def send_response(self, code, message=None):
+        self.status = code
+        super().send_response(code, message)
+
     # ── logging ────────────────────────────────────────────────────────────
     def log_message(self, fmt, *args):
         if args and str(args[1]) not in ('200', '304'):
-            print(f'  {self.path}  →  {args[1]}')
+            print(f'  {_REDACT_TOKEN.sub("token=…", self.path)}  →  {args[1]}')
 
     # ── response helpers ───────────────────────────────────────────────────
-    def send_json(self, data, status=200):
-        body = json.dumps(data, ensure_ascii=False).encode()
+    def send_json(self, data, status=200, headers=None):
+        self.send_body(json.dumps(data, ensure_ascii=False).encode(), 'application/json; charset=utf-8',
+                       status, headers)
+
+    def send_body(self, body: bytes, content_type: str, status=200, headers=None):
+        """A complete response body, gzipped when it is big enough and the client takes it."""
+        level = self._gzip_level() if len(body) >= GZIP_MIN_BYTES else 0
+        if level:
+            body = gzip.compress(body, level, mtime=0)
+            if headers and 'ETag' in headers:
+                headers = {**headers, 'ETag': _gzip_etag(headers['ETag'])}
         self.send_response(status)
-        self.send_header('Content-Type',   'application/json; charset=utf-8')
+        self.send_header('Content-Type',   content_type)
         self.send_header('Content-Length', str(len(body)))
-        self.send_header('Access-Control-Allow-Origin',  '*')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        if GZIP_LEVEL:
+            self.send_header('Vary', 'Accept-Encoding')
+        if level:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_cors()
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(body)
 
-    def send_file(self, path: str, mime: str):
-        with open(path, 'rb') as f:
-            data = f.read()
+    def send_cors(self):
+        self.send_header('Access-Control-Allow-Origin',   '*')
+        self.send_header('Access-Control-Allow-Headers',  'Content-Type, Authorization, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'ETag')
+
+    def send_versioned(self, etag: str, produce):
+        """
+        Answer a cacheable GET tagged `etag` (from table_versions): 304 when the
+        client already holds it, otherwise call produce() for the body. Building
+        the tag was the one database read a 304 pays for (a primary-key lookup
+        in etag_versions). The tag is taken before reading, so a write racing
+        the read only costs a miss.
+        """
+        held = self._etag_matches(etag)
+        if held:
+            self.send_response(304)
+            self.send_header('ETag',          held)
+            self.send_header('Cache-Control', 'private, no-cache')
+            self.send_cors()
+            self.end_headers()
+            return
+        self.send_json(produce(), headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+    def send_asset(self, asset: Asset):
+        use_gzip = asset.gzipped and _accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        etag     = _gzip_etag(asset.etag) if use_gzip else asset.etag
+        if self._not_modified(asset):
+            self.send_response(304)
+            self.send_header('ETag',          etag)
+            self.send_header('Cache-Control', asset.cache_control)
+            self.end_headers()
+            return
+        body = asset.gzipped if use_gzip else asset.body
         self.send_response(200)
-        self.send_header('Content-Type',   mime)
-        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Content-Type',   asset.mime)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag',           etag)
+        self.send_header('Last-Modified',  asset.last_modified)
+        self.send_header('Cache-Control',  asset.cache_control)
+        if asset.gzipped:
+            self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _etag_matches(self, etag: str):
+        """
+        If-None-Match checked against `etag` in either encoding: the tag the
+        client holds when it matches (what a 304 sends back), '' when none
+        does, None when the request has no such header.
+        """
+        inm = self.headers.get('If-None-Match')
+        if inm is None:
+            return None
+        if inm.strip() == '*':
+            return etag
+        for held in (t.strip().removeprefix('W/') for t in inm.split(',')):
+            if held in (etag, _gzip_etag(etag)):
+                return held
+        return ''
+
+    def _not_modified(self, asset: Asset) -> bool:
+        match = self._etag_matches(asset.etag)
+        if match is not None:
+            return bool(match)
+        ims = self.headers.get('If-Modified-Since')
+        if ims:
+            try:
+                return parsedate_to_datetime(ims) >= parsedate_to_datetime(asset.last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def start_stream(self, content_type: str, status=200, headers=None, compress=True) -> '_StreamWriter':
+        """
+        Begin a response whose length isn't known up front. HTTP/1.1 clients
+        get chunked transfer; HTTP/1.0 clients read until the connection closes.
+        compress=False for bodies that are already compressed (XLSX).
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        level   = self._gzip_level() if compress else 0
+        if chunked:
+            self.protocol_version = 'HTTP/1.1'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_cors()
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if compress and GZIP_LEVEL:
+            self.send_header('Vary', 'Accept-Encoding')
+        if level:
+            self.send_header('Content-Encoding', 'gzip')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
         self.end_headers()
-        self.wfile.write(data)
+        return _StreamWriter(self.wfile, chunked, level)
+
+    def _gzip_level(self) -> int:
+        """GZIP_LEVEL when the client takes gzip, else 0."""
+        if GZIP_LEVEL and _accepts_gzip(self.headers.get('Accept-Encoding', '')):
+            return GZIP_LEVEL
+        return 0
+
+    def send_json_stream(self, rows):
+        """Serialise an iterator of dicts as a JSON array without holding it in memory."""
+        out = self.start_stream('application/json; charset=utf-8')
+        out.write(b'[')
+        sep = b''
+        for row in rows:
+            out.write(sep + json.dumps(row, ensure_ascii=False).encode())
+            sep = b','
+        out.write(b']')
+        out.close()
+
+    def send_export(self, fmt: str, filename: str, header, rows):
+        """
+        Stream `rows` as a CSV or XLSX download. The first bytes go out before
+        the first row is fetched, so the browser's download starts immediately.
+        """
+        xlsx = fmt == 'xlsx'
+        out  = self.start_stream(XLSX_MIME if xlsx else 'text/csv; charset=utf-8', headers={
+            'Content-Disposition': f'attachment; filename="{filename}.{fmt}"',
+            'Cache-Control':       'no-store',
+        }, compress=not xlsx)
+        if xlsx:
+            write_xlsx(out, header, rows, filename)
+        else:
+            write_csv(out, header, rows)
+        out.close()
+
+    def send_columnar_stream(self, rows):
+        """Like send_json_stream for _iter_rows(columnar=True): column names first, then tuples."""
+        out = self.start_stream('application/json; charset=utf-8')
+        out.write(b'{"columns":' + json.dumps(next(rows), ensure_ascii=False).encode() + b',"rows":[')
+        sep = b''
+        for row in rows:
+            out.write(sep + json.dumps(row, ensure_ascii=False).encode())
+            sep = b','
+        out.write(b']}')
+        out.close()
+
+    def send_log(self, qs: dict, count, page, stream, *filters):
+        """Route a log request to its count-only, keyset-page or streamed form."""
+        columnar = qs.get('format', [''])[0] == 'columnar'
+        try:
+            if qs.get('count', [''])[0]:
+                self.send_json(count(*filters))
+            elif 'limit' in qs or 'cursor' in qs:
+                self.send_json(page(*filters, qs.get('cursor', [''])[0] or None,
+                                    qs.get('limit', [LOG_PAGE_SIZE])[0], columnar))
+            elif columnar:
+                self.send_columnar_stream(stream(*filters, columnar=True))
+            else:
+                self.send_json_stream(stream(*filters))
+        except ValueError:
+            self.send_json({'error': 'معاملات غير صالحة'}, 400)
 
     def send_401(self): self.send_json({'error': 'غير مصرح'},             401)
     def send_403(self): self.send_json({'error': 'غير مسموح بهذا الإجراء'}, 403)
@@ -676,239 +3635,558 @@ class Handler(BaseHTTPRequestHandler):
         n = int(self.headers.get('Content-Length', 0))
         return json.loads(self.rfile.read(n)) if n else {}
 
+    def read_upload(self) -> bytes | None:
+        """Raw request body, or None when it's over MAX_UPLOAD_BYTES."""
+        n = int(self.headers.get('Content-Length', 0))
+        if n > MAX_UPLOAD_BYTES:
+            self.close_connection = True
+            return None
+        return self.rfile.read(n)
+
     # ── OPTIONS (CORS preflight) ───────────────────────────────────────────
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin',  '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, If-None-Match')
         self.end_headers()
 
-    # ── GET ────────────────────────────────────────────────────────────────
-    def do_GET(self):
-        parsed = urlparse(self.path)
-        path   = parsed.path
-        qs     = parse_qs(parsed.query)
-
-        # ── static files ──
-        static_map = {
-            '/':           'index.html',
-            '/index.html': 'index.html',
-            '/style.css':  'style.css',
-            '/logo.jpeg':  'logo.jpeg',
-            '/logo.jpg':   'logo.jpg',
-        }
-        # serve js/module files from js/ sub-folder
-        if path.startswith('/js/'):
-            file_path = os.path.join(FRONTEND_DIR, path.lstrip('/'))
-            if os.path.exists(file_path):
-                ext  = os.path.splitext(file_path)[1]
-                self.send_file(file_path, MIME.get(ext, 'text/plain'))
+    # ── dispatch ───────────────────────────────────────────────────────────
+    def do_GET(self):    self.dispatch('GET')
+    def do_POST(self):   self.dispatch('POST')
+    def do_PUT(self):    self.dispatch('PUT')
+    def do_DELETE(self): self.dispatch('DELETE')
+
+    def dispatch(self, method: str):
+        self.status = None
+        try:
+            self._dispatch(method)
+        except Exception as exc:
+            self.send_failure(exc)
+        finally:
+            release_conn()
+
+    def send_failure(self, exc: Exception):
+        """
+        Answer a request whose handling raised: 400 when the body had the wrong
+        shape (a missing key, a string where a number goes, …), 500 for anything
+        else. If the response had already started, the connection is dropped.
+        """
+        malformed = isinstance(exc, _MALFORMED_BODY_ERRORS)
+        if not malformed:
+            print(f'  {_REDACT_TOKEN.sub("token=…", self.path)}  ✗  {exc!r}', file=sys.stderr)
+            traceback.print_exception(exc)
+        if self.status is not None:
+            self.close_connection = True
+        elif malformed:
+            self.send_json({'error': _BAD_PARAMS_ERROR}, 400)
+        else:
+            self.send_json({'error': _SERVER_ERROR}, 500)
+
+    def _dispatch(self, method: str):
+        path, _, query = self.path.partition('?')
+
+        # static files (served from memory)
+        if method == 'GET' and not path.startswith('/api/'):
+            asset = static_assets.get(path) if static_assets else None
+            if asset:
+                self.send_asset(asset)
             else:
                 self.send_404()
             return
-        if path in static_map:
-            file_path = os.path.join(FRONTEND_DIR, static_map[path])
-            if os.path.exists(file_path):
-                ext = os.path.splitext(file_path)[1]
-                self.send_file(file_path, MIME.get(ext, 'text/plain'))
-            else:
+
+        route, params = router.match(method, path)
+        if route is None:
+            # unknown API paths look the same as protected ones until signed in
+            if require_auth(self):
                 self.send_404()
+            else:
+                self.send_401()
             return
+        req = Request(method, path, query, params, route)
+        if route.body:
+            try:
+                req.data = self.read_body()
+            except ValueError:
+                self.send_json({'error': 'معاملات غير صالحة'}, 400); return
+        if route.auth:
+            session = require_auth(self)
+            if not session:
+                self.send_401(); return
+            req.session        = session
+            req.role           = session['role']
+            req.assigned_class = session['assigned_class']
+            req.is_admin       = req.role == 'admin'
+            if route.admin and not req.is_admin:
+                self.send_403(); return
+        router.call(self, req)
 
-        # ── /api/me (no auth required) ──
-        if path == '/api/me':
-            s = get_session(self)
-            self.send_json({'authenticated': bool(s), **(s or {})})
-            return
 
-        # ── all other API routes require auth ──
-        session = require_auth(self)
-        if not session:
-            self.send_401(); return
-
-        role           = session['role']
-        assigned_class = session['assigned_class']
-        is_admin       = (role == 'admin')
-
-        # Students
-        if path == '/api/students':
-            self.send_json(api_get_students() if is_admin else api_get_students(assigned_class))
-
-        # Teachers (admin only)
-        elif path == '/api/teachers':
-            if not is_admin: self.send_403(); return
-            self.send_json(api_get_teachers())
-
-        # Attendance working records
-        elif path == '/api/attendance/records':
-            self.send_json(api_get_attendance_records(qs.get('date', [''])[0]))
-
-        # Teacher attendance working records (admin only)
-        elif path == '/api/teacher-attendance/records':
-            if not is_admin: self.send_403(); return
-            self.send_json(api_get_teacher_attendance_records(qs.get('date', [''])[0]))
-
-        # Dashboard history
-        elif path == '/api/attendance/history':
-            self.send_json(api_get_attendance_history())
-
-        # Permanent attendance log
-        elif path == '/api/attendance/log':
-            date_f  = qs.get('date',  [''])[0]    or None
-            grade_f = qs.get('grade', ['all'])[0] if is_admin else assigned_class
-            self.send_json(api_get_attendance_log(date_f, grade_f))
-
-        # Individual student history
-        elif path.startswith('/api/students/') and path.endswith('/history'):
-            sid = int(path.split('/')[3])
-            if not is_admin:
-                conn = get_conn()
-                r    = conn.execute('SELECT grade FROM app_students WHERE id=?', (sid,)).fetchone()
-                conn.close()
-                if not r or r['grade'] != assigned_class:
-                    self.send_403(); return
-            self.send_json(api_get_student_history(sid))
-
-        # Permanent teacher attendance log (admin only)
-        elif path == '/api/teacher-attendance/log':
-            if not is_admin: self.send_403(); return
-            date_f = qs.get('date', [''])[0] or None
-            self.send_json(api_get_teacher_attendance_log(date_f))
-
-        # User list (admin only)
-        elif path == '/api/users':
-            if not is_admin: self.send_403(); return
-            self.send_json(api_get_users())
+# ══════════════════════════════════════════════════════════════════════════════
+#  ROUTES
+# ══════════════════════════════════════════════════════════════════════════════
+#
+# Every handler is f(h, req): `h` is the Handler (send_json and friends),
+# `req` the Request. Class servants are held to their own grade here, via
+# req.scope or an explicit student_grades check.
 
-        else:
-            self.send_404()
+def _bad_params(h):
+    h.send_json({'error': _BAD_PARAMS_ERROR}, 400)
 
-    # ── POST ───────────────────────────────────────────────────────────────
-    def do_POST(self):
-        path = urlparse(self.path).path
-        data = self.read_body()
 
-        # Login — no auth required
-        if path == '/api/login':
-            result = api_login(data)
-            self.send_json(result, 200 if result['success'] else 401)
-            return
+def _send_result(h, result, ok=200):
+    """api_* results that are either a dict or a (dict, status) pair."""
+    if isinstance(result, dict):
+        h.send_json(result, ok)
+    else:
+        h.send_json(result[0], result[1] or ok)
 
-        # Logout — no auth required
-        if path == '/api/logout':
-            auth = self.headers.get('Authorization', '')
-            if auth.startswith('Bearer '):
-                sessions.pop(auth[7:], None)
-            self.send_json({'success': True})
-            return
 
-        session = require_auth(self)
-        if not session: self.send_401(); return
-        role           = session['role']
-        assigned_class = session['assigned_class']
-        is_admin       = (role == 'admin')
+# ── session ────────────────────────────────────────────────────────────────
+
+@router.get('/api/me', auth=False)
+def _me(h, req):
+    s = get_session(h)
+    h.send_json({'authenticated': bool(s), **(s or {})})
 
-        if path == '/api/students':
-            if not is_admin: data['grade'] = assigned_class
-            self.send_json(api_add_student(data), 201)
 
-        elif path == '/api/teachers':
-            if not is_admin: self.send_403(); return
-            self.send_json(api_add_teacher(data), 201)
+@router.post('/api/login', auth=False)
+def _login(h, req):
+    try:
+        result = api_login(req.data)
+    except PasswordHasherBusy:
+        h.send_json({'success': False, 'error': _BUSY_MESSAGE}, 503, headers={'Retry-After': '1'})
+        return
+    h.send_json(result, 200 if result['success'] else 401)
 
-        elif path == '/api/attendance/mark':
-            if not is_admin:
-                conn = get_conn()
-                r    = conn.execute('SELECT grade FROM app_students WHERE id=?', (data.get('studentId'),)).fetchone()
-                conn.close()
-                if not r or r['grade'] != assigned_class: self.send_403(); return
-            self.send_json(api_mark_attendance(data))
 
-        elif path == '/api/attendance/save':
-            self.send_json(api_save_attendance(data))
+@router.post('/api/logout', auth=False)
+def _logout(h, req):
+    auth = h.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        sessions.drop(auth[7:])
+        events.close(token=auth[7:])
+    h.send_json({'success': True})
 
-        elif path == '/api/teacher-attendance/mark':
-            if not is_admin: self.send_403(); return
-            self.send_json(api_mark_teacher_attendance(data))
 
-        elif path == '/api/teacher-attendance/save':
-            if not is_admin: self.send_403(); return
-            self.send_json(api_save_teacher_attendance(data))
+# ── students ───────────────────────────────────────────────────────────────
 
-        elif path == '/api/users':
-            if not is_admin: self.send_403(); return
-            result, err = api_create_user(data)
-            self.send_json(result, err or 201)
+@router.get('/api/students')
+def _students(h, req):
+    grade = req.scope
+    h.send_versioned(table_versions.etag('app_students', grade, req.arg('format') if req.columnar else ''),
+                     lambda: api_get_students(grade, req.columnar))
 
-        else:
-            self.send_404()
-
-    # ── PUT ────────────────────────────────────────────────────────────────
-    def do_PUT(self):
-        path = urlparse(self.path).path
-        data = self.read_body()
-        session = require_auth(self)
-        if not session: self.send_401(); return
-        role           = session['role']
-        assigned_class = session['assigned_class']
-        is_admin       = (role == 'admin')
-
-        if path.startswith('/api/students/') and not path.endswith('/history'):
-            sid = int(path.split('/')[-1])
-            if not is_admin:
-                conn = get_conn()
-                r    = conn.execute('SELECT grade FROM app_students WHERE id=?', (sid,)).fetchone()
-                conn.close()
-                if not r or r['grade'] != assigned_class: self.send_403(); return
-                data['grade'] = assigned_class  # teacher cannot move student to another class
-            result = api_edit_student(sid, data)
-            self.send_json(result if isinstance(result, dict) else result[0],
-                           200  if isinstance(result, dict) else result[1])
-
-        elif path.startswith('/api/teachers/'):
-            if not is_admin: self.send_403(); return
-            result = api_edit_teacher(int(path.split('/')[-1]), data)
-            self.send_json(result if isinstance(result, dict) else result[0],
-                           200  if isinstance(result, dict) else result[1])
-
-        elif path.startswith('/api/users/'):
-            if not is_admin: self.send_403(); return
-            result, err = api_edit_user(int(path.split('/')[-1]), data)
-            self.send_json(result, err or 200)
 
-        else:
-            self.send_404()
-
-    # ── DELETE ─────────────────────────────────────────────────────────────
-    def do_DELETE(self):
-        path = urlparse(self.path).path
-        session = require_auth(self)
-        if not session: self.send_401(); return
-        role           = session['role']
-        assigned_class = session['assigned_class']
-        is_admin       = (role == 'admin')
-
-        if path.startswith('/api/students/'):
-            sid = int(path.split('/')[-1])
-            if not is_admin:
-                conn = get_conn()
-                r    = conn.execute('SELECT grade FROM app_students WHERE id=?', (sid,)).fetchone()
-                conn.close()
-                if not r or r['grade'] != assigned_class: self.send_403(); return
-            self.send_json(api_delete_student(sid))
-
-        elif path.startswith('/api/teachers/'):
-            if not is_admin: self.send_403(); return
-            self.send_json(api_delete_teacher(int(path.split('/')[-1])))
-
-        elif path.startswith('/api/users/'):
-            if not is_admin: self.send_403(); return
-            result, err = api_delete_user(int(path.split('/')[-1]))
-            self.send_json(result, err or 200)
+@router.post('/api/students')
+def _add_student(h, req):
+    if not req.is_admin: req.data['grade'] = req.assigned_class
+    h.send_json(api_add_student(req.data), 201)
 
-        else:
-            self.send_404()
+
+@router.put('/api/students/{id:int}')
+def _edit_student(h, req):
+    sid = req.params['id']
+    if not req.is_admin:
+        if not student_grades.in_grade(sid, req.assigned_class): h.send_403(); return
+        req.data['grade'] = req.assigned_class  # teacher cannot move student to another class
+    _send_result(h, api_edit_student(sid, req.data))
+
+
+@router.delete('/api/students/{id:int}')
+def _delete_student(h, req):
+    sid = req.params['id']
+    if not req.is_admin and not student_grades.in_grade(sid, req.assigned_class):
+        h.send_403(); return
+    h.send_json(api_delete_student(sid))
+
+
+@router.get('/api/students/{id:int}/history')
+def _student_history(h, req):
+    sid = req.params['id']
+    if not req.is_admin and not student_grades.in_grade(sid, req.assigned_class):
+        h.send_403(); return
+    h.send_json(api_get_student_history(sid))
+
+
+# Bulk roster import — the body is the raw CSV/XLSX file; class servants import into their own class
+def _import(kind):
+    def handle(h, req):
+        body = h.read_upload()
+        if body is None:
+            h.send_json({'error': 'الملف كبير جدًا'}, 413); return
+        try:
+            result = api_import(kind, body, req.arg('dry_run') in ('1', 'true'), req.scope)
+        except SpreadsheetError as e:
+            h.send_json({'error': f'ملف غير صالح ({e})'}, 400); return
+        h.send_json(result)
+    return handle
+
+
+router.add('POST', '/api/students/import', _import('student'), body=False)
+router.add('POST', '/api/teachers/import', _import('teacher'), body=False, admin=True)
+
+
+# ── teachers (admin only) ──────────────────────────────────────────────────
+
+@router.get('/api/teachers', admin=True)
+def _teachers(h, req):
+    h.send_versioned(table_versions.etag('app_teachers', variant=req.arg('format') if req.columnar else ''),
+                     lambda: api_get_teachers(req.columnar))
+
+
+@router.post('/api/teachers', admin=True)
+def _add_teacher(h, req):
+    h.send_json(api_add_teacher(req.data), 201)
+
+
+@router.put('/api/teachers/{id:int}', admin=True)
+def _edit_teacher(h, req):
+    _send_result(h, api_edit_teacher(req.params['id'], req.data))
+
+
+@router.delete('/api/teachers/{id:int}', admin=True)
+def _delete_teacher(h, req):
+    h.send_json(api_delete_teacher(req.params['id']))
+
+
+# ── student attendance ─────────────────────────────────────────────────────
+
+@router.get('/api/attendance/records')
+def _attendance_records(h, req):
+    h.send_json(api_get_attendance_records(req.arg('date')))
+
+
+@router.post('/api/attendance/mark')
+def _mark(h, req):
+    if not req.is_admin and not student_grades.in_grade(req.data.get('studentId'), req.assigned_class):
+        h.send_403(); return
+    h.send_json(api_mark_attendance(req.data))
+
+
+@router.post('/api/attendance/mark-batch')
+def _mark_batch(h, req):
+    pairs = _batch_marks(req.data)
+    if pairs is None:
+        _bad_params(h); return
+    if not req.is_admin and not student_grades.all_in([sid for sid, _ in pairs], req.assigned_class):
+        h.send_403(); return
+    _send_result(h, api_mark_attendance_batch(req.data))
+
+
+@router.post('/api/attendance/save')
+def _save(h, req):
+    _send_result(h, api_save_attendance(req.data))
+
+
+@router.get('/api/attendance/history')
+def _history(h, req):
+    h.send_versioned(table_versions.etag('attendance_history'), api_get_attendance_history)
+
+
+@router.get('/api/attendance/log')
+def _attendance_log(h, req):
+    grade = req.arg('grade', 'all') if req.is_admin else req.assigned_class
+    h.send_log(req.qs, api_count_attendance_log, api_get_attendance_log, iter_attendance_log,
+               req.arg('date') or None, grade)
+
+
+# ── teacher attendance (admin only) ────────────────────────────────────────
+
+@router.get('/api/teacher-attendance/records', admin=True)
+def _teacher_records(h, req):
+    h.send_json(api_get_teacher_attendance_records(req.arg('date')))
+
+
+@router.post('/api/teacher-attendance/mark', admin=True)
+def _teacher_mark(h, req):
+    h.send_json(api_mark_teacher_attendance(req.data))
+
+
+@router.post('/api/teacher-attendance/mark-batch', admin=True)
+def _teacher_mark_batch(h, req):
+    _send_result(h, api_mark_teacher_attendance_batch(req.data))
+
+
+@router.post('/api/teacher-attendance/save', admin=True)
+def _teacher_save(h, req):
+    _send_result(h, api_save_teacher_attendance(req.data))
+
+
+@router.get('/api/teacher-attendance/log', admin=True)
+def _teacher_log(h, req):
+    h.send_log(req.qs, api_count_teacher_attendance_log, api_get_teacher_attendance_log,
+               iter_teacher_attendance_log, req.arg('date') or None)
+
+
+# ── sync ───────────────────────────────────────────────────────────────────
+
+# Changes since the client's last sync version (full snapshot for since=0)
+@router.get('/api/sync')
+def _sync(h, req):
+    try:
+        since = int(req.arg('since', '0') or 0)
+    except ValueError:
+        _bad_params(h); return
+    h.send_json(api_sync(since, req.arg('date'), req.scope, req.is_admin, req.columnar))
+
+
+@router.get('/api/events')
+def _events(h, req):
+    """Server-Sent Events (see LIVE EVENTS); the token may come as ?token= since EventSource can't send headers."""
+    if events.full():
+        h.send_json({'error': _BUSY_MESSAGE}, 503); return
+    h.send_response(200)
+    h.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+    h.send_header('Cache-Control', 'no-store')
+    h.send_header('X-Accel-Buffering', 'no')     # keep reverse proxies from buffering the stream
+    h.send_cors()
+    h.send_header('Connection', 'close')
+    h.end_headers()
+    h.close_connection = True
+    events.subscribe(h.connection, req.is_admin, req.assigned_class,
+                     h.headers.get('Last-Event-ID') or req.arg('lastEventId'),
+                     session_token(h), req.session['user_id'])
+
+
+# ── reports — class servants only ever see their own grade ─────────────────
+
+@router.get('/api/reports/grades')
+def _report_grades(h, req):
+    h.send_json(api_report_grades(req.scope))
+
+
+@router.get('/api/reports/summary')
+def _report_summary(h, req):
+    h.send_json(api_report_summary(req.arg('from') or None, req.arg('to') or None, req.scope))
+
+
+@router.get('/api/reports/attention')
+def _report_attention(h, req):
+    try:
+        threshold = float(req.arg('threshold', ATTENTION_THRESHOLD))
+    except ValueError:
+        _bad_params(h); return
+    h.send_json(api_report_attention(threshold, req.scope))
+
+
+@router.get('/api/reports/monthly')
+def _report_monthly(h, req):
+    h.send_json(api_report_monthly('student', req.arg('from') or None, req.arg('to') or None, req.scope))
+
+
+@router.get('/api/reports/teachers/monthly', admin=True)
+def _report_teachers_monthly(h, req):
+    h.send_json(api_report_monthly('teacher', req.arg('from') or None, req.arg('to') or None,
+                                   req.arg('department') or None))
+
+
+@router.get('/api/reports/departments', admin=True)
+def _report_departments(h, req):
+    h.send_json(api_report_departments(req.arg('from') or None, req.arg('to') or None))
+
+
+# ── metrics and slow queries (admin only) ──────────────────────────────────
+
+@router.get('/api/metrics', admin=True)
+def _metrics(h, req):
+    h.send_body(metrics.render().encode(), 'text/plain; version=0.0.4; charset=utf-8')
+
+
+@router.get('/api/slow-queries', admin=True)
+def _slow_queries(h, req):
+    try:
+        limit = min(int(req.arg('limit', 100)), 1000)
+    except ValueError:
+        _bad_params(h); return
+    h.send_json(api_get_slow_queries(limit))
+
+
+@router.delete('/api/slow-queries', admin=True)
+def _clear_slow_queries(h, req):
+    h.send_json(api_clear_slow_queries())
+
+
+# ── streamed CSV / XLSX downloads ──────────────────────────────────────────
+
+def _export(name, produce):
+    def handle(h, req):
+        fmt = req.arg('format', 'xlsx')
+        if fmt not in EXPORT_FORMATS:
+            _bad_params(h); return
+        d_from, d_to = req.arg('from') or None, req.arg('to') or None
+        header, rows = produce(req, d_from, d_to)
+        stamp = '_'.join(d for d in (d_from, d_to) if d) or time.strftime('%Y-%m-%d')
+        h.send_export(fmt, f'{name}_{stamp}', header, rows)
+    return handle
+
+
+def _export_grade(req):
+    return req.arg('grade', 'all') if req.is_admin else req.assigned_class
+
+
+router.add('GET', '/api/export/attendance-log', _export('attendance-log',
+           lambda req, d_from, d_to: export_attendance_log(d_from, d_to, _export_grade(req))))
+router.add('GET', '/api/export/students', _export('students',
+           lambda req, d_from, d_to: export_students(_export_grade(req))))
+router.add('GET', '/api/export/teachers', _export('teachers',
+           lambda req, d_from, d_to: export_teachers()), admin=True)
+router.add('GET', '/api/export/teacher-attendance-log', _export('teacher-attendance-log',
+           lambda req, d_from, d_to: export_teacher_attendance_log(d_from, d_to)), admin=True)
+
+
+# ── users (admin only) ─────────────────────────────────────────────────────
+
+@router.get('/api/users', admin=True)
+def _users(h, req):
+    h.send_versioned(table_versions.etag('app_users'), api_get_users)
+
+
+@router.post('/api/users', admin=True)
+def _create_user(h, req):
+    _send_result(h, api_create_user(req.data), 201)
+
+
+@router.put('/api/users/{id:int}', admin=True)
+def _edit_user(h, req):
+    _send_result(h, api_edit_user(req.params['id'], req.data))
+
+
+@router.delete('/api/users/{id:int}', admin=True)
+def _delete_user(h, req):
+    _send_result(h, api_delete_user(req.params['id']))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  SERVERS
+# ══════════════════════════════════════════════════════════════════════════════
+#
+#  single  — the original HTTPServer, one request at a time
+#  threads — HTTPServer whose requests run on a bounded worker pool
+#  async   — asyncio reads each request off the socket, then hands the parsed
+#            bytes to the worker pool, so slow clients never hold a worker
+
+SERVER_MODES    = ('single', 'threads', 'async')
+DEFAULT_WORKERS = 16
+MAX_HEADER_SIZE = 64 * 1024
+
+
+class SingleHTTPServer(HTTPServer):
+    """The original one-request-at-a-time HTTPServer, except it leaves event streams open."""
+
+    def shutdown_request(self, request):
+        if not events.holds(request):
+            super().shutdown_request(request)
+
+
+class PooledHTTPServer(SingleHTTPServer):
+    """HTTPServer that runs each request on a fixed-size thread pool."""
+
+    def __init__(self, address, handler_cls, workers=DEFAULT_WORKERS):
+        super().__init__(address, handler_cls)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+class _PrereadHandler(Handler):
+    """Handler fed from bytes already read by the asyncio loop; answers one request."""
+
+    def __init__(self, sock, client_address, server, raw: bytes):
+        self._raw = raw
+        super().__init__(sock, client_address, server)
+
+    def setup(self):
+        super().setup()
+        self.rfile = io.BytesIO(self._raw)
+
+    def handle(self):
+        self.handle_one_request()
+
+
+class AsyncHTTPServer:
+    """asyncio accept/read loop in front of a bounded pool of Handler workers."""
+
+    def __init__(self, address, workers=DEFAULT_WORKERS):
+        self.server_address = address
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def server_close(self):
+        self.pool.shutdown(wait=False)
+
+    async def _serve(self):
+        loop     = asyncio.get_running_loop()
+        listener = socket.create_server(self.server_address)
+        listener.setblocking(False)
+        with listener:
+            while True:
+                sock, addr = await loop.sock_accept(listener)
+                loop.create_task(self._connection(loop, sock, addr))
+
+    async def _connection(self, loop, sock, addr):
+        try:
+            raw = await asyncio.wait_for(self._read_request(loop, sock), Handler.timeout)
+            if raw:
+                sock.setblocking(True)
+                await loop.run_in_executor(self.pool, _PrereadHandler, sock, addr, self, raw)
+        except (asyncio.TimeoutError, OSError, ValueError):
+            pass
+        finally:
+            if not events.holds(sock):      # an event stream's socket belongs to the hub now
+                try:
+                    sock.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                sock.close()
+
+    @staticmethod
+    async def _read_request(loop, sock) -> bytes:
+        buf = b''
+        while b'\r\n\r\n' not in buf:
+            chunk = await loop.sock_recv(sock, 65536)
+            if not chunk:
+                return b''
+            buf += chunk
+            if len(buf) > MAX_HEADER_SIZE:
+                raise ValueError('request header too large')
+        head, _, body = buf.partition(b'\r\n\r\n')
+        length = 0
+        for line in head.split(b'\r\n')[1:]:
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                length = int(value.strip())
+        while len(body) < length:
+            chunk = await loop.sock_recv(sock, 65536)
+            if not chunk:
+                break
+            body += chunk
+        return head + b'\r\n\r\n' + body
+
+
+def make_server(mode: str, host: str, port: int, workers: int = DEFAULT_WORKERS):
+    if mode == 'single':
+        return SingleHTTPServer((host, port), Handler)
+    if mode == 'threads':
+        return PooledHTTPServer((host, port), Handler, workers)
+    if mode == 'async':
+        return AsyncHTTPServer((host, port), workers)
+    raise ValueError(f'unknown server mode: {mode}')
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -916,16 +4194,83 @@ class Handler(BaseHTTPRequestHandler):
 # ══════════════════════════════════════════════════════════════════════════════
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Church Attendance System server')
+    parser.add_argument('--host',    default='localhost')
+    parser.add_argument('--port',    type=int, default=5000)
+    parser.add_argument('--mode',    choices=SERVER_MODES, default='threads',
+                        help='concurrency model (default: threads)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='worker threads for the threads/async modes')
+    parser.add_argument('--bundle-js', action='store_true',
+                        help=f'serve the js/ modules as one {JS_BUNDLE_URL} response')
+    parser.add_argument('--persist-sessions', action='store_true',
+                        help='keep sessions in church.DB so they survive restarts and are shared between processes')
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                        help='regenerate the report rollup tables from the logs and exit')
+    parser.add_argument('--reconcile', action='store_true',
+                        help='recompute attendance counters and daily history from the logs before serving')
+    parser.add_argument('--archive', nargs='?', type=int, const=-1, metavar='YEAR',
+                        help='move closed service years (through the one starting in YEAR, default all) '
+                             'out of the hot logs into archive files, then exit')
+    parser.add_argument('--verify-archives', action='store_true',
+                        help='check every archive file against its registry entry and exit')
+    parser.add_argument('--gzip-level', type=int, choices=range(10), default=GZIP_LEVEL, metavar='0-9',
+                        help=f'gzip level for API responses, 0 to disable (default: {GZIP_LEVEL})')
+    parser.add_argument('--gzip-min', type=int, default=GZIP_MIN_BYTES, metavar='BYTES',
+                        help=f'smallest JSON body worth compressing (default: {GZIP_MIN_BYTES})')
+    parser.add_argument('--metrics-log', metavar='PATH',
+                        help='append a metrics snapshot to this file (rotated) every --metrics-interval seconds')
+    parser.add_argument('--metrics-interval', type=float, default=METRICS_DUMP_INTERVAL, metavar='SECONDS')
+    parser.add_argument('--slow-query-ms', type=float, default=SLOW_QUERY_MS, metavar='MS',
+                        help=f'log statements slower than this to slow_queries, 0 to disable (default: {SLOW_QUERY_MS})')
+    args = parser.parse_args()
+    GZIP_LEVEL, GZIP_MIN_BYTES = args.gzip_level, args.gzip_min
+
     init_db()
-    PORT   = 5000
-    server = HTTPServer(('localhost', PORT), Handler)
+    sessions = SessionStore(persist=args.persist_sessions)
+    slow_queries = SlowQueryLog(args.slow_query_ms)
+    if args.rebuild_rollups:
+        rebuild_rollups()
+        close_all_conns()
+        print('Rollups rebuilt.')
+        raise SystemExit(0)
+    if args.archive is not None:
+        for done in archive_logs(None if args.archive < 0 else args.archive):
+            print(f"Archived {done['year']}-{done['year'] + 1}: {done['student_rows']} student rows, "
+                  f"{done['teacher_rows']} teacher rows → {done['file']}")
+        close_all_conns()
+        raise SystemExit(0)
+    if args.verify_archives:
+        problems = verify_archives()
+        close_all_conns()
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        print('Archives verified.' if not problems else f'{len(problems)} problem(s) found.')
+        raise SystemExit(1 if problems else 0)
+    if args.reconcile:
+        t0 = time.perf_counter()
+        fixed = reconcile_counters()
+        print(f"Reconciled in {time.perf_counter() - t0:.1f}s: {fixed['students']} students, "
+              f"{fixed['teachers']} teachers, {fixed['history_days']} history days corrected")
+    static_assets = StaticAssets(FRONTEND_DIR, bundle=args.bundle_js)
+    static_assets.watch()
+    server = make_server(args.mode, args.host, args.port, args.workers)
+    dump   = MetricsDump(args.metrics_log, args.metrics_interval) if args.metrics_log else None
+    if dump:
+        dump.start()
     print(f"""
 ╔══════════════════════════════════════════════╗
 ║   System  —  Server Ready   ║
                      ║
 ╚══════════════════════════════════════════════╝
+  http://{args.host}:{args.port}   ({args.mode}, {args.workers} workers)
 """)
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print('\nServer stopped.')
+    finally:
+        server.server_close()
+        if dump:
+            dump.stop()
+        close_all_conns()
@@ -0,0 +1,228 @@
+"""
+spreadsheet.py — CSV and XLSX rows in and out, standard library only.
+
+read_rows() yields (row_number, [cell, ...]) for an uploaded CSV or XLSX
+file. XLSX is read straight out of the zip with iterparse, one <row> at a
+time, so a large sheet is never built up as an element tree.
+
+write_csv() / write_xlsx() go the other way: they consume a row iterator and
+write to any object with write(), a few KiB at a time. The XLSX writer uses
+zipfile's streaming mode (data descriptors) and inline strings, so neither
+the sheet nor a shared-string table is ever held in memory.
+"""
+
+import codecs, csv, io, re, zipfile
+from itertools import chain
+from xml.sax.saxutils import escape
+import xml.etree.ElementTree as ET
+
+_MAIN     = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_DOC_RELS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_RELS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_CELL_REF = re.compile(r'([A-Z]+)')
+
+
+class SpreadsheetError(ValueError):
+    """The upload isn't a CSV or XLSX file we can read."""
+
+
+def is_xlsx(data: bytes) -> bool:
+    return data[:4] == b'PK\x03\x04'
+
+
+def read_rows(data: bytes):
+    """(row_number, values) for every non-empty row of the first sheet / the CSV."""
+    return _xlsx_rows(data) if is_xlsx(data) else _csv_rows(data)
+
+
+# ── CSV ───────────────────────────────────────────────────────────────────────
+
+def _csv_rows(data: bytes):
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # "CSV (Comma delimited)" saved by Excel on an Arabic Windows install
+        try:
+            text = data.decode('cp1256')
+        except UnicodeDecodeError as e:
+            raise SpreadsheetError('unreadable text encoding') from e
+    reader = csv.reader(io.StringIO(text, newline=''))
+    try:
+        for values in reader:
+            if any(v.strip() for v in values):
+                yield reader.line_num, values
+    except csv.Error as e:
+        raise SpreadsheetError(str(e)) from e
+
+
+# ── XLSX ──────────────────────────────────────────────────────────────────────
+
+def _xlsx_rows(data: bytes):
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            shared = _shared_strings(zf)
+            with zf.open(_first_sheet(zf)) as sheet:
+                number = 0
+                for _, el in ET.iterparse(sheet):
+                    if el.tag != _MAIN + 'row':
+                        continue
+                    number = int(el.get('r') or number + 1)
+                    values = _row_values(el, shared)
+                    el.clear()
+                    if any(v.strip() for v in values):
+                        yield number, values
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, ValueError) as e:
+        if isinstance(e, SpreadsheetError):
+            raise
+        raise SpreadsheetError(f'not a readable .xlsx file ({e})') from e
+
+
+def _first_sheet(zf: zipfile.ZipFile) -> str:
+    """Zip path of the workbook's first worksheet."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    sheet    = workbook.find(f'{_MAIN}sheets/{_MAIN}sheet')
+    if sheet is None:
+        raise SpreadsheetError('workbook has no sheets')
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(_PKG_RELS + 'Relationship'):
+        if rel.get('Id') == sheet.get(_DOC_RELS + 'id'):
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> list:
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+    strings = []
+    with zf.open('xl/sharedStrings.xml') as f:
+        for _, el in ET.iterparse(f):
+            if el.tag == _MAIN + 'si':
+                # plain <t>, or rich-text runs <r><t>; phonetic hints (<rPh>) are skipped
+                strings.append(''.join(t.text or '' for t in el.iterfind(f'{_MAIN}t'))
+                               + ''.join(t.text or '' for t in el.iterfind(f'{_MAIN}r/{_MAIN}t')))
+                el.clear()
+    return strings
+
+
+def _column_index(ref: str) -> int:
+    index = 0
+    for ch in _CELL_REF.match(ref).group(1):
+        index = index * 26 + ord(ch) - 64
+    return index - 1
+
+
+def _row_values(row, shared: list) -> list:
+    values = []
+    for cell in row.iter(_MAIN + 'c'):
+        ref = cell.get('r')
+        if ref:
+            values.extend([''] * (_column_index(ref) - len(values)))
+        kind = cell.get('t')
+        v    = cell.find(_MAIN + 'v')
+        if kind == 'inlineStr':
+            text = ''.join(t.text or '' for t in cell.iter(_MAIN + 't'))
+        elif v is None or v.text is None:
+            text = ''
+        elif kind == 's':
+            text = shared[int(v.text)]
+        elif kind == 'b':
+            text = 'TRUE' if v.text == '1' else 'FALSE'
+        else:
+            text = v.text
+            if kind in (None, 'n') and text.endswith('.0'):
+                text = text[:-2]     # whole numbers stored as floats, e.g. grade "5.0"
+        values.append(text)
+    return values
+
+
+# ── writing ───────────────────────────────────────────────────────────────────
+
+XLSX_MIME   = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+_WRITE_BUF  = 16 * 1024
+_BAD_XML    = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_STATIC = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml"'
+        ' ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml"'
+        ' ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml"'
+        ' Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml"'
+        ' Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>',
+}
+
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+_XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"{rtl}/></sheetViews><sheetData>'
+)
+_XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def write_csv(out, header, rows):
+    """UTF-8 CSV with a BOM (so Excel shows Arabic correctly), header row first."""
+    buf    = io.StringIO()
+    writer = csv.writer(buf)
+    out.write(codecs.BOM_UTF8)
+    for row in chain([header], rows):
+        writer.writerow(row)
+        if buf.tell() >= _WRITE_BUF:
+            out.write(buf.getvalue().encode())
+            buf.seek(0); buf.truncate()
+    out.write(buf.getvalue().encode())
+
+
+def write_xlsx(out, header, rows, sheet_name='Sheet1', rtl=True):
+    """Single-sheet workbook, header row first, streamed into `out` as a zip."""
+    name = escape(re.sub(r'[\[\]:*?/\\]', ' ', sheet_name)[:31], {'"': '&quot;'})
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for part, xml in _XLSX_STATIC.items():
+            zf.writestr(part, xml)
+        zf.writestr('xl/workbook.xml', _XLSX_WORKBOOK.format(name=name))
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(_XLSX_SHEET_HEAD.format(rtl=' rightToLeft="1"' if rtl else '').encode())
+            buf, size = [], 0
+            for row in chain([header], rows):
+                xml = _xlsx_row(row)
+                buf.append(xml); size += len(xml)
+                if size >= _WRITE_BUF:
+                    sheet.write(''.join(buf).encode())
+                    buf, size = [], 0
+            sheet.write((''.join(buf) + _XLSX_SHEET_TAIL).encode())
+
+
+def _xlsx_row(values) -> str:
+    cells = []
+    for v in values:
+        if v is None or v == '':
+            cells.append('<c/>')
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            cells.append(f'<c><v>{v}</v></c>')
+        else:
+            text = escape(_BAD_XML.sub('', str(v)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return '<row>' + ''.join(cells) + '</row>'
@@ -0,0 +1,65 @@
+"""
+Archiving a service year never loses a save that lands while the year is
+being copied: the run fails and leaves both tiers as they were, and the
+next run archives the year with the late row in it.
+
+    python -m unittest tests.test_archive
+"""
+
+import os, sqlite3, tempfile, unittest
+from unittest import mock
+
+import server
+
+
+class ArchiveRaceTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._db  = server.DB_PATH
+        server.DB_PATH = os.path.join(self._tmp.name, 'church.db')
+        server.init_db()
+        conn = server.get_conn()
+        conn.executemany('INSERT INTO app_students (name, grade) VALUES (?, ?)', [('مينا', '3'), ('مريم', '3')])
+        conn.execute("INSERT INTO attendance_log (student_id, record_date, status) VALUES (1, '2020-03-01', 'present')")
+        conn.commit()
+
+    def tearDown(self):
+        server.close_all_conns()
+        server._pool_local.conn = None
+        server.DB_PATH = self._db
+        self._tmp.cleanup()
+
+    def test_save_during_the_copy(self):
+        replace = os.replace
+
+        def save_then_replace(src, dst):
+            # another process saving into the year after it was copied, before the hot delete
+            other = sqlite3.connect(server.DB_PATH)
+            other.execute("INSERT INTO attendance_log (student_id, record_date, status) VALUES (2, '2020-03-01', 'late')")
+            other.commit()
+            other.close()
+            replace(src, dst)
+
+        with mock.patch.object(server.os, 'replace', save_then_replace):
+            with self.assertRaises(RuntimeError):
+                server.archive_logs(2019)
+        conn = server.get_conn()
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM attendance_log').fetchone()[0], 2)
+        self.assertIsNone(conn.execute('SELECT 1 FROM log_archives').fetchone())
+        self.assertEqual(os.listdir(server._archive_dir()), [])
+
+        done = server.archive_logs(2019)
+        self.assertEqual([(d['year'], d['student_rows']) for d in done], [(2019, 2)])
+        self.assertEqual(server.get_conn().execute('SELECT COUNT(*) FROM attendance_log').fetchone()[0], 0)
+        self.assertEqual(server.verify_archives(), [])
+
+    def test_save_into_an_archived_year(self):
+        server.archive_logs(2019)
+        body, status = server.api_save_attendance({'date': '2020-03-08', 'records': {'1': 'present'}})
+        self.assertEqual(status, 409)
+        self.assertEqual(server.get_conn().execute('SELECT COUNT(*) FROM attendance_log').fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,418 @@
+"""
+Every API route, end to end: a real server (threads mode) on a fresh
+temporary database, called over HTTP as an admin, a class servant (grade 5)
+and nobody. Checks status codes, who may see what, and the shape of the
+answers, so a change to routing, dispatch or a handler that alters an
+endpoint's behaviour fails here. The class fails if a registered route is
+never called.
+
+    python -m unittest discover -s tests -t .
+"""
+
+import io, json, os, socket, sys, tempfile, threading, time, unittest, urllib.error, urllib.request
+
+import server
+
+DATE = '2026-01-04'
+
+
+class EndpointTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp   = tempfile.TemporaryDirectory()
+        cls._db    = server.DB_PATH
+        cls.called = set()          # routes hit by any test
+        cls._ran   = 0
+        cls._out, sys.stdout = sys.stdout, io.StringIO()     # the server's request log
+        server.DB_PATH       = os.path.join(cls._tmp.name, 'church.db')
+        server.static_assets = server.StaticAssets(server.FRONTEND_DIR)
+        server.init_db()
+        cls.httpd = server.make_server('threads', '127.0.0.1', 0, 4)
+        cls.port  = cls.httpd.server_address[1]
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+        server.close_all_conns()
+        server._pool_local.conn = None
+        server.DB_PATH       = cls._db
+        server.static_assets = None
+        sys.stdout = cls._out
+        cls._tmp.cleanup()
+
+    def setUp(self):
+        # a fresh database per test: two KG1 students, two in grade 5, one teacher
+        type(self)._ran += 1
+        server.DB_PATH = os.path.join(self._tmp.name, f'church_{self._ran}.db')
+        server.init_db()
+        self.admin = self.login('admin', '')
+        for name, grade in (('مينا', 'KG1'), ('مريم', 'KG1'), ('بيشوي', '5'), ('كيرلس', '5')):
+            self.call('POST', '/api/students', {'name': name, 'grade': grade}, self.admin)
+        self.call('POST', '/api/teachers', {'name': 'أبانوب', 'subject': 'ابتدائي'}, self.admin)
+        self.call('POST', '/api/users', {'name': 'خادم', 'username': 'servant5', 'password': 'pw',
+                                         'role': 'teacher', 'assigned_class': '5'}, self.admin)
+        self.servant = self.login('servant5', 'pw')
+
+    # ── helpers ────────────────────────────────────────────────────────────
+
+    def call(self, method, path, body=None, token=None, raw=None, headers=None):
+        """(status, headers, body) — JSON bodies decoded."""
+        route, _ = server.router.match(method, path.partition('?')[0])
+        if route:
+            self.called.add((route.method, route.pattern))
+        data = raw if raw is not None else (json.dumps(body).encode() if body is not None else None)
+        req  = urllib.request.Request(f'http://127.0.0.1:{self.port}{path}', data=data, method=method,
+                                      headers=headers or {})
+        if token:
+            req.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(req, timeout=20) as res:
+                status, head, out = res.status, res.headers, res.read()
+        except urllib.error.HTTPError as e:
+            status, head, out = e.code, e.headers, e.read()
+        if 'json' in (head.get('Content-Type') or ''):
+            out = json.loads(out)
+        return status, head, out
+
+    def status(self, *args, **kw):
+        return self.call(*args, **kw)[0]
+
+    def json(self, method, path, body=None, token=None, expect=200):
+        status, _, out = self.call(method, path, body, token)
+        self.assertEqual(status, expect, f'{method} {path} → {status} {out!r}')
+        return out
+
+    def login(self, username, password):
+        return self.json('POST', '/api/login', {'username': username, 'password': password})['token']
+
+    def path_of(self, route):
+        return route.pattern.replace('{id:int}', '1')
+
+    # ── session and access control ─────────────────────────────────────────
+
+    def test_session(self):
+        self.assertEqual(self.json('GET', '/api/me'), {'authenticated': False})
+        me = self.json('GET', '/api/me', token=self.servant)
+        self.assertTrue(me['authenticated'])
+        self.assertEqual((me['role'], me['assigned_class']), ('teacher', '5'))
+        bad = self.json('POST', '/api/login', {'username': 'servant5', 'password': 'nope'}, expect=401)
+        self.assertFalse(bad['success'])
+        self.assertTrue(self.json('POST', '/api/logout', token=self.servant)['success'])
+        self.assertEqual(self.status('GET', '/api/students', token=self.servant), 401)
+
+    def test_every_protected_route_needs_a_session(self):
+        for route in server.router.routes:
+            if route.auth:
+                with self.subTest(route=f'{route.method} {route.pattern}'):
+                    self.assertEqual(self.status(route.method, self.path_of(route)), 401)
+
+    def test_admin_routes_refuse_servants(self):
+        for route in server.router.routes:
+            if route.admin:
+                with self.subTest(route=f'{route.method} {route.pattern}'):
+                    self.assertEqual(self.status(route.method, self.path_of(route),
+                                                 {} if route.body else None, self.servant), 403)
+
+    def test_unknown_paths(self):
+        self.assertEqual(self.status('GET', '/api/nope'), 401)
+        self.assertEqual(self.status('GET', '/api/nope', token=self.admin), 404)
+        self.assertEqual(self.status('POST', '/api/nope', {}, self.admin), 404)
+        self.assertEqual(self.status('GET', '/api/students/abc/history', token=self.admin), 404)
+        self.assertEqual(self.status('PUT', '/api/students/1/history', {}, self.admin), 404)
+
+    def test_malformed_bodies(self):
+        cases = [
+            ('POST', '/api/students', None, b'{bad'),
+            ('POST', '/api/students', None, b'[1]'),
+            ('POST', '/api/attendance/mark', {'studentId': 1, 'date': DATE}, None),
+            ('POST', '/api/attendance/mark-batch', {'marks': [{'id': 1, 'status': 'present'}]}, None),
+            ('POST', '/api/attendance/mark-batch', {'date': DATE, 'marks': [{'id': 1}]}, None),
+            ('POST', '/api/attendance/mark-batch', {'date': DATE, 'marks': [1]}, None),
+            ('POST', '/api/attendance/save', {'date': DATE, 'records': [1]}, None),
+            ('POST', '/api/attendance/save', {'date': DATE, 'records': {'x': 'present'}}, None),
+            ('POST', '/api/teacher-attendance/mark-batch', {'date': DATE, 'marks': 'x'}, None),
+            ('POST', '/api/teacher-attendance/save', {'date': DATE, 'records': {'x': 'present'}}, None),
+        ]
+        for method, path, body, raw in cases:
+            with self.subTest(path=path, body=body or raw):
+                self.assertEqual(self.status(method, path, body, self.admin, raw), 400)
+        # nothing was left half-written, and the write lock is free
+        t0 = time.perf_counter()
+        self.json('POST', '/api/attendance/save', {'date': DATE, 'records': {'1': 'present'}}, self.admin)
+        self.assertLess(time.perf_counter() - t0, 5)
+        self.assertEqual(self.json('GET', f'/api/attendance/log?date={DATE}&count=1', token=self.admin),
+                         {'count': 1})
+
+    # ── students ───────────────────────────────────────────────────────────
+
+    def test_student_lists_are_scoped(self):
+        everyone = self.json('GET', '/api/students', token=self.admin)
+        self.assertEqual(len(everyone), 4)
+        mine = self.json('GET', '/api/students', token=self.servant)
+        self.assertEqual({s['grade'] for s in mine}, {'5'})
+        columnar = self.json('GET', '/api/students?format=columnar', token=self.admin)
+        self.assertIn('name', columnar['columns'])
+        self.assertEqual(len(columnar['rows']), 4)
+
+    def test_student_etag(self):
+        status, head, _ = self.call('GET', '/api/students', token=self.admin)
+        etag = head['ETag']
+        self.assertEqual(self.status('GET', '/api/students', token=self.admin,
+                                     headers={'If-None-Match': etag}), 304)
+        self.assertEqual(self.status('GET', '/api/students?format=columnar', token=self.admin,
+                                     headers={'If-None-Match': etag}), 200)
+        self.call('PUT', '/api/students/1', {'name': 'مينا', 'grade': 'KG2'}, self.admin)
+        self.assertEqual(self.status('GET', '/api/students', token=self.admin,
+                                     headers={'If-None-Match': etag}), 200)
+
+    def test_student_crud(self):
+        added = self.json('POST', '/api/students', {'name': 'يوسف', 'grade': 'KG1'}, self.servant, expect=201)
+        self.assertEqual(added['grade'], '5')                  # servants add to their own class
+        edited = self.json('PUT', f'/api/students/{added["id"]}', {'name': 'يوسف جرجس', 'grade': 'KG1'},
+                           self.servant)
+        self.assertEqual((edited['name'], edited['grade']), ('يوسف جرجس', '5'))
+        self.assertEqual(self.status('PUT', '/api/students/1', {'name': 'x', 'grade': '5'}, self.servant), 403)
+        self.assertEqual(self.status('PUT', '/api/students/99', {'name': 'x', 'grade': '5'}, self.admin), 404)
+        self.assertEqual(self.status('PUT', '/api/students/1', {'name': ' ', 'grade': '5'}, self.admin), 400)
+        self.assertEqual(self.status('DELETE', '/api/students/1', token=self.servant), 403)
+        self.assertTrue(self.json('DELETE', f'/api/students/{added["id"]}', token=self.servant)['success'])
+        self.assertTrue(self.json('DELETE', '/api/students/1', token=self.admin)['success'])
+        self.assertEqual(len(self.json('GET', '/api/students', token=self.admin)), 3)
+
+    def test_student_history(self):
+        self.json('POST', '/api/attendance/save', {'date': DATE, 'records': {'3': 'late'}}, self.servant)
+        history = self.json('GET', '/api/students/3/history', token=self.servant)
+        self.assertEqual([(h['date'], h['status']) for h in history], [(DATE, 'late')])
+        self.assertEqual(self.status('GET', '/api/students/1/history', token=self.servant), 403)
+
+    def test_imports(self):
+        csv = 'name,grade\nنبيل,5\n'.encode()
+        status, _, report = self.call('POST', '/api/students/import?dry_run=1', token=self.servant, raw=csv)
+        self.assertEqual(status, 200)
+        self.assertEqual(len(self.json('GET', '/api/students', token=self.admin)), 4)
+        report = self.call('POST', '/api/students/import', token=self.servant, raw=csv)[2]
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual(len(self.json('GET', '/api/students', token=self.servant)), 3)
+        report = self.call('POST', '/api/teachers/import', token=self.admin, raw='name\nنبيل\n'.encode())[2]
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual(self.status('POST', '/api/students/import', token=self.admin, raw=b'\x00\x01'), 400)
+
+    # ── teachers ───────────────────────────────────────────────────────────
+
+    def test_teacher_crud(self):
+        added = self.json('POST', '/api/teachers', {'name': 'شنودة', 'subject': 'أنشطة'}, self.admin, expect=201)
+        self.assertEqual(added['subject'], 'أنشطة')
+        edited = self.json('PUT', f'/api/teachers/{added["id"]}', {'name': 'شنودة', 'subject': 'ابتدائي'},
+                           self.admin)
+        self.assertEqual(edited['subject'], 'ابتدائي')
+        self.assertEqual(len(self.json('GET', '/api/teachers', token=self.admin)), 2)
+        self.assertTrue(self.json('DELETE', f'/api/teachers/{added["id"]}', token=self.admin)['success'])
+        self.assertEqual(len(self.json('GET', '/api/teachers?format=columnar', token=self.admin)['rows']), 1)
+
+    # ── attendance ─────────────────────────────────────────────────────────
+
+    def test_marking(self):
+        self.json('POST', '/api/attendance/mark', {'studentId': 3, 'status': 'present', 'date': DATE}, self.servant)
+        self.assertEqual(self.status('POST', '/api/attendance/mark',
+                                     {'studentId': 1, 'status': 'present', 'date': DATE}, self.servant), 403)
+        out = self.json('POST', '/api/attendance/mark-batch',
+                        {'date': DATE, 'marks': [{'id': 4, 'status': 'late'}]}, self.servant)
+        self.assertEqual(out, {'success': True, 'marked': 1})
+        self.assertEqual(self.status('POST', '/api/attendance/mark-batch',
+                                     {'date': DATE, 'marks': [{'id': 1, 'status': 'late'}]}, self.servant), 403)
+        records = self.json('GET', f'/api/attendance/records?date={DATE}', token=self.servant)
+        self.assertEqual(records, {'3': 'present', '4': 'late'})
+
+    def test_save(self):
+        out = self.json('POST', '/api/attendance/save',
+                        {'date': DATE, 'records': {'1': 'present', '2': 'absent', '3': 'late', '4': 'none'}},
+                        self.admin)
+        self.assertEqual(out, {'success': True, 'updated': 3})
+        # saving the same day again changes nothing
+        self.json('POST', '/api/attendance/save',
+                  {'date': DATE, 'records': {'1': 'present', '2': 'absent', '3': 'late'}}, self.admin)
+        students = {s['id']: s for s in self.json('GET', '/api/students', token=self.admin)}
+        self.assertEqual((students[1]['present_count'], students[1]['total_classes']), (1, 1))
+        self.assertEqual((students[2]['absent_count'], students[2]['attendance']), (1, 0))
+        history = self.json('GET', '/api/attendance/history', token=self.admin)
+        self.assertEqual([(d['present'], d['absent'], d['late']) for d in history if d['date'] == DATE],
+                         [(1, 1, 1)])
+        log = self.json('GET', '/api/attendance/log', token=self.servant)
+        self.assertEqual({r['student_id'] for r in log}, {3})
+        page = self.json('GET', '/api/attendance/log?limit=2', token=self.admin)
+        self.assertEqual(len(page['records']), 2)
+        self.assertTrue(page['next_cursor'])
+        self.assertEqual(self.json('GET', '/api/attendance/log?count=1', token=self.admin), {'count': 3})
+        self.assertEqual(self.status('GET', '/api/attendance/log?limit=x', token=self.admin), 400)
+
+    def test_save_agrees_with_reconcile(self):
+        # re-saving a day as a status that counts for nothing takes the total back to 0
+        self.json('POST', '/api/attendance/save', {'date': DATE, 'records': {'1': 'present', '3': 'absent'}},
+                  self.admin)
+        self.json('POST', '/api/attendance/save', {'date': DATE, 'records': {'1': 'excused'}}, self.admin)
+        students = {s['id']: s for s in self.json('GET', '/api/students', token=self.admin)}
+        self.assertEqual((students[1]['total_classes'], students[1]['attendance']), (0, 100))
+        self.assertEqual(server.reconcile_counters(), {'students': 0, 'teachers': 0, 'history_days': 0})
+
+    def test_teacher_attendance(self):
+        self.json('POST', '/api/teacher-attendance/mark', {'teacherId': 1, 'status': 'late', 'date': DATE},
+                  self.admin)
+        self.json('POST', '/api/teacher-attendance/mark-batch',
+                  {'date': DATE, 'marks': [{'id': 1, 'status': 'present'}]}, self.admin)
+        self.assertEqual(self.json('GET', f'/api/teacher-attendance/records?date={DATE}', token=self.admin),
+                         {'1': 'present'})
+        self.json('POST', '/api/teacher-attendance/save', {'date': DATE, 'records': {'1': 'present'}}, self.admin)
+        log = self.json('GET', '/api/teacher-attendance/log', token=self.admin)
+        self.assertEqual([(r['teacher_id'], r['status']) for r in log], [(1, 'present')])
+
+    # ── sync, events ───────────────────────────────────────────────────────
+
+    def test_sync(self):
+        full = self.json('GET', f'/api/sync?since=0&date={DATE}', token=self.servant)
+        self.assertEqual({s['grade'] for s in full['students']}, {'5'})
+        self.json('POST', '/api/attendance/mark', {'studentId': 3, 'status': 'late', 'date': DATE}, self.servant)
+        # another grade's marks never reach the servant, in a delta or a snapshot
+        self.json('POST', '/api/attendance/mark', {'studentId': 1, 'status': 'absent', 'date': DATE}, self.admin)
+        delta = self.json('GET', f'/api/sync?since={full["version"]}&date={DATE}', token=self.servant)
+        self.assertEqual(delta['students'], [])
+        self.assertEqual(delta['records'], {'3': 'late'})
+        full = self.json('GET', f'/api/sync?since=0&date={DATE}', token=self.servant)
+        self.assertEqual(full['records'], {'3': 'late'})
+        admin = self.json('GET', f'/api/sync?since=0&date={DATE}', token=self.admin)
+        self.assertEqual(admin['records'], {'1': 'absent', '3': 'late'})
+        self.assertEqual(self.status('GET', '/api/sync?since=x', token=self.admin), 400)
+
+    def open_stream(self, token):
+        """A raw /api/events socket and what it got up to the `retry:` line."""
+        self.called.add(('GET', '/api/events'))
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        sock.sendall(f'GET /api/events?token={token} HTTP/1.1\r\nHost: x\r\n\r\n'.encode())
+        head = b''
+        while b'retry:' not in head:
+            head += sock.recv(4096)
+        return sock, head
+
+    def assertStreamEnds(self, sock):
+        deadline = time.monotonic() + 5
+        with sock:
+            while sock.recv(4096):      # pings, until the server closes it
+                self.assertLess(time.monotonic(), deadline, 'the stream is still open')
+
+    def test_events(self):
+        self.assertEqual(self.status('GET', '/api/events?token=nope'), 401)
+        sock, head = self.open_stream(self.admin)
+        with sock:
+            self.assertIn(b' 200 ', head.split(b'\r\n')[0])
+            self.assertIn(b'text/event-stream', head)
+            self.json('POST', '/api/attendance/mark', {'studentId': 3, 'status': 'late', 'date': DATE}, self.admin)
+            while b'event: mark' not in head:
+                head += sock.recv(4096)
+            self.assertIn(b'"3": "late"', head)
+
+    def test_events_end_with_the_session(self):
+        sock, _ = self.open_stream(self.servant)
+        self.json('POST', '/api/logout', token=self.servant)
+        self.assertStreamEnds(sock)
+        # a role/class change or a deletion ends the user's streams too
+        uid = next(u['id'] for u in self.json('GET', '/api/users', token=self.admin) if u['username'] == 'servant5')
+        token = self.login('servant5', 'pw')
+        sock, _ = self.open_stream(token)
+        self.json('PUT', f'/api/users/{uid}', {'name': 'y', 'username': 'servant5', 'role': 'teacher',
+                                               'assigned_class': '6'}, self.admin)
+        self.assertStreamEnds(sock)
+        sock, _ = self.open_stream(token)
+        self.json('DELETE', f'/api/users/{uid}', token=self.admin)
+        self.assertStreamEnds(sock)
+
+    def test_events_recheck_the_session(self):
+        # a session that ends without this process closing the stream (expiry, another process's logout)
+        sock, _ = self.open_stream(self.servant)
+        heartbeat, server.events.heartbeat = server.events.heartbeat, 0.1
+        try:
+            server.sessions.drop(self.servant)
+            self.assertStreamEnds(sock)
+        finally:
+            server.events.heartbeat = heartbeat
+
+    # ── reports ────────────────────────────────────────────────────────────
+
+    def test_reports(self):
+        self.json('POST', '/api/attendance/save', {'date': DATE, 'records': {'1': 'present', '3': 'absent'}},
+                  self.admin)
+        grades = self.json('GET', '/api/reports/grades', token=self.servant)
+        self.assertEqual({g['grade'] for g in grades}, {'5'})
+        for path in ('/api/reports/summary', '/api/reports/attention', '/api/reports/monthly',
+                     '/api/reports/teachers/monthly', '/api/reports/departments'):
+            with self.subTest(path=path):
+                self.json('GET', path, token=self.admin)
+        attention = self.json('GET', '/api/reports/attention', token=self.servant)
+        self.assertEqual([s['id'] for s in attention], [3])
+        self.assertEqual(self.status('GET', '/api/reports/attention?threshold=x', token=self.admin), 400)
+
+    def test_metrics_and_slow_queries(self):
+        status, head, body = self.call('GET', '/api/metrics', token=self.admin)
+        self.assertEqual(status, 200)
+        self.assertIn(b'church_http_requests_total', body)
+        self.assertIsInstance(self.json('GET', '/api/slow-queries', token=self.admin), list)
+        self.assertEqual(self.status('GET', '/api/slow-queries?limit=x', token=self.admin), 400)
+        self.json('DELETE', '/api/slow-queries', token=self.admin)
+
+    # ── exports ────────────────────────────────────────────────────────────
+
+    def test_exports(self):
+        self.json('POST', '/api/attendance/save', {'date': DATE, 'records': {'1': 'present', '3': 'absent'}},
+                  self.admin)
+        self.json('POST', '/api/teacher-attendance/save', {'date': DATE, 'records': {'1': 'present'}}, self.admin)
+        for path, rows in (('/api/export/students', 5), ('/api/export/teachers', 2),
+                           ('/api/export/attendance-log', 3), ('/api/export/teacher-attendance-log', 2)):
+            with self.subTest(path=path):
+                status, head, body = self.call('GET', f'{path}?format=csv', token=self.admin)
+                self.assertEqual(status, 200)
+                self.assertIn('text/csv', head['Content-Type'])
+                self.assertEqual(len(body.decode('utf-8-sig').strip().splitlines()), rows)
+                status, head, body = self.call('GET', f'{path}?format=xlsx&token={self.admin}')
+                self.assertEqual((status, body[:2]), (200, b'PK'))
+        servant = self.call('GET', '/api/export/attendance-log?format=csv', token=self.servant)[2]
+        self.assertEqual(len(servant.decode('utf-8-sig').strip().splitlines()), 2)
+        self.assertEqual(self.status('GET', '/api/export/students?format=pdf', token=self.admin), 400)
+
+    # ── users ──────────────────────────────────────────────────────────────
+
+    def test_users(self):
+        users = self.json('GET', '/api/users', token=self.admin)
+        self.assertEqual({u['username'] for u in users}, {'admin', 'servant5'})
+        self.assertNotIn('password_hash', users[0])
+        dup = {'name': 'x', 'username': 'servant5', 'password': 'p', 'role': 'teacher', 'assigned_class': '5'}
+        self.assertEqual(self.status('POST', '/api/users', dup, self.admin), 400)
+        uid = self.json('POST', '/api/users', {**dup, 'username': 'servant6', 'assigned_class': '6'},
+                        self.admin, expect=201)['id']
+        edited = self.json('PUT', f'/api/users/{uid}', {'name': 'y', 'username': 'servant6', 'role': 'teacher',
+                                                        'assigned_class': '7'}, self.admin)
+        self.assertEqual(edited['assigned_class'], '7')
+        self.json('DELETE', f'/api/users/{uid}', token=self.admin)
+        self.assertEqual(self.status('DELETE', '/api/users/1', token=self.admin), 400)   # the only admin
+
+    # ── static files ───────────────────────────────────────────────────────
+
+    def test_static_files(self):
+        status, head, body = self.call('GET', '/index.html')
+        self.assertEqual(status, 200)
+        self.assertIn(b'<html', body.lower())
+        self.assertEqual(self.status('GET', '/index.html', headers={'If-None-Match': head['ETag']}), 304)
+        self.assertEqual(self.status('GET', '/nope.js'), 404)
+
+    # ── coverage ───────────────────────────────────────────────────────────
+
+    def test_zz_every_route_was_called(self):
+        # runs last (unittest sorts by name); meaningful only when the whole class ran
+        if self._ran < len(unittest.TestLoader().getTestCaseNames(type(self))):
+            self.skipTest('only part of the class ran')
+        missing = {(r.method, r.pattern) for r in server.router.routes} - self.called
+        self.assertFalse(missing, f'routes never called: {sorted(missing)}')
+
+
+if __name__ == '__main__':
+    unittest.main()
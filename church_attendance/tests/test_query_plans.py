@@ -0,0 +1,183 @@
+"""
+Query-plan regression check for every read endpoint.
+
+Builds a small synthetic database, calls each endpoint's api_* function
+with SQLite tracing on so the exact statements it runs are captured, then
+runs EXPLAIN QUERY PLAN on each one. Fails if any statement falls back to
+a full table scan that the endpoint doesn't explicitly allow — in the hot
+tables, and in the archive tiers once a closed service year is moved out.
+
+    python -m unittest tests.test_query_plans
+"""
+
+import os, random, re, tempfile, unittest
+
+import server
+
+# "SCAN t" with no index — "SCAN t USING [COVERING] INDEX" and virtual tables are fine
+_TABLE_SCAN = re.compile(r'^SCAN (\S+)$')
+# CTEs / subqueries SQLite builds itself — scanning those is expected
+_DERIVED    = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\S+)$')
+
+
+def _populate(students: int, teachers: int, weeks: int):
+    server.init_db()
+    conn = server.get_conn()
+    rnd  = random.Random(7)
+    grades = ['KG1', 'KG2'] + [str(g) for g in range(1, 13)]
+    conn.executemany('INSERT INTO app_students (name, grade) VALUES (?, ?)',
+                     [(f'طالب {i}', rnd.choice(grades)) for i in range(students)])
+    conn.executemany('INSERT INTO app_teachers (name, subject) VALUES (?, ?)',
+                     [(f'خادم {i}', rnd.choice(['ابتدائي', 'إعدادي وثانوي', 'أنشطة'])) for i in range(teachers)])
+    dates = [f'{2020 + w // 52}-{w % 52 // 4 + 1:02d}-{w % 4 * 7 + 1:02d}' for w in range(weeks)]
+    statuses = ['present', 'present', 'absent', 'late']
+    conn.executemany('INSERT OR IGNORE INTO attendance_log (student_id, record_date, status) VALUES (?,?,?)',
+                     ((sid, d, rnd.choice(statuses)) for d in dates for sid in range(1, students + 1)))
+    conn.executemany('INSERT OR IGNORE INTO teacher_attendance_log (teacher_id, record_date, status) VALUES (?,?,?)',
+                     ((tid, d, rnd.choice(statuses)) for d in dates for tid in range(1, teachers + 1)))
+    conn.executemany('INSERT INTO attendance_records (student_id, record_date, status) VALUES (?,?,?)',
+                     ((sid, d, 'none') for d in dates[-12:] for sid in range(1, students + 1)))
+    conn.executemany('INSERT INTO teacher_attendance_records (teacher_id, record_date, status) VALUES (?,?,?)',
+                     ((tid, d, 'none') for d in dates[-12:] for tid in range(1, teachers + 1)))
+    conn.executemany('INSERT INTO app_users (name, username, password_hash, role, assigned_class) VALUES (?,?,?,?,?)',
+                     [(f'خادم {g}', f'servant{g}', '', 'teacher', g) for g in grades for _ in [0]])
+    conn.executemany('INSERT OR IGNORE INTO attendance_history (record_date) VALUES (?)', ((d,) for d in dates))
+    server.rebuild_rollups(conn)
+    # spread sync versions the way a long run of individual writes would
+    for table in ('app_students', 'app_teachers', 'attendance_history'):
+        conn.execute(f'UPDATE {table} SET sync_version = id')
+    for table in ('attendance_records', 'teacher_attendance_records'):
+        conn.execute(f'UPDATE {table} SET sync_version = id % 5000')
+    conn.execute('UPDATE sync_state SET version = 5000')
+    conn.commit()
+    conn.execute('ANALYZE')
+    return dates[-1]
+
+
+# the archive registry — one row per archived service year — is read whole by
+# every log reader to pick the tiers its date range spans
+_TIERS = {'log_archives'}
+
+
+def endpoints(date: str):
+    """name → (call, tables a full scan is acceptable for)."""
+    drain = lambda it: list(it)
+    return {
+        'GET /students (admin)':          (lambda: server.api_get_students(), set()),
+        'GET /students (grade)':          (lambda: server.api_get_students('5'), set()),
+        'GET /students/:id/history':      (lambda: server.api_get_student_history(42), _TIERS),
+        'GET /teachers':                  (lambda: server.api_get_teachers(), set()),
+        'GET /users':                     (lambda: server.api_get_users(), {'app_users'}),
+        'GET /attendance/records':        (lambda: server.api_get_attendance_records(date), set()),
+        'GET /teacher-attendance/records': (lambda: server.api_get_teacher_attendance_records(date), set()),
+        'GET /attendance/history':        (lambda: server.api_get_attendance_history(), set()),
+        'GET /attendance/log (date)':     (lambda: server.api_get_attendance_log(date), _TIERS),
+        'GET /attendance/log (grade)':    (lambda: server.api_get_attendance_log(None, '5'), _TIERS),
+        'GET /attendance/log (both)':     (lambda: server.api_get_attendance_log(date, '5'), _TIERS),
+        'GET /attendance/log (stream)':   (lambda: drain(server.iter_attendance_log()), _TIERS),
+        'GET /attendance/log (count)':    (lambda: server.api_count_attendance_log(date, '5'), _TIERS),
+        'GET /teacher-attendance/log':    (lambda: server.api_get_teacher_attendance_log(date), _TIERS),
+        'GET /teacher-attendance/log (stream)': (lambda: drain(server.iter_teacher_attendance_log()), _TIERS),
+        'GET /export/attendance-log (range)': (lambda: drain(server.export_attendance_log(date[:4] + '-01-01', date)[1]), _TIERS),
+        'GET /export/attendance-log (grade)': (lambda: drain(server.export_attendance_log(None, None, '5')[1]), _TIERS),
+        'GET /export/students':           (lambda: drain(server.export_students()[1]), set()),
+        'GET /export/teacher-attendance-log': (lambda: drain(server.export_teacher_attendance_log(date[:4] + '-01-01')[1]), _TIERS),
+        'GET /sync (full)':               (lambda: server.api_sync(0, date, None, True), {'app_students', 'app_teachers'}),
+        'GET /sync (full, grade)':        (lambda: server.api_sync(0, date, '5'), set()),
+        'GET /sync (delta)':              (lambda: server.api_sync(4990, date, None, True), set()),
+        'GET /sync (delta, grade)':       (lambda: server.api_sync(4990, date, '5'), set()),
+        # a cold cache fetches the ids it doesn't know in one query
+        'grade check (batch, cold)':      (lambda: server.StudentGrades().all_in(list(range(1, 41)), '5'), set()),
+        'GET /reports/grades':            (lambda: server.api_report_grades(), set()),
+        'GET /reports/grades (grade)':    (lambda: server.api_report_grades('5'), set()),
+        'GET /reports/summary':           (lambda: server.api_report_summary(date), set()),
+        'GET /reports/summary (grade)':   (lambda: server.api_report_summary(date, None, '5'), set()),
+        # the follow-up list reads the whole roster once by design
+        'GET /reports/attention':         (lambda: server.api_report_attention(), {'app_students'}),
+        'GET /reports/attention (grade)': (lambda: server.api_report_attention(85, '5'), set()),
+        # monthly rollups are a few rows per grade/department per month
+        'GET /reports/monthly':           (lambda: server.api_report_monthly(), {'grade_monthly_stats'}),
+        'GET /reports/monthly (grade)':   (lambda: server.api_report_monthly('student', None, None, '5'), set()),
+        'GET /reports/teachers/monthly':  (lambda: server.api_report_monthly('teacher'), {'department_monthly_stats'}),
+        'GET /reports/departments':       (lambda: server.api_report_departments(date), set()),
+        'POST /login':                    (lambda: server.api_login({'username': 'admin', 'password': 'x'}), set()),
+    }
+
+
+def archived_endpoints(date: str):
+    """Log readers whose range reaches into the archived 2019-2020 service year."""
+    drain = lambda it: list(it)
+    return {
+        'GET /students/:id/history':      (lambda: server.api_get_student_history(42), _TIERS),
+        'GET /attendance/log (date)':     (lambda: server.api_get_attendance_log('2020-03-01'), _TIERS),
+        'GET /attendance/log (both)':     (lambda: server.api_get_attendance_log('2020-03-01', '5'), _TIERS),
+        'GET /attendance/log (stream)':   (lambda: drain(server.iter_attendance_log()), _TIERS),
+        'GET /attendance/log (count)':    (lambda: server.api_count_attendance_log('2020-03-01', '5'), _TIERS),
+        'GET /teacher-attendance/log':    (lambda: server.api_get_teacher_attendance_log('2020-03-01'), _TIERS),
+        'GET /export/attendance-log (range)': (lambda: drain(server.export_attendance_log('2020-01-01', date)[1]), _TIERS),
+        'GET /export/attendance-log (grade)': (lambda: drain(server.export_attendance_log(None, None, '5')[1]), _TIERS),
+        'GET /export/teacher-attendance-log': (lambda: drain(server.export_teacher_attendance_log('2020-01-01')[1]), _TIERS),
+    }
+
+
+class _PlanCheck(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._db  = server.DB_PATH
+        server.DB_PATH = os.path.join(cls._tmp.name, 'plans.db')
+        cls.date = _populate(students=300, teachers=20, weeks=60)
+
+    @classmethod
+    def tearDownClass(cls):
+        server.close_all_conns()
+        server._pool_local.conn = None
+        server.DB_PATH = cls._db
+        cls._tmp.cleanup()
+
+    def assertPlansUseIndexes(self, cases: dict) -> list:
+        """Check every SELECT each case runs; returns all of them for further checks."""
+        conn = server.get_conn()
+        seen = []
+        for name, (call, allowed) in cases.items():
+            statements = []
+            conn.set_trace_callback(statements.append)
+            try:
+                call()
+            finally:
+                conn.set_trace_callback(None)
+            for sql in statements:
+                if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                    continue
+                seen.append(sql)
+                plan  = [r['detail'] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+                scans = {m.group(1) for d in plan for m in [_TABLE_SCAN.match(d)] if m}
+                scans -= {m.group(1) for d in plan for m in [_DERIVED.match(d)] if m}
+                with self.subTest(name, sql=sql):
+                    self.assertEqual({t for t in scans if t not in allowed}, set(), '\n'.join(plan))
+        return seen
+
+
+class HotPlansTest(_PlanCheck):
+
+    def test_every_endpoint_uses_indexes(self):
+        self.assertPlansUseIndexes(endpoints(self.date))
+
+
+class ArchivedPlansTest(_PlanCheck):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 2020-01 … 2020-08 belong to the 2019-2020 service year; the rest stays hot
+        done = server.archive_logs(2019)
+        assert [d['year'] for d in done] == [2019], done
+
+    def test_archive_tier_uses_indexes(self):
+        seen = self.assertPlansUseIndexes(archived_endpoints(self.date))
+        self.assertTrue(any('arc_2019.' in sql for sql in seen), 'no statement reached the archive tier')
+
+
+if __name__ == '__main__':
+    unittest.main()
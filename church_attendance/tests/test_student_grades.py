@@ -0,0 +1,98 @@
+"""
+StudentGrades — the id → grade cache behind the class-servant checks —
+stays consistent with app_students through adds, grade changes, deletes,
+imports, rows written without going through the cache, and changes made
+by another process sharing the database.
+
+    python -m unittest discover -s tests -t .
+"""
+
+import os, tempfile, unittest
+
+import server
+
+
+class StudentGradesTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._db  = server.DB_PATH
+        server.DB_PATH = os.path.join(self._tmp.name, 'church.db')
+        server.init_db()
+        self.grades = server.student_grades
+
+    def tearDown(self):
+        server.close_all_conns()
+        server._pool_local.conn = None
+        server.DB_PATH = self._db
+        self._tmp.cleanup()
+
+    def assertMatchesTable(self):
+        rows = dict(server.get_conn().execute('SELECT id, grade FROM app_students').fetchall())
+        self.assertEqual(self.grades.grades_of(set(rows)), rows)
+
+    def test_add(self):
+        sid = server.api_add_student({'name': 'مينا', 'grade': '3'})['id']
+        self.assertTrue(self.grades.in_grade(sid, '3'))
+        self.assertFalse(self.grades.in_grade(sid, '4'))
+        self.assertMatchesTable()
+
+    def test_grade_change(self):
+        sid = server.api_add_student({'name': 'مينا', 'grade': '3'})['id']
+        server.api_edit_student(sid, {'name': 'مينا', 'grade': '4'})
+        self.assertTrue(self.grades.in_grade(sid, '4'))
+        self.assertFalse(self.grades.in_grade(sid, '3'))
+        self.assertMatchesTable()
+
+    def test_edit_of_missing_student_adds_nothing(self):
+        server.api_edit_student(999, {'name': 'مينا', 'grade': '4'})
+        self.assertFalse(self.grades.in_grade(999, '4'))
+        self.assertEqual(self.grades.grades_of({999}), {})
+
+    def test_delete(self):
+        keep = server.api_add_student({'name': 'مينا', 'grade': '3'})['id']
+        gone = server.api_add_student({'name': 'مريم', 'grade': '3'})['id']
+        server.api_delete_student(gone)
+        self.assertFalse(self.grades.in_grade(gone, '3'))
+        self.assertFalse(self.grades.all_in([keep, gone], '3'))
+        self.assertTrue(self.grades.all_in([keep], '3'))
+        self.assertMatchesTable()
+
+    def test_import(self):
+        server.api_import('student', 'name,grade\nمينا,3\nمريم,5\n'.encode())
+        self.assertMatchesTable()
+
+    def test_row_written_behind_the_cache(self):
+        # another process (or a script) inserting straight into the table
+        conn = server.get_conn()
+        sid  = conn.execute("INSERT INTO app_students (name, grade) VALUES ('بيشوي', '6')").lastrowid
+        conn.commit()
+        self.assertNotIn(sid, self.grades._grades)
+        self.assertTrue(self.grades.in_grade(sid, '6'))
+        self.assertIn(sid, self.grades._grades)        # fetched once, then cached
+        self.assertMatchesTable()
+
+    def test_change_in_another_process(self):
+        # `other` is a second server process's cache over the same database;
+        # the writes below go through this process and never touch it
+        moved = server.api_add_student({'name': 'مينا', 'grade': '3'})['id']
+        gone  = server.api_add_student({'name': 'مريم', 'grade': '3'})['id']
+        other = server.StudentGrades()
+        other.load()
+        self.assertTrue(other.all_in([moved, gone], '3'))
+        server.api_edit_student(moved, {'name': 'مينا', 'grade': '4'})
+        server.api_delete_student(gone)
+        self.assertFalse(other.in_grade(moved, '3'))
+        self.assertTrue(other.in_grade(moved, '4'))
+        self.assertFalse(other.in_grade(gone, '3'))
+        self.assertEqual(other.grades_of({moved, gone}), {moved: '4'})
+
+    def test_junk_ids(self):
+        sid = server.api_add_student({'name': 'مينا', 'grade': '3'})['id']
+        self.assertFalse(self.grades.all_in([sid, 'x'], '3'))
+        self.assertFalse(self.grades.in_grade(None, '3'))
+        self.assertTrue(self.grades.in_grade(str(sid), '3'))
+
+
+if __name__ == '__main__':
+    unittest.main()